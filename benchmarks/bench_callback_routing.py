@@ -0,0 +1,95 @@
+# benchmarks/bench_callback_routing.py
+"""
+Measures the cost of finding the handler for a callback query outside of conversations.
+
+'regex scan' reproduces the previous setup: the entry points of the conversations and the
+global CallbackQueryHandlers, each with its own regex, tested one after another.
+'router' decodes the callback data and looks the action up in the router's dictionary,
+once with a cold decode cache and once with a warm one (PTB checks and then handles the
+same callback data, so the second decode is always a cache hit).
+
+Run from the repository root:  python -m benchmarks.bench_callback_routing
+The same cases are part of the suite (python -m benchmarks.suite --filter callback_routing).
+"""
+
+import re
+import timeit
+
+from callback_router import CallbackRouter, decode_callback_data, encode_callback_data
+from benchmarks.suite import Benchmark
+
+LEGACY_PATTERNS = [
+    '^exchange$',
+    r'^user_confirms_sending_',
+    r'^decline_request_\d+',
+    r'^leave_review_',
+    '^rate$',
+    '^user_help$',
+    '^back_to_menu$',
+    r'^confirm_payment_\d+',
+    r'^confirm_transfer_\d+',
+    r'^confirm_trx_transfer_\d+',
+    r'^by_user_confirm_transfer_\d+',
+    r'^cancel_by_user_\d+',
+    '^user_cabinet$',
+    '^referral_program$',
+]
+
+ROUTED_ACTIONS = ['rate', 'user_help', 'back_to_menu', 'confirm_payment', 'confirm_transfer',
+                  'confirm_trx_transfer', 'by_user_confirm_transfer', 'cancel_by_user']
+
+SAMPLES = {
+    'first pattern': ('exchange', 'back_to_menu'),
+    'late pattern': ('cancel_by_user_123456', encode_callback_data('cancel_by_user', 123456)),
+    'no match': ('unknown_action', 'unknown_action'),
+}
+
+
+def _routing_functions():
+    """Returns the three ways of finding a handler, keyed by column name."""
+    compiled = [re.compile(pattern) for pattern in LEGACY_PATTERNS]
+    router = CallbackRouter()
+    for action in ROUTED_ACTIONS:
+        router.add_route(action, None)
+
+    def regex_scan(data):
+        for pattern in compiled:
+            if pattern.match(data):
+                return pattern
+        return None
+
+    uncached_decode = decode_callback_data.__wrapped__
+
+    def router_cold(data):
+        payload = uncached_decode(data)
+        return payload is not None and payload.action in router._routes
+
+    return {'regex scan': regex_scan, 'router (cold)': router_cold, 'router (warm)': router._match}
+
+
+async def benchmarks(options, stack) -> list:
+    """Entries for the benchmark suite (benchmarks.suite)."""
+    functions = _routing_functions()
+    result = []
+    for case, (legacy_data, compact_data) in SAMPLES.items():
+        for column, func in functions.items():
+            data = legacy_data if column == 'regex scan' else compact_data
+            result.append(Benchmark(f"callback_routing.{column} [{case}]", lambda func=func, data=data: func(data)))
+    return result
+
+
+def main(number: int = 200_000):
+    functions = _routing_functions()
+    regex_scan, router_cold, router_warm = functions.values()
+
+    print(f"{'case':<15}{'regex scan':>14}{'router (cold)':>16}{'router (warm)':>16}   ns per callback")
+    for case, (legacy_data, compact_data) in SAMPLES.items():
+        results = []
+        for func, data in ((regex_scan, legacy_data), (router_cold, compact_data), (router_warm, compact_data)):
+            seconds = min(timeit.repeat(lambda: func(data), number=number, repeat=5))
+            results.append(seconds / number * 1e9)
+        print(f"{case:<15}{results[0]:>14.0f}{results[1]:>16.0f}{results[2]:>16.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# benchmarks/bench_database.py
+"""
+DatabaseManager methods against pre-populated databases of different sizes (10k and 1M
+exchange requests by default; a quarter as many user profiles and a tenth as many referrals).
+
+Generating a large database takes a while, so every size is generated once into the data
+directory and copied before each run; write benchmarks therefore always start from the
+same state. The cache file name contains a hash of the schema, so schema changes lead
+to a fresh database.
+
+Part of the suite (python -m benchmarks.suite --filter database --rows 10000).
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+import hashlib
+import itertools
+import tempfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from database_manager import DatabaseManager
+from benchmarks.suite import Benchmark
+
+FIRST_USER_ID = 100_000_000
+ACTIVE_STATUSES = ('awaiting payment', 'awaiting confirmation', 'payment received', 'funds sent')
+BATCH_SIZE = 50_000
+SAMPLE_SIZE = 1000
+
+
+def _schema_hash() -> str:
+    schema = repr((DatabaseManager.TABLE_SCHEMAS, DatabaseManager.TABLE_INDEXES))
+    return hashlib.sha1(schema.encode()).hexdigest()[:8]
+
+
+def _status(rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.90:
+        return 'completed'
+    if roll < 0.97:
+        return 'declined'
+    return rng.choice(ACTIVE_STATUSES)
+
+
+def populate(db_path: str, rows: int, seed: int = 42):
+    """Creates the schema and fills it with `rows` requests and the matching profiles and referrals."""
+    db = DatabaseManager(db_path)
+    db.connect()
+    db.setup_database()
+    db.close()
+
+    rng = random.Random(seed)
+    users = max(1, rows // 4)
+    started = datetime.now() - timedelta(days=365)
+    step = timedelta(days=365) / rows
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany(
+            "INSERT INTO user_profiles (user_id, username, bank_name, card_info, card_number, fio, inn, "
+            "referral_balance, updated_at) VALUES (?, ?, 'Monobank', ?, '4111 1111 1111 1111', "
+            "'Шевченко Тарас Григорович', '1234567890', ?, CURRENT_TIMESTAMP)",
+            ((FIRST_USER_ID + index, f"user{FIRST_USER_ID + index}", f"UA{index:027d}", rng.choice((0.0, 0.0, 5.0)))
+             for index in range(users)))
+
+        def requests():
+            for index in range(rows):
+                user_id = FIRST_USER_ID + rng.randrange(users)
+                amount = rng.randint(20, 5000)
+                created_at = (started + step * index).strftime('%Y-%m-%d %H:%M:%S')
+                yield (user_id, f"user{user_id}", _status(rng), 'USDT', amount, amount * 41.5, 41.5,
+                       'Monobank', f"UA{user_id:027d}", '4111 1111 1111 1111', 'Шевченко Тарас Григорович',
+                       '1234567890', f"{rng.getrandbits(256):064x}", created_at, created_at)
+
+        generator = requests()
+        while True:
+            batch = list(itertools.islice(generator, BATCH_SIZE))
+            if not batch:
+                break
+            conn.executemany(
+                "INSERT INTO exchange_requests (user_id, username, status, currency, amount_currency, amount_uah, "
+                "exchange_rate, bank_name, card_info, card_number, fio, inn, transaction_hash, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+
+        conn.executemany(
+            "INSERT INTO referrals (referrer_id, referred_id, referred_username, is_credited) VALUES (?, ?, ?, ?)",
+            ((FIRST_USER_ID + rng.randrange(users), FIRST_USER_ID + index, f"user{FIRST_USER_ID + index}",
+              rng.random() < 0.5)
+             for index in range(min(users, rows // 10))))
+        conn.commit()
+    finally:
+        conn.close()
+
+    db = DatabaseManager(db_path)
+    db.connect()
+    db.rebuild_request_stats()
+    db.close()
+
+
+def prepare_database(data_dir: str, rows: int, working_copy: str):
+    """Copies the pre-populated database with the given size to `working_copy`, generating it if needed."""
+    os.makedirs(data_dir, exist_ok=True)
+    template = os.path.join(data_dir, f"requests_{rows}_{_schema_hash()}.db")
+    if not os.path.exists(template):
+        print(f"Generating a database with {rows} requests (cached in {template})...", flush=True)
+        partial = template + '.partial'
+        if os.path.exists(partial):
+            os.remove(partial)
+        populate(partial, rows)
+        os.replace(partial, template)
+    shutil.copyfile(template, working_copy)
+
+
+def _database_benchmarks(db: DatabaseManager, rows: int) -> list[Benchmark]:
+    users = max(1, rows // 4)
+    rng = random.Random(7)
+    request_ids = itertools.cycle([rng.randint(1, rows) for _ in range(SAMPLE_SIZE)])
+    user_ids = itertools.cycle([FIRST_USER_ID + rng.randrange(users) for _ in range(SAMPLE_SIZE)])
+    usernames = itertools.cycle([f"user{FIRST_USER_ID + rng.randrange(users)}" for _ in range(SAMPLE_SIZE)])
+    statuses = itertools.cycle(ACTIVE_STATUSES)
+    new_user = SimpleNamespace(id=FIRST_USER_ID + users + 1, username='benchmark_user')
+    new_request = {
+        'currency': 'USDT', 'amount': 150.0, 'sum_uah': 6225.0, 'exchange_rate': 41.5, 'bank_name': 'Monobank',
+        'card_info': 'UA213223130000026007233566001', 'card_number': '4111 1111 1111 1111',
+        'fio': 'Шевченко Тарас Григорович', 'inn': '1234567890',
+    }
+    last_page = max(1, rows // 10)
+    prefix = f"database[{rows}]"
+
+    return [
+        Benchmark(f"{prefix}.get_request_by_id", lambda: db.get_request_by_id(next(request_ids))),
+        Benchmark(f"{prefix}.get_user_profile", lambda: db.get_user_profile(next(user_ids))),
+        Benchmark(f"{prefix}.get_profile_by_id_or_login (username)",
+                  lambda: db.get_profile_by_id_or_login(next(usernames))),
+        Benchmark(f"{prefix}.get_request_by_user_id", lambda: db.get_request_by_user_id(next(user_ids))),
+        Benchmark(f"{prefix}.get_request_by_user_id_or_login (username)",
+                  lambda: db.get_request_by_user_id_or_login(next(usernames))),
+        Benchmark(f"{prefix}.get_user_completed_request_count",
+                  lambda: db.get_user_completed_request_count(next(user_ids))),
+        Benchmark(f"{prefix}.get_referral_count_by_referrer_id",
+                  lambda: db.get_referral_count_by_referrer_id(next(user_ids))),
+        Benchmark(f"{prefix}.get_all_requests (first page)", lambda: db.get_all_requests(page=1)),
+        Benchmark(f"{prefix}.get_all_requests (last page)", lambda: db.get_all_requests(page=last_page)),
+        Benchmark(f"{prefix}.get_active_requests (first page)", lambda: db.get_active_requests(page=1)),
+        Benchmark(f"{prefix}.update_request_status",
+                  lambda: db.update_request_status(next(request_ids), next(statuses))),
+        Benchmark(f"{prefix}.update_request_data",
+                  lambda: db.update_request_data(next(request_ids), {'user_message_id': 42})),
+        Benchmark(f"{prefix}.create_or_update_user_profile",
+                  lambda: db.create_or_update_user_profile(next(user_ids), {'username': 'renamed'})),
+        Benchmark(f"{prefix}.create_exchange_request",
+                  lambda: db.create_exchange_request(new_user, dict(new_request))),
+    ]
+
+
+async def benchmarks(options, stack) -> list[Benchmark]:
+    data_dir = options.data_dir or os.path.join(tempfile.gettempdir(), 'exchange_bot_benchmarks')
+    result = []
+    for rows in (int(value) for value in options.rows.split(',') if value.strip()):
+        # The cases only touch the database when they run, so sizes that are filtered out are never generated.
+        db = DatabaseManager(os.path.join(data_dir, f"run_{rows}.db"))
+        cases = [case for case in _database_benchmarks(db, rows) if not options.filter or options.filter in case.name]
+        if not cases:
+            continue
+        prepare_database(data_dir, rows, db.db_path)
+        db.connect()
+        db.setup_database()
+        stack.callback(db.close)
+        result.extend(cases)
+    return result
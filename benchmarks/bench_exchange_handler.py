@@ -0,0 +1,87 @@
+# benchmarks/bench_exchange_handler.py
+"""
+Hot paths of ExchangeHandler, called directly with synthetic updates, an in-memory
+SQLite database and a Bot whose API calls never leave the process. The numbers are the
+CPU cost of a handler including PTB's request building, without network latency.
+
+Part of the suite (python -m benchmarks.suite --filter exchange_handler).
+"""
+
+import json
+from types import SimpleNamespace
+
+from handlers.exchange_handler import ExchangeHandler
+from benchmarks.stubs import (
+    ADMIN_IDS, make_telegram_bot, make_bot_stub, make_context, message_update, callback_update
+)
+from benchmarks.suite import Benchmark
+
+USER_ID = 100000001
+REQUEST_OWNER_ID = 100000002
+
+REQUISITES = {
+    'currency': 'USDT',
+    'amount': 150.0,
+    'exchange_rate': 41.5,
+    'sum_uah': 6225.0,
+    'original_sum_uah': 6225.0,
+    'bank_name': 'Monobank',
+    'card_info': 'UA213223130000026007233566001',
+    'card_number': '4111 1111 1111 1111',
+    'fio': 'Шевченко Тарас Григорович',
+    'inn': '1234567890',
+}
+
+
+async def benchmarks(options, stack) -> list[Benchmark]:
+    telegram_bot = await make_telegram_bot()
+    stack.push_async_callback(telegram_bot.shutdown)
+    bot = make_bot_stub(telegram_bot)
+    stack.callback(bot.db.close)
+    handler = ExchangeHandler(bot)
+
+    bot.db.create_or_update_user_profile(USER_ID, {'username': f"user{USER_ID}"})
+    owner = SimpleNamespace(id=REQUEST_OWNER_ID, username=f"user{REQUEST_OWNER_ID}")
+    request_id = bot.db.create_exchange_request(owner, dict(REQUISITES))
+    bot.db.update_request_data(request_id, {
+        'transaction_hash': 'f' * 64,
+        'admin_message_ids': json.dumps({admin_id: 1 for admin_id in ADMIN_IDS}),
+    })
+    request_data = bot.db.get_request_by_id(request_id)
+    admin_text, admin_keyboard = handler._prepare_admin_notification(request_data)
+
+    start_update = message_update(telegram_bot, USER_ID, '/start')
+    menu_update = callback_update(telegram_bot, USER_ID, 'back_to_menu')
+    amount_update = message_update(telegram_bot, USER_ID, '150')
+    inn_update = message_update(telegram_bot, USER_ID, REQUISITES['inn'])
+
+    async def start_command():
+        await handler.start_command(start_update, make_context(telegram_bot))
+
+    async def main_menu():
+        await handler.main_menu(menu_update, make_context(telegram_bot))
+
+    async def entering_amount():
+        await handler.entering_amount(amount_update, make_context(telegram_bot, {'currency': 'USDT'}))
+
+    async def show_final_confirmation():
+        await handler._show_final_confirmation(inn_update, make_context(telegram_bot, dict(REQUISITES)))
+
+    def prepare_admin_notification():
+        handler._prepare_admin_notification(request_data)
+
+    def render_admin_notification():
+        handler._render_admin_notification(request_data, None)
+
+    async def update_admin_messages():
+        await handler._update_admin_messages(request_id, admin_text, admin_keyboard)
+
+    return [
+        Benchmark('exchange_handler.start_command', start_command),
+        Benchmark('exchange_handler.main_menu', main_menu),
+        Benchmark('exchange_handler.entering_amount', entering_amount),
+        Benchmark('exchange_handler._show_final_confirmation', show_final_confirmation),
+        Benchmark('exchange_handler._prepare_admin_notification', prepare_admin_notification),
+        Benchmark('exchange_handler._render_admin_notification (cache miss)', render_admin_notification),
+        Benchmark(f"exchange_handler._update_admin_messages ({len(ADMIN_IDS)} admins)", update_admin_messages),
+    ]
@@ -0,0 +1,137 @@
+# benchmarks/stubs.py
+"""
+In-memory stand-ins for running handlers outside of a bot process: a telegram.Bot whose
+requests never leave the process, a minimal Bot object with the attributes the handlers
+use, and builders for synthetic updates.
+"""
+
+import json
+import time
+from types import SimpleNamespace
+
+from telegram import Bot, Update
+from telegram.request import BaseRequest
+
+from config_manager import ConfigManager
+from database_manager import DatabaseManager
+from metrics import MetricsRegistry
+from rate_engine import RateEngine
+from template_registry import TemplateRegistry
+from callback_router import CallbackRouter
+
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'Benchmark Bot', 'username': 'benchmark_bot'}
+ADMIN_IDS = (900000001, 900000002)
+
+
+class InMemoryRequest(BaseRequest):
+    """
+    Answers Bot API calls without any I/O, so a benchmark measures the handler and PTB's
+    request serialization but not the network. Methods that return a message echo it back.
+    """
+
+    def __init__(self):
+        self._next_message_id = 1
+
+    @property
+    def read_timeout(self) -> float | None:
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None) -> tuple[int, bytes]:
+        api_method = url.rsplit('/', 1)[-1]
+        params = request_data.json_parameters if request_data else {}
+        if api_method == 'getMe':
+            result = BOT_USER
+        elif api_method.startswith(('send', 'edit')):
+            self._next_message_id += 1
+            result = {
+                'message_id': int(params.get('message_id', self._next_message_id)),
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+                'from': BOT_USER,
+                'text': params.get('text', ''),
+            }
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+async def make_telegram_bot() -> Bot:
+    bot = Bot('123456:BENCHMARK', request=InMemoryRequest(), get_updates_request=InMemoryRequest())
+    await bot.initialize()
+    return bot
+
+
+def make_bot_stub(telegram_bot: Bot, db_path: str = ':memory:') -> SimpleNamespace:
+    """Builds an object with the attributes of main.Bot that the handlers rely on."""
+    config = ConfigManager(file_path='benchmark-settings.ini')
+    config.set('User', 'TOKEN', '123456:BENCHMARK')
+    config.set('User', 'ADMIN_CHAT_ID', ','.join(str(admin_id) for admin_id in ADMIN_IDS))
+    config.set('Settings', 'EXCHANGE_RATE', '41.5')
+    config.set('Settings', 'WALLET_ADDRESS', 'TBenchmarkWalletAddress')
+    config.set('Settings', 'SUPPORT_CONTACT', '@support')
+    config.set('Settings', 'TRX_COST_USDT', '15.0')
+    config.set('Settings', 'BOT_ENABLED', 'True')
+    config.set('Settings', 'MIN_REFERRAL_PAYOUT_USD', '20.0')
+    config.set('Settings', 'REVIEW_CHANNEL_URL', 'https://t.me/benchmark_reviews')
+
+    db = DatabaseManager(db_path)
+    db.connect()
+    db.setup_database()
+
+    templates = TemplateRegistry()
+    config.add_change_listener(templates.on_config_changed)
+    return SimpleNamespace(
+        config=config,
+        db=db,
+        templates=templates,
+        metrics=MetricsRegistry(),
+        callback_router=CallbackRouter(),
+        persistence=None,
+        rate_engine=RateEngine(config, []),
+        application=SimpleNamespace(bot=telegram_bot),
+    )
+
+
+def make_context(telegram_bot: Bot, user_data: dict | None = None, args: list | None = None) -> SimpleNamespace:
+    return SimpleNamespace(bot=telegram_bot, user_data=user_data if user_data is not None else {},
+                           args=args or [])
+
+
+def _user(user_id: int) -> dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}", 'username': f"user{user_id}"}
+
+
+def message_update(telegram_bot: Bot, user_id: int, text: str) -> Update:
+    message = {
+        'message_id': 1,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': _user(user_id),
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return Update.de_json({'update_id': 1, 'message': message}, telegram_bot)
+
+
+def callback_update(telegram_bot: Bot, user_id: int, data: str) -> Update:
+    return Update.de_json({'update_id': 1, 'callback_query': {
+        'id': '1',
+        'from': _user(user_id),
+        'chat_instance': str(user_id),
+        'data': data,
+        'message': {
+            'message_id': 1,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': BOT_USER,
+            'text': 'menu',
+        },
+    }}, telegram_bot)
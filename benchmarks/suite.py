@@ -0,0 +1,168 @@
+# benchmarks/suite.py
+"""
+Runs the micro-benchmarks, stores the results as a JSON baseline and compares a run
+against a stored baseline, so performance changes are caught before a deploy.
+
+Every benchmark module listed in MODULES provides `async def benchmarks(options, stack)`,
+which prepares its fixtures (registering their cleanup on the AsyncExitStack) and returns
+a list of Benchmark entries. Each entry is calibrated to run for at least MIN_TIME seconds
+and then repeated; the fastest repetition is the result, the median is reported as well.
+
+Run from the repository root:
+    python -m benchmarks.suite --save benchmarks/baseline.json
+    python -m benchmarks.suite --compare benchmarks/baseline.json --threshold 0.15
+    python -m benchmarks.suite --filter database --rows 10000
+Baselines only compare meaningfully on the machine they were recorded on.
+"""
+
+import sys
+import json
+import time
+import asyncio
+import inspect
+import argparse
+import platform
+import importlib
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime
+from typing import NamedTuple
+
+MODULES = (
+    'benchmarks.bench_callback_routing',
+    'benchmarks.bench_exchange_handler',
+    'benchmarks.bench_database',
+)
+
+MIN_TIME = 0.2
+REPEAT = 5
+
+
+class Benchmark(NamedTuple):
+    """A named callable without arguments; coroutine functions are awaited."""
+    name: str
+    func: object
+
+
+async def _run_once(func, is_async: bool, number: int) -> float:
+    started = time.perf_counter()
+    if is_async:
+        for _ in range(number):
+            await func()
+    else:
+        for _ in range(number):
+            func()
+    return time.perf_counter() - started
+
+
+async def measure(benchmark: Benchmark, min_time: float = MIN_TIME, repeat: int = REPEAT) -> dict:
+    """Calibrates the number of calls like timeit.autorange() and returns per-call timings."""
+    is_async = inspect.iscoroutinefunction(benchmark.func)
+    scale = 1
+    while True:
+        for number in (scale, scale * 2, scale * 5):
+            elapsed = await _run_once(benchmark.func, is_async, number)
+            if elapsed >= min_time:
+                break
+        else:
+            scale *= 10
+            continue
+        break
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        timings.append(await _run_once(benchmark.func, is_async, number) / number)
+    return {
+        'number': number,
+        'min_us': min(timings) * 1e6,
+        'median_us': statistics.median(timings) * 1e6,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_suite(options) -> dict:
+    results = {}
+    for module_name in MODULES:
+        module = importlib.import_module(module_name)
+        async with contextlib.AsyncExitStack() as stack:
+            for benchmark in await module.benchmarks(options, stack):
+                if options.filter and options.filter not in benchmark.name:
+                    continue
+                result = await measure(benchmark, options.min_time, options.repeat)
+                results[benchmark.name] = result
+                print(f"{benchmark.name:<60}{result['min_us']:>12.2f} us{result['median_us']:>12.2f} us (median)",
+                      flush=True)
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Prints the change of every benchmark and returns the names of the regressions."""
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} recorded at {baseline.get('created_at')}:")
+    print(f"{'benchmark':<60}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, result in current['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            print(f"{name:<60}{'-':>12}{result['min_us']:>12.2f}{'new':>9}")
+            continue
+        change = result['min_us'] / reference['min_us'] - 1 if reference['min_us'] else 0.0
+        marker = ''
+        if change > threshold:
+            marker = '  REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            marker = '  faster'
+        print(f"{name:<60}{reference['min_us']:>12.2f}{result['min_us']:>12.2f}{change:>+9.1%}{marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filter', help="only run benchmarks whose name contains this string")
+    parser.add_argument('--save', metavar='PATH', help="write the results as a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="compare the results with a JSON baseline")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="relative slowdown reported as a regression (default: 0.15)")
+    parser.add_argument('--rows', default='10000,1000000',
+                        help="comma-separated table sizes for the database benchmarks")
+    parser.add_argument('--data-dir', help="where the pre-populated databases are cached")
+    parser.add_argument('--min-time', type=float, default=MIN_TIME)
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    options = parser.parse_args()
+
+    # Read the baseline first, so a missing file fails before the long run.
+    baseline = None
+    if options.compare:
+        with open(options.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+
+    current = asyncio.run(run_suite(options))
+
+    if options.save:
+        with open(options.save, 'w', encoding='utf-8') as baseline_file:
+            json.dump(current, baseline_file, indent=2)
+        print(f"\nResults saved to {options.save}")
+
+    if baseline is not None:
+        regressions = compare(baseline, current, options.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {options.threshold:.0%}.")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+# callback_router.py
+
+import logging
+from functools import lru_cache
+from typing import NamedTuple
+
+from telegram import Update
+from telegram.ext import CallbackQueryHandler, ContextTypes
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_DATA_VERSION = 1
+SEPARATOR = ':'
+
+# Action name -> short code used in the compact callback-data format.
+# Codes are part of the wire format: never reuse or change an existing code,
+# add a new one and bump CALLBACK_DATA_VERSION if the meaning of the arguments changes.
+ACTION_CODES = {
+    'user_confirms_sending': 'us',
+    'cancel_by_user': 'cu',
+    'by_user_confirm_transfer': 'ut',
+    'leave_review': 'lr',
+    'confirm_payment': 'cp',
+    'confirm_transfer': 'ct',
+    'confirm_trx_transfer': 'cx',
+    'decline_request': 'dr',
+    'ask_reason': 'ar',
+    'confirm_decline_no_reason': 'dn',
+    'view_req_details': 'vd',
+    'req_page': 'rp',
+    'view_active_req': 'va',
+    'active_req_page': 'ap',
+    'admin_restore_msg': 'rm',
+    'ref_page': 'fp',
+    'admin_profile': 'pf',
+    'admin_sla': 'sl',
+}
+CODE_ACTIONS = {code: action for action, code in ACTION_CODES.items()}
+# Actions whose first argument is the id of an exchange request.
+REQUEST_ID_ACTIONS = frozenset(
+    ACTION_CODES.keys() - {'req_page', 'active_req_page', 'ref_page', 'admin_profile', 'admin_sla'})
+_VERSION_PREFIX = str(CALLBACK_DATA_VERSION)
+
+
+class CallbackPayload(NamedTuple):
+    """Decoded callback data: the action name and its integer arguments."""
+    action: str
+    args: tuple[int, ...] = ()
+    version: int = 0  # 0 for the legacy 'action_name_<id>' format
+
+    @property
+    def request_id(self) -> int:
+        return self.args[0]
+
+
+def encode_callback_data(action: str, *args: int) -> str:
+    """
+    Encodes an action with integer arguments into the compact format, e.g. '1:cp:123'.
+    Actions without a short code are returned unchanged and must not take arguments.
+    """
+    code = ACTION_CODES.get(action)
+    if code is None:
+        if args:
+            raise ValueError(f"Action '{action}' has no short code and cannot take arguments.")
+        return action
+    return SEPARATOR.join((str(CALLBACK_DATA_VERSION), code, *map(str, args)))
+
+
+@lru_cache(maxsize=4096)
+def decode_callback_data(data: str) -> CallbackPayload | None:
+    """
+    Decodes callback data into a CallbackPayload.
+    Understands the compact format ('1:cp:123') as well as the legacy one ('confirm_payment_123'),
+    which is still attached to buttons of messages sent before the compact format was introduced.
+    Static data without arguments (e.g. 'back_to_menu') decodes to an action without arguments.
+    Returns None for data that cannot be decoded.
+    The result is cached, because PTB checks and handles the same callback data back to back.
+    """
+    if not data:
+        return None
+
+    if data[0].isdigit():
+        parts = data.split(SEPARATOR)
+        if len(parts) < 2 or parts[0] != _VERSION_PREFIX or parts[1] not in CODE_ACTIONS:
+            return None
+        try:
+            return CallbackPayload(
+                CODE_ACTIONS[parts[1]], tuple([int(arg) for arg in parts[2:]]), CALLBACK_DATA_VERSION)
+        except ValueError:
+            return None
+
+    if not data[-1].isdigit():
+        return CallbackPayload(data)
+
+    parts = data.split('_')
+    split_at = len(parts) - 1
+    while split_at > 1 and parts[split_at - 1].isdigit():
+        split_at -= 1
+    action = '_'.join(parts[:split_at])
+    if action not in ACTION_CODES:
+        return None
+    return CallbackPayload(action, tuple([int(arg) for arg in parts[split_at:]]))
+
+
+def action_pattern(*actions: str):
+    """
+    Builds a CallbackQueryHandler pattern that matches callback data of the given actions
+    in any supported format. Checking it costs one cached decode and a set lookup.
+    """
+    accepted = frozenset(actions)
+
+    def matches(data) -> bool:
+        payload = decode_callback_data(data) if isinstance(data, str) else None
+        return payload is not None and payload.action in accepted
+
+    return matches
+
+
+class CallbackRouter:
+    """
+    Dispatches callback queries that are not bound to a conversation state.
+
+    Instead of registering one CallbackQueryHandler with its own regex per action, which PTB
+    tests one after another for every callback, a single handler decodes the callback data
+    once and looks the action up in a dictionary.
+    """
+
+    def __init__(self):
+        self._routes = {}
+
+    def add_route(self, action: str, callback):
+        """Registers the callback for an action. The callback has the usual (update, context) signature."""
+        if action in self._routes:
+            raise ValueError(f"A route for the callback action '{action}' is already registered.")
+        self._routes[action] = callback
+
+    def wrap_routes(self, wrapper):
+        """Replaces every route callback with wrapper(action, callback), e.g. to instrument it."""
+        self._routes = {action: wrapper(action, callback) for action, callback in self._routes.items()}
+
+    def _match(self, data) -> bool:
+        payload = decode_callback_data(data) if isinstance(data, str) else None
+        return payload is not None and payload.action in self._routes
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        payload = decode_callback_data(update.callback_query.data)
+        return await self._routes[payload.action](update, context)
+
+    def setup_handlers(self, application):
+        application.add_handler(CallbackQueryHandler(self.dispatch, pattern=self._match))
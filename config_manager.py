@@ -1,11 +1,35 @@
 import configparser
 import logging
 import asyncio
+import io
 import os
+import stat
+import tempfile
+from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True, slots=True)
+class ConfigSnapshot:
+    """
+    Parsed and validated values of the settings read by the handlers.
+    A new snapshot replaces the old one whenever a setting changes, so a reference
+    taken by a handler always holds a consistent set of values.
+    """
+    token: str
+    admin_ids: frozenset[int]
+    admin_password: str
+    exchange_rate: float
+    wallet_address: str
+    support_contact: str
+    trx_cost_usdt: float
+    min_referral_payout: float
+    bot_enabled: bool
+    review_channel_id: int | None
+    review_channel_url: str | None
+
+
 class ConfigManager:
     """
     A class for managing the bot's configuration from the settings.ini file.
@@ -17,6 +41,14 @@ class ConfigManager:
         self._config = configparser.ConfigParser()
         self._loop = None
         self._defaults = self._get_default_config_structure()
+        self._change_listeners = []
+        self._snapshot = None
+        self._file_signature = None
+        self._unsaved = {}  # (section, option) -> value set since the last write
+        self._save_task = None
+        self._write_lock = asyncio.Lock()
+        self._shared_store = None
+        self._shared = {}  # (section, lowercase option) -> value from the shared settings store
 
     def _get_default_config_structure(self):
         """Returns the default configuration structure as a dictionary."""
@@ -61,8 +93,10 @@ class ConfigManager:
                 logger.error(f"[System] - Failed to create configuration file: {e}")
                 exit(1)
         else:
+            self._file_signature = self._stat_file()
             self._config.read(self.file_path, encoding='utf-8')
             logger.info(f"[System] - Configuration file '{self.file_path}' loaded successfully.")
+            self._rebuild_snapshot()
 
             # Check for missing options
             config_was_modified = self._check_and_add_missing_options()
@@ -98,52 +132,323 @@ class ConfigManager:
         for section, options in self._defaults.items():
             self._config[section] = options
 
+    def _render(self) -> str:
+        buffer = io.StringIO()
+        self._config.write(buffer)
+        return buffer.getvalue()
+
+    def _write_file(self, text: str):
+        """
+        Replaces the file atomically: the text is written to a temporary file in the same
+        directory, flushed to disk and renamed over the old file, so a crash leaves either
+        the old or the new version, never a partial one.
+        """
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.settings-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as temp_file:
+                temp_file.write(text)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            if os.path.exists(self.file_path):
+                os.chmod(temp_path, stat.S_IMODE(os.stat(self.file_path).st_mode))
+            os.replace(temp_path, self.file_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        if hasattr(os, 'O_DIRECTORY'):
+            # Persist the rename itself.
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        # Our own write is not an external edit.
+        self._file_signature = self._stat_file()
+
     def _save_sync(self):
         """Synchronous function to write the configuration to a file."""
         try:
-            with open(self.file_path, 'w', encoding='utf-8') as config_file:
-                self._config.write(config_file)
+            self._write_file(self._render())
+            self._unsaved.clear()
             logger.info("[System] - Configuration saved successfully.")
-        except IOError as e:
+        except OSError as e:
             logger.error(f"[System] - Error saving configuration: {e}")
 
     async def save(self):
         """
-        Asynchronously saves the current configuration without blocking the event loop.
+        Schedules a write of the current configuration without blocking the event loop.
+        Saves requested within the debounce window are coalesced into one write.
+        """
+        if self._save_task is None:
+            self._save_task = asyncio.create_task(self._save_after_debounce())
+
+    async def _save_after_debounce(self):
+        await asyncio.sleep(self.save_debounce)
+        self._save_task = None
+        await self._write_pending()
+
+    async def flush(self):
+        """Writes a pending save immediately; called on shutdown."""
+        if self._save_task is not None:
+            self._save_task.cancel()
+            try:
+                await self._save_task
+            except asyncio.CancelledError:
+                pass
+            self._save_task = None
+        await self._write_pending()
+
+    async def _write_pending(self):
+        async with self._write_lock:
+            if not self._unsaved:
+                return
+            # Rendered on the event loop, so the worker thread never sees a half-applied change.
+            text = self._render()
+            unsaved, self._unsaved = self._unsaved, {}
+            if self._loop is None:
+                self._loop = asyncio.get_running_loop()
+            try:
+                await self._loop.run_in_executor(None, self._write_file, text)
+                logger.info("[System] - Configuration saved successfully.")
+            except OSError as e:
+                # Keep the changes pending; the next save retries them.
+                self._unsaved = {**unsaved, **self._unsaved}
+                logger.error(f"[System] - Error saving configuration: {e}")
+
+    def _stat_file(self) -> tuple | None:
+        """Identifies the current version of the file; an editor replacing the file changes the inode."""
+        try:
+            file_stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return file_stat.st_mtime_ns, file_stat.st_ino, file_stat.st_size
+
+    def _read_and_validate(self) -> tuple[configparser.ConfigParser | None, list[str]]:
+        """Parses the file into a new parser and checks it. Runs in a worker thread."""
+        parser = configparser.ConfigParser()
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as config_file:
+                parser.read_file(config_file)
+        except (OSError, UnicodeDecodeError, configparser.Error) as e:
+            return None, [str(e)]
+
+        errors = [f"[{section}] {option} is missing"
+                  for section, options in self._defaults.items()
+                  for option in options if not parser.has_option(section, option)]
+        for option in ('EXCHANGE_RATE', 'TRX_COST_USDT', 'MIN_REFERRAL_PAYOUT_USD'):
+            value = parser.get('Settings', option, fallback='0')
+            try:
+                float(value)
+            except ValueError:
+                errors.append(f"[Settings] {option} '{value}' is not a number")
+        admin_ids_str = parser.get('User', 'ADMIN_CHAT_ID', fallback='')
+        try:
+            self._split_admin_ids(admin_ids_str)
+        except ValueError:
+            errors.append(f"[User] ADMIN_CHAT_ID '{admin_ids_str}' is not a comma-separated list of numbers")
+        return parser, errors
+
+    async def reload_if_changed(self) -> bool:
+        """
+        Applies external edits of the file. The file is parsed and validated in a worker
+        thread; an invalid file is rejected and the current settings stay active.
+        Returns True if new settings were applied.
         """
+        signature = self._stat_file()
+        if signature is None or signature == self._file_signature:
+            return False
+        self._file_signature = signature
         if self._loop is None:
             self._loop = asyncio.get_running_loop()
-        await self._loop.run_in_executor(None, self._save_sync)
+        parser, errors = await self._loop.run_in_executor(None, self._read_and_validate)
+        if errors:
+            logger.error(f"[System] - Rejected the changes to '{self.file_path}', "
+                         f"the previous configuration stays active: {'; '.join(errors)}")
+            return False
+        return self._apply(parser)
+
+    def _apply(self, parser: configparser.ConfigParser) -> bool:
+        """Swaps in the parsed settings and notifies the listeners of every changed option."""
+        # Changes made in the bot but not written yet win over the file.
+        for (section, option), value in self._unsaved.items():
+            if not parser.has_section(section):
+                parser.add_section(section)
+            parser.set(section, option, value)
+        sections = set(self._config.sections()) | set(parser.sections())
+        changed = []
+        for section in sorted(sections):
+            old = dict(self._config.items(section, raw=True)) if self._config.has_section(section) else {}
+            new = dict(parser.items(section, raw=True)) if parser.has_section(section) else {}
+            changed.extend((section, option) for option in sorted(old.keys() | new.keys())
+                           if old.get(option) != new.get(option))
+        if not changed:
+            return False
+
+        self._config = parser
+        self._rebuild_snapshot()
+        logger.info(f"[System] - Configuration reloaded from '{self.file_path}'. Changed: "
+                    + ", ".join(f"[{section}] {option}" for section, option in changed))
+        if ('User', 'token') in changed:
+            logger.warning("[System] - The bot token has changed; restart the bot to apply it.")
+        for section, option in changed:
+            self._notify_change(section, option)
+        return True
 
     def get(self, section, option, fallback=None):
         """Universal method for getting a value from the configuration."""
+        if self._shared:
+            value = self._shared.get((section, option.lower()))
+            if value is not None:
+                return value
         return self._config.get(section, option, fallback=fallback)
 
     def set(self, section, option, value):
         """Universal method for setting a value in the configuration."""
+        if self._shared_store is not None and self._shared_store.handles(section, option):
+            self._set_shared(section, option, str(value))
+            return
         if not self._config.has_section(section):
             self._config.add_section(section)
+        old_value = self._config.get(section, option, fallback=None)
         self._config.set(section, option, str(value))
+        if old_value != str(value):
+            self._unsaved[(section, option)] = str(value)
+            self._rebuild_snapshot()
+            self._notify_change(section, option)
 
-    @property
-    def token(self) -> str:
-        return self.get('User', 'TOKEN')
+    def use_shared_store(self, store):
+        """Routes changes of the options the store handles to it instead of settings.ini."""
+        self._shared_store = store
+
+    def _set_shared(self, section, option, value: str):
+        old_value = self.get(section, option)
+        if not self._shared_store.write(section, option, value):
+            logger.warning(f"[System] - [{section}] {option} could not be shared and only applies to this instance.")
+        self._shared[(section, option.lower())] = value
+        if old_value != value:
+            self._rebuild_snapshot()
+            self._notify_change(section, option)
+
+    def apply_shared_settings(self, values: dict):
+        """Applies values loaded from the shared settings store: {(section, option): value}."""
+        changed = []
+        for (section, option), value in values.items():
+            if self.get(section, option) != value:
+                changed.append((section, option))
+            self._shared[(section, option.lower())] = value
+        if not changed:
+            return
+        self._rebuild_snapshot()
+        logger.info("[System] - Shared settings changed: " + ", ".join(
+            f"[{section}] {option}" for section, option in changed))
+        for section, option in changed:
+            self._notify_change(section, option)
 
     @property
-    def admin_ids(self) -> list[int]:
-        admin_ids_str = self.get('User', 'ADMIN_CHAT_ID', '')
-        if not admin_ids_str:
-            return []
+    def snapshot(self) -> ConfigSnapshot:
+        """The current settings snapshot; built on first access if load() was not called."""
+        if self._snapshot is None:
+            self._rebuild_snapshot()
+        return self._snapshot
+
+    def _rebuild_snapshot(self):
+        """
+        Parses the settings into a new snapshot and swaps it in.
+        Invalid numbers keep their previous value, and problems are logged only when a value
+        changes instead of on every access.
+        """
+        previous = self._snapshot
+        snapshot = ConfigSnapshot(
+            token=self.get('User', 'TOKEN'),
+            admin_ids=self._parse_admin_ids(previous),
+            admin_password=self.get('Settings', 'ADMIN_PASSWORD'),
+            exchange_rate=self._parse_float('EXCHANGE_RATE', '0', previous and previous.exchange_rate),
+            wallet_address=self.get('Settings', 'WALLET_ADDRESS'),
+            support_contact=self.get('Settings', 'SUPPORT_CONTACT'),
+            trx_cost_usdt=self._parse_float('TRX_COST_USDT', '15.0', previous and previous.trx_cost_usdt),
+            min_referral_payout=self._parse_float(
+                'MIN_REFERRAL_PAYOUT_USD', '20.0', previous and previous.min_referral_payout),
+            bot_enabled=self.get('Settings', 'BOT_ENABLED', 'True') == 'True',
+            review_channel_id=self._parse_review_channel_id(),
+            review_channel_url=self._parse_review_channel_url(),
+        )
+        if snapshot.review_channel_id is None and (previous is None or previous.review_channel_id is not None):
+            logger.warning(
+                "[System] - REVIEW_CHANNEL_ID is not set in settings.ini. Review functionality will be disabled.")
+        if snapshot.review_channel_url is None and (previous is None or previous.review_channel_url is not None):
+            logger.warning(
+                "[System] - REVIEW_CHANNEL_URL is not set in settings.ini. The reviews button will not be displayed.")
+        self._snapshot = snapshot
+
+    @staticmethod
+    def _split_admin_ids(admin_ids_str: str) -> frozenset[int]:
+        """
+        Parses ADMIN_CHAT_ID, the same way at startup and on reload: empty means no admins,
+        anything else must be a comma-separated list of numbers (ValueError otherwise).
+        """
+        if not admin_ids_str.strip():
+            return frozenset()
+        return frozenset(int(admin_id.strip()) for admin_id in admin_ids_str.split(','))
+
+    def _parse_admin_ids(self, previous: ConfigSnapshot | None) -> frozenset[int]:
         try:
-            return [int(admin_id.strip()) for admin_id in admin_ids_str.split(',')]
+            return self._split_admin_ids(self.get('User', 'ADMIN_CHAT_ID', ''))
         except ValueError:
             logger.error(
                 "[System] - Error in ADMIN_CHAT_ID format. Ensure it is a comma-separated list of numbers.")
-            return []
+            return previous.admin_ids if previous is not None else frozenset()
+
+    def _parse_float(self, option: str, fallback: str, previous: float | None) -> float:
+        value = self.get('Settings', option, fallback)
+        try:
+            return float(value)
+        except ValueError:
+            logger.error(f"[System] - Invalid {option} '{value}'. It must be a number.")
+            return previous if previous is not None else float(fallback)
+
+    def _parse_review_channel_id(self) -> int | None:
+        channel_id_str = self.get('Settings', 'REVIEW_CHANNEL_ID', '')
+        if not channel_id_str or 'your_channel_id_here' in channel_id_str:
+            return None
+        try:
+            return int(channel_id_str)
+        except ValueError:
+            logger.error(
+                f"[System] - Invalid REVIEW_CHANNEL_ID '{channel_id_str}'. It must be a valid integer. Review functionality will be disabled.")
+            return None
+
+    def _parse_review_channel_url(self) -> str | None:
+        channel_url = self.get('Settings', 'REVIEW_CHANNEL_URL', '')
+        if not channel_url or 'your_channel_url_here' in channel_url:
+            return None
+        return channel_url
+
+    def add_change_listener(self, callback):
+        """Registers a callback(section, option) that is called whenever a setting changes."""
+        self._change_listeners.append(callback)
+
+    def _notify_change(self, section, option):
+        for callback in self._change_listeners:
+            try:
+                callback(section, option)
+            except Exception as e:
+                logger.error(f"[System] - Config change listener failed for [{section}] {option}: {e}")
+
+    @property
+    def token(self) -> str:
+        return self.snapshot.token
+
+    @property
+    def admin_ids(self) -> frozenset[int]:
+        return self.snapshot.admin_ids
 
     @property
     def admin_password(self) -> str:
-        return self.get('Settings', 'ADMIN_PASSWORD')
+        return self.snapshot.admin_password
 
     @admin_password.setter
     def admin_password(self, value: str):
@@ -151,7 +456,7 @@ class ConfigManager:
 
     @property
     def exchange_rate(self) -> float:
-        return float(self.get('Settings', 'EXCHANGE_RATE', '0'))
+        return self.snapshot.exchange_rate
 
     @exchange_rate.setter
     def exchange_rate(self, value: float):
@@ -159,7 +464,7 @@ class ConfigManager:
 
     @property
     def wallet_address(self) -> str:
-        return self.get('Settings', 'WALLET_ADDRESS')
+        return self.snapshot.wallet_address
 
     @wallet_address.setter
     def wallet_address(self, value: str):
@@ -167,7 +472,7 @@ class ConfigManager:
 
     @property
     def support_contact(self) -> str:
-        return self.get('Settings', 'SUPPORT_CONTACT')
+        return self.snapshot.support_contact
 
     @support_contact.setter
     def support_contact(self, value: str):
@@ -175,16 +480,16 @@ class ConfigManager:
 
     @property
     def trx_cost_usdt(self) -> float:
-        return float(self.get('Settings', 'TRX_COST_USDT', '15.0'))
+        return self.snapshot.trx_cost_usdt
 
     @property
     def min_referral_payout(self) -> float:
-        return float(self.get('Settings', 'MIN_REFERRAL_PAYOUT_USD', '20.0'))
+        return self.snapshot.min_referral_payout
 
     @property
     def bot_enabled(self) -> bool:
         """Returns True if the bot is enabled, False otherwise."""
-        return self.get('Settings', 'BOT_ENABLED', 'True') == 'True'
+        return self.snapshot.bot_enabled
 
     @bot_enabled.setter
     def bot_enabled(self, value: bool):
@@ -194,24 +499,376 @@ class ConfigManager:
     @property
     def review_channel_id(self) -> int | None:
         """Returns the integer ID of the review channel, or None if not set or invalid."""
-        channel_id_str = self.get('Settings', 'REVIEW_CHANNEL_ID', '')
-        if not channel_id_str or 'your_channel_id_here' in channel_id_str:
-            logger.warning(
-                "[System] - REVIEW_CHANNEL_ID is not set in settings.ini. Review functionality will be disabled.")
-            return None
-        try:
-            return int(channel_id_str)
-        except ValueError:
-            logger.error(
-                f"[System] - Invalid REVIEW_CHANNEL_ID '{channel_id_str}'. It must be a valid integer. Review functionality will be disabled.")
-            return None
+        return self.snapshot.review_channel_id
 
     @property
     def review_channel_url(self) -> str | None:
         """Returns the URL of the review channel, or None if not set or invalid."""
-        channel_url = self.get('Settings', 'REVIEW_CHANNEL_URL', '')
-        if not channel_url or 'your_channel_url_here' in channel_url:
-            logger.warning(
-                "[System] - REVIEW_CHANNEL_URL is not set in settings.ini. The reviews button will not be displayed.")
+        return self.snapshot.review_channel_url
+
+    @property
+    def webhook_enabled(self) -> bool:
+        """Returns True if updates should be received via webhook instead of long polling."""
+        return self.get('Webhook', 'MODE', 'polling').strip().lower() == 'webhook'
+
+    @property
+    def webhook_listen(self) -> str:
+        return self.get('Webhook', 'LISTEN', '127.0.0.1')
+
+    @property
+    def webhook_port(self) -> int:
+        return int(self.get('Webhook', 'PORT', '8080'))
+
+    @property
+    def webhook_path(self) -> str:
+        path = self.get('Webhook', 'PATH', '/telegram')
+        return path if path.startswith('/') else f"/{path}"
+
+    @property
+    def webhook_url(self) -> str | None:
+        """Public URL registered with Telegram, or None if the webhook is managed externally."""
+        return self.get('Webhook', 'URL', '') or None
+
+    @property
+    def webhook_secret_token(self) -> str | None:
+        return self.get('Webhook', 'SECRET_TOKEN', '') or None
+
+    @property
+    def webhook_queue_size(self) -> int:
+        """Maximum number of updates waiting to be processed before the webhook answers with 503."""
+        return int(self.get('Webhook', 'QUEUE_SIZE', '1000'))
+
+    @property
+    def transport_pool_size(self) -> int:
+        """Connection pool size for regular Bot API requests (sendMessage, editMessageText, ...)."""
+        return int(self.get('Transport', 'POOL_SIZE', '256'))
+
+    @property
+    def transport_get_updates_pool_size(self) -> int:
+        """Connection pool size reserved for getUpdates, so polling never waits behind outgoing sends."""
+        return int(self.get('Transport', 'GET_UPDATES_POOL_SIZE', '1'))
+
+    @property
+    def transport_keepalive_connections(self) -> int | None:
+        """Maximum number of idle keep-alive connections per pool. Defaults to the pool size."""
+        value = self.get('Transport', 'KEEPALIVE_CONNECTIONS', '')
+        return int(value) if value else None
+
+    @property
+    def transport_keepalive_expiry(self) -> float:
+        return float(self.get('Transport', 'KEEPALIVE_EXPIRY', '5.0'))
+
+    @property
+    def transport_http_version(self) -> str:
+        return self.get('Transport', 'HTTP_VERSION', '1.1')
+
+    @property
+    def transport_connect_timeout(self) -> float:
+        return float(self.get('Transport', 'CONNECT_TIMEOUT', '5.0'))
+
+    @property
+    def transport_read_timeout(self) -> float:
+        return float(self.get('Transport', 'READ_TIMEOUT', '5.0'))
+
+    @property
+    def transport_write_timeout(self) -> float:
+        return float(self.get('Transport', 'WRITE_TIMEOUT', '5.0'))
+
+    @property
+    def transport_pool_timeout(self) -> float:
+        return float(self.get('Transport', 'POOL_TIMEOUT', '1.0'))
+
+    @property
+    def transport_base_url(self) -> str | None:
+        """
+        Bot API server to talk to instead of api.telegram.org, e.g. a local Bot API server
+        or the load-test stand-in. '{token}' is replaced with the token, otherwise it is appended.
+        """
+        return self.get('Transport', 'BASE_URL', '') or None
+
+    @property
+    def allowed_updates(self) -> list[str] | None:
+        """
+        Update types requested from Telegram. Returns None (all types) if set to 'all'.
+        By default only messages and callback queries are requested, as no other types are handled.
+        """
+        value = self.get('Transport', 'ALLOWED_UPDATES', 'message,callback_query')
+        if value.strip().lower() == 'all':
             return None
-        return channel_url
+        return [update_type.strip() for update_type in value.split(',') if update_type.strip()]
+
+    @property
+    def persistence_enabled(self) -> bool:
+        """Returns True if conversation states and user_data should survive restarts."""
+        return self.get('Persistence', 'ENABLED', 'True') == 'True'
+
+    @property
+    def persistence_update_interval(self) -> float:
+        """How often (in seconds) changed conversation data is written to the database."""
+        return float(self.get('Persistence', 'UPDATE_INTERVAL', '10'))
+
+    @property
+    def user_state_ttl_seconds(self) -> float:
+        """Inactivity period after which a user's conversation state and user_data are dropped."""
+        return float(self.get('UserState', 'TTL_SECONDS', '3600'))
+
+    @property
+    def user_state_max_users(self) -> int:
+        """Maximum number of users whose state is kept in memory."""
+        return int(self.get('UserState', 'MAX_USERS', '10000'))
+
+    @property
+    def user_state_sweep_interval(self) -> float:
+        return float(self.get('UserState', 'SWEEP_INTERVAL', '60'))
+
+    def _parse_mapping(self, section: str, option: str, fallback: str) -> dict[str, str]:
+        """Parses a comma-separated list of 'name:value' pairs."""
+        mapping = {}
+        for item in self.get(section, option, fallback).split(','):
+            name, _, value = item.partition(':')
+            if name.strip() and value.strip():
+                mapping[name.strip()] = value.strip()
+        return mapping
+
+    @property
+    def logging_level(self) -> str:
+        return self.get('Logging', 'LEVEL', 'INFO').strip().upper()
+
+    @property
+    def logging_module_levels(self) -> dict[str, str]:
+        """Per-logger levels, e.g. 'httpx:WARNING, handlers.exchange_handler:DEBUG'."""
+        levels = self._parse_mapping('Logging', 'MODULE_LEVELS', 'httpx:WARNING')
+        return {name: level.upper() for name, level in levels.items()}
+
+    @property
+    def logging_sampling(self) -> dict[str, float]:
+        """Share of records below WARNING kept per logger, e.g. 'handlers.exchange_handler:0.1'."""
+        try:
+            return {name: float(rate) for name, rate in self._parse_mapping('Logging', 'SAMPLING', '').items()}
+        except ValueError:
+            logger.error("[System] - Error in [Logging] SAMPLING format. Sampling is disabled.")
+            return {}
+
+    @property
+    def logging_json_enabled(self) -> bool:
+        """Returns True if records should also be written as JSON lines to log/bot.jsonl."""
+        return self.get('Logging', 'JSON', 'True') == 'True'
+
+    @property
+    def logging_rotation(self) -> str:
+        """'size' rotates the log files by size, 'time' at a fixed interval."""
+        return self.get('Logging', 'ROTATION', 'size').strip().lower()
+
+    @property
+    def logging_max_bytes(self) -> int:
+        return int(self.get('Logging', 'MAX_BYTES', str(10 * 1024 * 1024)))
+
+    @property
+    def logging_backup_count(self) -> int:
+        return int(self.get('Logging', 'BACKUP_COUNT', '5'))
+
+    @property
+    def logging_rotation_when(self) -> str:
+        """Rotation interval for 'time' rotation, in TimedRotatingFileHandler notation (e.g. 'midnight', 'H')."""
+        return self.get('Logging', 'WHEN', 'midnight')
+
+    @property
+    def metrics_enabled(self) -> bool:
+        """Returns True if the Prometheus metrics endpoint should be served."""
+        return self.get('Metrics', 'ENABLED', 'True') == 'True'
+
+    @property
+    def metrics_listen(self) -> str:
+        return self.get('Metrics', 'LISTEN', '127.0.0.1')
+
+    @property
+    def metrics_port(self) -> int:
+        return int(self.get('Metrics', 'PORT', '9100'))
+
+    @property
+    def watchdog_enabled(self) -> bool:
+        """Returns True if the event loop lag watchdog should run."""
+        return self.get('Watchdog', 'ENABLED', 'True') == 'True'
+
+    @property
+    def watchdog_interval(self) -> float:
+        return float(self.get('Watchdog', 'INTERVAL', '0.1'))
+
+    @property
+    def watchdog_threshold(self) -> float:
+        """Lag (in seconds) after which the stack of the blocking code is captured."""
+        return float(self.get('Watchdog', 'THRESHOLD', '0.25'))
+
+    @property
+    def watchdog_report_interval(self) -> float:
+        """How often (in seconds) lag percentiles and top offenders are written to the log."""
+        return float(self.get('Watchdog', 'REPORT_INTERVAL', '300'))
+
+    @property
+    def capture_enabled(self) -> bool:
+        """Returns True if incoming updates should be recorded for replay."""
+        return self.get('Capture', 'ENABLED', 'False') == 'True'
+
+    @property
+    def capture_path(self) -> str:
+        """Capture file path; may contain strftime() fields, '.gz' enables compression."""
+        return self.get('Capture', 'PATH', 'capture/updates-%Y%m%d.jsonl.gz')
+
+    @property
+    def capture_anonymize(self) -> bool:
+        return self.get('Capture', 'ANONYMIZE', 'True') == 'True'
+
+    @property
+    def shared_settings_enabled(self) -> bool:
+        """Returns True if the runtime settings should be shared between instances through the database."""
+        return self.get('SharedSettings', 'ENABLED', 'False') == 'True'
+
+    @property
+    def shared_settings_poll_interval(self) -> float:
+        """Upper bound (in seconds) for how long a change takes to reach the other instances."""
+        return float(self.get('SharedSettings', 'POLL_INTERVAL', '1.0'))
+
+    @property
+    def rates_providers(self) -> list[str]:
+        """Rate providers in order of preference ('http', 'file', 'static'); empty for the manual rate only."""
+        value = self.get('Rates', 'PROVIDERS', '')
+        return [name.strip().lower() for name in value.split(',') if name.strip()]
+
+    @property
+    def rates_refresh_interval(self) -> float:
+        return float(self.get('Rates', 'REFRESH_INTERVAL', '60'))
+
+    @property
+    def rates_max_age(self) -> float:
+        """Age (in seconds) after which a quote is stale and the manual rate is used instead."""
+        return float(self.get('Rates', 'MAX_AGE', '300'))
+
+    @property
+    def rates_margin_percent(self) -> float:
+        """Percentage subtracted from the market rate."""
+        return float(self.get('Rates', 'MARGIN_PERCENT', '0'))
+
+    @property
+    def rates_spread(self) -> float:
+        """Fixed amount (UAH) subtracted from the market rate after the margin."""
+        return float(self.get('Rates', 'SPREAD', '0'))
+
+    @property
+    def rates_decimals(self) -> int:
+        return int(self.get('Rates', 'DECIMALS', '2'))
+
+    @property
+    def rates_http_url(self) -> str | None:
+        return self.get('Rates', 'HTTP_URL', '') or None
+
+    @property
+    def rates_http_path(self) -> str:
+        """Dotted path to the rate in the JSON response, e.g. 'data.0.price'."""
+        return self.get('Rates', 'HTTP_PATH', '')
+
+    @property
+    def rates_http_timeout(self) -> float:
+        return float(self.get('Rates', 'HTTP_TIMEOUT', '5.0'))
+
+    @property
+    def rates_file_path(self) -> str | None:
+        return self.get('Rates', 'FILE_PATH', '') or None
+
+    @property
+    def rates_file_json_path(self) -> str:
+        """Dotted path to the rate if the file contains JSON; empty if it holds a plain number."""
+        return self.get('Rates', 'FILE_JSON_PATH', '')
+
+    @property
+    def rates_static_rate(self) -> float:
+        return float(self.get('Rates', 'STATIC_RATE', '0'))
+
+    @property
+    def expiry_enabled(self) -> bool:
+        """Returns True if requests left waiting for the user should be declined automatically."""
+        return self.get('Expiry', 'ENABLED', 'False') == 'True'
+
+    @property
+    def expiry_interval(self) -> float:
+        """How often (in seconds) stale requests are looked for."""
+        return float(self.get('Expiry', 'INTERVAL', '60'))
+
+    @property
+    def expiry_timeouts(self) -> dict[str, float]:
+        """Seconds without changes after which a request in each status expires; 0 minutes disables a status."""
+        minutes = {
+            'awaiting payment': float(self.get('Expiry', 'AWAITING_PAYMENT_MINUTES', '120')),
+            'awaiting trx transfer': float(self.get('Expiry', 'AWAITING_TRX_TRANSFER_MINUTES', '240')),
+        }
+        return {status: value * 60 for status, value in minutes.items() if value > 0}
+
+    @property
+    def expiry_batch_size(self) -> int:
+        return int(self.get('Expiry', 'BATCH_SIZE', '100'))
+
+    @property
+    def sla_enabled(self) -> bool:
+        """Returns True if admins should be alerted about requests waiting on them for too long."""
+        return self.get('SLA', 'ENABLED', 'False') == 'True'
+
+    @property
+    def sla_limits(self) -> dict[str, float]:
+        """Seconds a request may wait in each admin-side status; 0 minutes disables a status."""
+        minutes = {
+            'awaiting confirmation': float(self.get('SLA', 'AWAITING_CONFIRMATION_MINUTES', '30')),
+            'payment received': float(self.get('SLA', 'PAYMENT_RECEIVED_MINUTES', '60')),
+        }
+        return {status: value * 60 for status, value in minutes.items() if value > 0}
+
+    @property
+    def sla_check_interval(self) -> float:
+        """How often (in seconds) overdue requests are collected into a digest."""
+        return float(self.get('SLA', 'CHECK_INTERVAL', '60'))
+
+    @property
+    def notifications_rate(self) -> float:
+        """Queued notifications (each a few messages) started per second."""
+        return float(self.get('Notifications', 'RATE', '5'))
+
+    @property
+    def save_debounce(self) -> float:
+        """Seconds to wait after a change before writing settings.ini, so rapid changes are written once."""
+        return float(self.get('Config', 'SAVE_DEBOUNCE', '1.0'))
+
+    @property
+    def reload_interval(self) -> float:
+        """How often (in seconds) settings.ini is checked for external edits; 0 disables hot reload."""
+        return float(self.get('Config', 'RELOAD_INTERVAL', '2'))
+
+
+class ConfigWatcher:
+    """
+    Polls the configuration file and applies external edits while the bot is running.
+    Settings read at startup only (transport, webhook, logging, ...) still need a restart.
+    """
+
+    def __init__(self, config: ConfigManager, interval: float):
+        self.config = config
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._watch_loop())
+        logger.info(f"[System] - Watching '{self.config.file_path}' for changes every {self.interval}s.")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.config.reload_if_changed()
+            except Exception as e:
+                logger.error(f"[System] - Configuration reload failed: {e}", exc_info=True)
@@ -5,6 +5,7 @@
 import sqlite3
 import logging
 import json
+from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +39,8 @@ class DatabaseManager:
             'user_message_id': 'INTEGER',
             'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP',
             'updated_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP',
-            'referral_payout_amount': 'REAL DEFAULT 0.0'
+            'referral_payout_amount': 'REAL DEFAULT 0.0',
+            'finished_at': 'TIMESTAMP'
         },
         'user_profiles': {
             'user_id': 'INTEGER PRIMARY KEY',
@@ -59,9 +61,89 @@ class DatabaseManager:
             'referred_username': 'TEXT',
             'is_credited': 'BOOLEAN DEFAULT 0',
             'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+        },
+        'persistence_user_data': {
+            'user_id': 'INTEGER PRIMARY KEY',
+            'data': 'TEXT NOT NULL',
+            'updated_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+        },
+        'persistence_chat_data': {
+            'chat_id': 'INTEGER PRIMARY KEY',
+            'data': 'TEXT NOT NULL',
+            'updated_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+        },
+        'persistence_conversations': {
+            'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+            'name': 'TEXT NOT NULL',
+            'conversation_key': 'TEXT NOT NULL',
+            'state': 'INTEGER',
+            'updated_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+        },
+        'rate_history': {
+            'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+            'rate': 'REAL NOT NULL',
+            'market_rate': 'REAL',
+            'source': 'TEXT',
+            'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+        },
+        'rate_rollups': {
+            'period': 'TEXT NOT NULL',
+            'period_start': 'TIMESTAMP NOT NULL',
+            'min_rate': 'REAL NOT NULL',
+            'max_rate': 'REAL NOT NULL',
+            'sum_rate': 'REAL NOT NULL',
+            'samples': 'INTEGER NOT NULL',
+            'last_rate': 'REAL NOT NULL'
+        },
+        'request_status_events': {
+            'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+            'request_id': 'INTEGER NOT NULL',
+            'from_status': 'TEXT',
+            'to_status': 'TEXT NOT NULL',
+            'changed_by': 'INTEGER',
+            'duration_seconds': 'REAL',
+            'created_at': 'TIMESTAMP NOT NULL'
+        },
+        'request_stats_rollups': {
+            'period': 'TEXT NOT NULL',
+            'period_start': 'TIMESTAMP NOT NULL',
+            'status': 'TEXT NOT NULL',
+            'requests': 'INTEGER NOT NULL',
+            'volume_usdt': 'REAL NOT NULL',
+            'payout_uah': 'REAL NOT NULL',
+            'referral_payout_usd': 'REAL NOT NULL',
+            'trx_requests': 'INTEGER NOT NULL'
+        },
+        'shared_settings': {
+            'section': 'TEXT NOT NULL',
+            'option': 'TEXT NOT NULL',
+            'value': 'TEXT NOT NULL',
+            'version': 'INTEGER NOT NULL',
+            'updated_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
         }
     }
 
+    # index_name -> (table_name, columns, is_unique)
+    TABLE_INDEXES = {
+        'idx_exchange_requests_status_updated_at': ('exchange_requests', ('status', 'updated_at'), False),
+        'idx_persistence_conversations_key': ('persistence_conversations', ('name', 'conversation_key'), True),
+        'idx_rate_history_created_at': ('rate_history', ('created_at',), False),
+        'idx_rate_rollups_period': ('rate_rollups', ('period', 'period_start'), True),
+        'idx_request_status_events_created_at': ('request_status_events', ('created_at',), False),
+        'idx_request_status_events_request': ('request_status_events', ('request_id', 'id'), False),
+        'idx_request_stats_rollups_period': ('request_stats_rollups', ('period', 'period_start', 'status'), True),
+        'idx_shared_settings_key': ('shared_settings', ('section', 'option'), True),
+        'idx_shared_settings_version': ('shared_settings', ('version',), False),
+    }
+
+    # Rollup periods and the SQLite strftime() format of their start timestamps.
+    ROLLUP_PERIODS = {'hour': '%Y-%m-%d %H:00:00', 'day': '%Y-%m-%d 00:00:00'}
+    # Finished statuses whose requests are counted in request_stats_rollups.
+    STATS_STATUSES = ('completed', 'declined')
+    # Statuses of requests that are still being processed.
+    ACTIVE_STATUSES = ('new', 'awaiting payment', 'awaiting trx transfer', 'awaiting confirmation',
+                       'payment received', 'funds sent')
+
     def __init__(self, db_path=r'database/SafePay_bot.db'):
         """
         Initializes the database manager.
@@ -69,6 +151,7 @@ class DatabaseManager:
         """
         self.db_path = db_path
         self._conn = None
+        self._status_listeners = []
 
     def connect(self):
         """Establishes a connection to the database."""
@@ -113,10 +196,24 @@ class DatabaseManager:
             logger.error(f"[System] - An error occurred during schema verification: {e}")
             self._conn.rollback()
 
+    def _create_indexes(self):
+        """Creates the indexes declared in TABLE_INDEXES if they don't exist yet."""
+        try:
+            cursor = self._conn.cursor()
+            for index_name, (table_name, columns, is_unique) in self.TABLE_INDEXES.items():
+                unique = "UNIQUE " if is_unique else ""
+                cursor.execute(
+                    f"CREATE {unique}INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(columns)});")
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"[System] - An error occurred while creating indexes: {e}")
+            self._conn.rollback()
+
     def setup_database(self):
         """
-        Creates necessary tables if they don't exist, then verifies
-        and adds any missing columns according to TABLE_SCHEMAS.
+        Creates necessary tables if they don't exist, verifies and adds
+        any missing columns according to TABLE_SCHEMAS, then creates the
+        indexes declared in TABLE_INDEXES.
         """
         if not self._conn:
             self.connect()
@@ -132,6 +229,8 @@ class DatabaseManager:
             logger.info("[System] - Initial table creation check complete.")
 
             self._verify_and_add_columns()
+            self._create_indexes()
+            self._backfill_request_stats()
 
             logger.info(
                 "[System] - Database setup and schema verification complete. All tables are up-to-date.")
@@ -140,17 +239,30 @@ class DatabaseManager:
             logger.error(f"[System] - Failed to setup database schema: {e}")
             self._conn.rollback()
 
+    def _backfill_request_stats(self):
+        """Builds the request statistics once for databases created before the rollups existed."""
+        cursor = self._conn.cursor()
+        cursor.execute("SELECT 1 FROM request_stats_rollups LIMIT 1")
+        if cursor.fetchone() is not None:
+            return
+        cursor.execute("SELECT 1 FROM exchange_requests WHERE status IN (?, ?) LIMIT 1", self.STATS_STATUSES)
+        if cursor.fetchone() is not None:
+            logger.info("[System] - Building request statistics from existing requests...")
+            self.rebuild_request_stats()
+
     def create_exchange_request(self, user, user_data):
         """
         Creates a new exchange request and automatically saves/updates the user's profile.
+        Requests that need TRX start in 'awaiting trx transfer', all others in 'awaiting payment'.
         """
+        status = 'awaiting trx transfer' if 'trx_address' in user_data else 'awaiting payment'
         query = """
         INSERT INTO exchange_requests 
         (user_id, username, status, currency, amount_currency, amount_uah, exchange_rate, bank_name, card_info, card_number, fio, inn, needs_trx, trx_address, referral_payout_amount)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
         params = (
-            user.id, user.username, 'awaiting payment', user_data.get(
+            user.id, user.username, status, user_data.get(
                 'currency'), user_data.get('amount'),
             user_data.get('sum_uah'), user_data.get('exchange_rate'), user_data.get('bank_name'),
             user_data.get('card_info'), user_data.get('card_number'), user_data.get('fio'),
@@ -161,6 +273,8 @@ class DatabaseManager:
             cursor = self._conn.cursor()
             cursor.execute(query, params)
             request_id = cursor.lastrowid
+            self._add_status_event(cursor, request_id, None, status, None, None,
+                                   datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'))
             logger.info(
                 f"[Uid] ({user.id}, {user.username}) - Created new exchange request with ID: {request_id}")
 
@@ -343,17 +457,203 @@ class DatabaseManager:
         return requests_on_page, total_pages
     # --- КОНЕЦ НОВОГО МЕТОДА ---
 
-    def update_request_status(self, request_id, status):
-        """Updates the status of a request."""
-        query = "UPDATE exchange_requests SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?"
+    def update_request_status(self, request_id, status, changed_by: int | None = None,
+                              expected_statuses: tuple[str, ...] | None = None) -> bool:
+        """
+        Updates the status of a request.
+        Every transition is appended to request_status_events together with the time the
+        request spent in its previous status; `changed_by` is the admin who made the change
+        (None for the user's own actions). Entering or leaving a finished status (see
+        STATS_STATUSES) updates the request statistics rollups in the same transaction.
+        With `expected_statuses` the request is only changed if it is in one of them, so a
+        flow cannot revive a request that was declined or expired in the meantime.
+        Returns True if the status was applied.
+        """
         try:
-            cursor = self._conn.cursor()
-            cursor.execute(query, (status, request_id))
+            previous = self._change_status(self._conn.cursor(), request_id, status, changed_by, expected_statuses)
             self._conn.commit()
-            logger.info(f"[System] - Updated status for request {request_id} to '{status}'.")
         except sqlite3.Error as e:
             logger.error(f"[System] - Failed to update status for request {request_id}: {e}")
             self._conn.rollback()
+            return False
+        if previous is None:
+            logger.warning(f"[System] - Status of request {request_id} was not changed to '{status}': "
+                           f"it is not in {expected_statuses}.")
+            return False
+        logger.info(f"[System] - Updated status for request {request_id} to '{status}'.")
+        if previous != status:
+            self._notify_status_listeners(request_id, previous, status)
+        return True
+
+    def add_status_listener(self, callback):
+        """Registers a callback(request_id, old_status, new_status) called after every committed transition."""
+        self._status_listeners.append(callback)
+
+    def _notify_status_listeners(self, request_id: int, old_status: str, new_status: str):
+        for callback in self._status_listeners:
+            try:
+                callback(request_id, old_status, new_status)
+            except Exception as e:
+                logger.error(f"[System] - Status listener failed for request {request_id}: {e}")
+
+    def _change_status(self, cursor, request_id, status, changed_by: int | None,
+                       expected_statuses: tuple[str, ...] | None = None) -> str | None:
+        """
+        Does the work of update_request_status without committing. Returns the previous
+        status, or None if the request does not exist or is not in `expected_statuses`.
+        """
+        cursor.execute("""
+        SELECT status, finished_at,
+               (SELECT created_at FROM request_status_events
+                WHERE request_id = exchange_requests.id ORDER BY id DESC LIMIT 1) AS status_since
+        FROM exchange_requests WHERE id = ?
+        """, (request_id,))
+        row = cursor.fetchone()
+        if row is None or (expected_statuses is not None and row['status'] not in expected_statuses):
+            return None
+        changed_at = datetime.now(timezone.utc).replace(microsecond=0)
+        now = changed_at.strftime('%Y-%m-%d %H:%M:%S')
+        finished_at = row['finished_at'] if row['status'] == status else (
+            now if status in self.STATS_STATUSES else None)
+        # Conditional on the status read above, so a concurrent change by another instance is not overwritten.
+        cursor.execute(
+            "UPDATE exchange_requests SET status = ?, finished_at = ?, updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = ? AND status = ?",
+            (status, finished_at, request_id, row['status']))
+        if cursor.rowcount == 0:
+            return None
+        if row['status'] != status:
+            duration = None
+            if row['status_since']:
+                since = datetime.strptime(row['status_since'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+                duration = max(0.0, (changed_at - since).total_seconds())
+            self._add_status_event(cursor, request_id, row['status'], status, changed_by, duration, now)
+            if row['status'] in self.STATS_STATUSES and row['finished_at']:
+                self._add_to_request_stats(cursor, request_id, row['status'], row['finished_at'], -1)
+            if status in self.STATS_STATUSES:
+                self._add_to_request_stats(cursor, request_id, status, now, 1)
+        return row['status']
+
+    def touch_request(self, request_id: int, expected_statuses: tuple[str, ...]) -> bool:
+        """
+        Marks a request in one of `expected_statuses` as active now, so the expiry job leaves
+        it alone while the user is completing a step. Returns False if it is in another status.
+        """
+        query = (f"UPDATE exchange_requests SET updated_at = CURRENT_TIMESTAMP "
+                 f"WHERE id = ? AND status IN ({', '.join('?' * len(expected_statuses))})")
+        try:
+            cursor = self._conn.cursor()
+            cursor.execute(query, (request_id, *expected_statuses))
+            self._conn.commit()
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error(f"[System] - Failed to touch request {request_id}: {e}")
+            self._conn.rollback()
+            return False
+
+    def _begin_immediate(self, cursor):
+        if not self._conn.in_transaction:
+            # Take the write lock before reading, so two instances cannot decline (and refund) a request twice.
+            cursor.execute("BEGIN IMMEDIATE")
+
+    def _decline(self, cursor, request_id: int, changed_by: int | None, expected_statuses: tuple[str, ...]):
+        """
+        Declines a request in one of `expected_statuses` and returns its referral debit to the
+        user's referral balance, without committing. Returns the request as it was before,
+        or None if it was not declined.
+        """
+        cursor.execute("SELECT * FROM exchange_requests WHERE id = ?", (request_id,))
+        row = cursor.fetchone()
+        if row is None or self._change_status(cursor, request_id, 'declined', changed_by, expected_statuses) is None:
+            return None
+        request = dict(row)
+        if (request.get('referral_payout_amount') or 0) > 0:
+            cursor.execute(
+                "UPDATE user_profiles SET referral_balance = referral_balance + ? WHERE user_id = ?",
+                (request['referral_payout_amount'], request['user_id']))
+        return request
+
+    def decline_request(self, request_id: int, changed_by: int | None = None,
+                        expected_statuses: tuple[str, ...] = ACTIVE_STATUSES) -> dict | None:
+        """
+        Declines a request and refunds its referral debit in one transaction. Returns the
+        request as it was before, or None if it is not in `expected_statuses` (by default:
+        still active), in which case nothing is changed or refunded.
+        """
+        try:
+            cursor = self._conn.cursor()
+            self._begin_immediate(cursor)
+            request = self._decline(cursor, request_id, changed_by, expected_statuses)
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"[System] - Failed to decline request {request_id}: {e}")
+            self._conn.rollback()
+            return None
+        if request is None:
+            logger.warning(f"[System] - Request {request_id} was not declined: it is no longer active.")
+            return None
+        logger.info(f"[System] - Declined request {request_id}; refunded referral debit: "
+                    f"${request.get('referral_payout_amount') or 0:.2f}.")
+        self._notify_status_listeners(request_id, request['status'], 'declined')
+        return request
+
+    def get_stale_requests(self, status: str, updated_before: str, limit: int) -> list[dict]:
+        """
+        Returns up to `limit` requests in `status` that have not changed since `updated_before`,
+        oldest first. Served by the (status, updated_at) index.
+        """
+        query = "SELECT * FROM exchange_requests WHERE status = ? AND updated_at < ? ORDER BY updated_at LIMIT ?"
+        cursor = self._conn.cursor()
+        cursor.execute(query, (status, updated_before, limit))
+        return [dict(row) for row in cursor.fetchall()]
+
+    def expire_requests(self, request_ids: list[int], status: str, updated_before: str) -> list[dict]:
+        """
+        Declines the given requests in one transaction, skipping those that left `status` or
+        changed since `updated_before` in the meantime, and returns the referral debit of the
+        declined ones to the users' referral balances. Returns the declined requests as they
+        were before the change.
+        """
+        if not request_ids:
+            return []
+        try:
+            cursor = self._conn.cursor()
+            self._begin_immediate(cursor)
+            placeholders = ', '.join('?' * len(request_ids))
+            cursor.execute(
+                f"SELECT id FROM exchange_requests WHERE id IN ({placeholders}) AND status = ? AND updated_at < ?",
+                (*request_ids, status, updated_before))
+            expired = []
+            for (request_id,) in cursor.fetchall():
+                request = self._decline(cursor, request_id, None, (status,))
+                if request is not None:
+                    expired.append(request)
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"[System] - Failed to expire requests {request_ids}: {e}")
+            self._conn.rollback()
+            return []
+        if expired:
+            logger.info(f"[System] - Expired {len(expired)} requests in status '{status}': "
+                        f"{', '.join(str(request['id']) for request in expired)}.")
+        for request in expired:
+            self._notify_status_listeners(request['id'], status, 'declined')
+        return expired
+
+    def get_requests_in_statuses(self, statuses: tuple[str, ...]) -> list[dict]:
+        """
+        Returns the id, status and the time the status was entered (UTC) of every request in
+        one of `statuses`. Requests without a recorded transition fall back to updated_at.
+        """
+        placeholders = ', '.join('?' * len(statuses))
+        cursor = self._conn.cursor()
+        cursor.execute(f"""
+        SELECT id, status,
+               COALESCE((SELECT created_at FROM request_status_events
+                         WHERE request_id = exchange_requests.id ORDER BY id DESC LIMIT 1), updated_at) AS status_since
+        FROM exchange_requests WHERE status IN ({placeholders})
+        """, statuses)
+        return [dict(row) for row in cursor.fetchall()]
 
     def update_request_data(self, request_id, data: dict):
         """
@@ -462,4 +762,180 @@ class DatabaseManager:
         cursor = self._conn.cursor()
         cursor.execute(query, (user_id,))
         result = cursor.fetchone()
-        return result[0] if result else 0
\ No newline at end of file
+        return result[0] if result else 0
+
+    def get_shared_settings_version(self) -> int:
+        """Returns the version of the last shared settings change (0 if there is none)."""
+        cursor = self._conn.cursor()
+        cursor.execute("SELECT MAX(version) FROM shared_settings")
+        result = cursor.fetchone()
+        return result[0] or 0
+
+    def get_shared_settings(self, since_version: int = 0) -> list[dict]:
+        """Returns the shared settings changed after the given version, oldest change first."""
+        query = "SELECT section, option, value, version FROM shared_settings WHERE version > ? ORDER BY version"
+        cursor = self._conn.cursor()
+        cursor.execute(query, (since_version,))
+        return [dict(row) for row in cursor.fetchall()]
+
+    def set_shared_setting(self, section: str, option: str, value: str, only_if_missing: bool = False) -> bool:
+        """
+        Stores a shared setting under a new version number. The version is computed in the
+        same statement, so concurrent writers from several processes never share a version.
+        With only_if_missing, an existing value is kept (used to seed the table).
+        Returns True if the value was written.
+        """
+        conflict = "DO NOTHING" if only_if_missing else \
+            "DO UPDATE SET value = excluded.value, version = excluded.version, updated_at = CURRENT_TIMESTAMP"
+        query = f"""
+        INSERT INTO shared_settings (section, option, value, version)
+        SELECT ?, ?, ?, COALESCE(MAX(version), 0) + 1 FROM shared_settings WHERE true
+        ON CONFLICT (section, option) {conflict}
+        """
+        try:
+            cursor = self._conn.cursor()
+            cursor.execute(query, (section, option, value))
+            self._conn.commit()
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error(f"[System] - Failed to store shared setting [{section}] {option}: {e}")
+            self._conn.rollback()
+            return False
+
+    def record_rate(self, rate: float, source: str, market_rate: float | None = None,
+                    recorded_at: datetime | None = None):
+        """
+        Appends a rate change to the history and folds it into the hourly and daily rollups
+        in the same transaction, so aggregate queries never have to scan the history.
+        """
+        recorded_at = recorded_at or datetime.now(timezone.utc)
+        try:
+            cursor = self._conn.cursor()
+            cursor.execute(
+                "INSERT INTO rate_history (rate, market_rate, source, created_at) VALUES (?, ?, ?, ?)",
+                (rate, market_rate, source, recorded_at.strftime('%Y-%m-%d %H:%M:%S')))
+            for period, start_format in self.ROLLUP_PERIODS.items():
+                cursor.execute("""
+                INSERT INTO rate_rollups (period, period_start, min_rate, max_rate, sum_rate, samples, last_rate)
+                VALUES (?, ?, ?, ?, ?, 1, ?)
+                ON CONFLICT (period, period_start) DO UPDATE SET
+                    min_rate = MIN(min_rate, excluded.min_rate),
+                    max_rate = MAX(max_rate, excluded.max_rate),
+                    sum_rate = sum_rate + excluded.sum_rate,
+                    samples = samples + 1,
+                    last_rate = excluded.last_rate
+                """, (period, recorded_at.strftime(start_format), rate, rate, rate, rate))
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"[System] - Failed to record the exchange rate {rate} from '{source}': {e}")
+            self._conn.rollback()
+
+    def get_rate_rollups(self, period: str, since: str, until: str | None = None) -> list[dict]:
+        """Returns the 'hour' or 'day' rollups with period_start in [since, until), oldest first."""
+        query = "SELECT * FROM rate_rollups WHERE period = ? AND period_start >= ?"
+        params = [period, since]
+        if until is not None:
+            query += " AND period_start < ?"
+            params.append(until)
+        cursor = self._conn.cursor()
+        cursor.execute(query + " ORDER BY period_start", params)
+        return [dict(row) for row in cursor.fetchall()]
+
+    def get_rate_before(self, since: str) -> float | None:
+        """Returns the last recorded rate before the given timestamp, i.e. the rate in effect at that time."""
+        query = "SELECT last_rate FROM rate_rollups WHERE period = 'hour' AND period_start < ? " \
+                "ORDER BY period_start DESC LIMIT 1"
+        cursor = self._conn.cursor()
+        cursor.execute(query, (since,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def get_rate_history(self, since: str, until: str | None = None) -> list[dict]:
+        """Returns the individual rate changes in [since, until), oldest first."""
+        query = "SELECT * FROM rate_history WHERE created_at >= ?"
+        params = [since]
+        if until is not None:
+            query += " AND created_at < ?"
+            params.append(until)
+        cursor = self._conn.cursor()
+        cursor.execute(query + " ORDER BY created_at", params)
+        return [dict(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _add_status_event(cursor, request_id: int, from_status: str | None, to_status: str,
+                          changed_by: int | None, duration: float | None, created_at: str):
+        cursor.execute(
+            "INSERT INTO request_status_events "
+            "(request_id, from_status, to_status, changed_by, duration_seconds, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (request_id, from_status, to_status, changed_by, duration, created_at))
+
+    def get_status_events(self, since: str, until: str | None = None) -> list[dict]:
+        """
+        Returns the status transitions made in [since, until) whose time in the previous
+        status is known, oldest first.
+        """
+        query = ("SELECT request_id, from_status, to_status, changed_by, duration_seconds, created_at "
+                 "FROM request_status_events WHERE created_at >= ?")
+        params = [since]
+        if until is not None:
+            query += " AND created_at < ?"
+            params.append(until)
+        cursor = self._conn.cursor()
+        cursor.execute(query + " AND duration_seconds IS NOT NULL ORDER BY created_at", params)
+        return [dict(row) for row in cursor.fetchall()]
+
+    def get_request_status_history(self, request_id: int) -> list[dict]:
+        """Returns all status transitions of a request, oldest first."""
+        cursor = self._conn.cursor()
+        cursor.execute("SELECT * FROM request_status_events WHERE request_id = ? ORDER BY id", (request_id,))
+        return [dict(row) for row in cursor.fetchall()]
+
+    def _add_to_request_stats(self, cursor, request_id: int, status: str, finished_at: str, sign: int):
+        """Adds (sign=1) or removes (sign=-1) a finished request to/from its hourly and daily rollups."""
+        for period, start_format in self.ROLLUP_PERIODS.items():
+            cursor.execute("""
+            INSERT INTO request_stats_rollups
+                (period, period_start, status, requests, volume_usdt, payout_uah, referral_payout_usd, trx_requests)
+            SELECT ?, strftime(?, ?), ?, ?, ? * COALESCE(amount_currency, 0), ? * COALESCE(amount_uah, 0),
+                   ? * COALESCE(referral_payout_amount, 0), ? * COALESCE(needs_trx, 0)
+            FROM exchange_requests WHERE id = ?
+            ON CONFLICT (period, period_start, status) DO UPDATE SET
+                requests = requests + excluded.requests,
+                volume_usdt = volume_usdt + excluded.volume_usdt,
+                payout_uah = payout_uah + excluded.payout_uah,
+                referral_payout_usd = referral_payout_usd + excluded.referral_payout_usd,
+                trx_requests = trx_requests + excluded.trx_requests
+            """, (period, start_format, finished_at, status, sign, sign, sign, sign, sign, request_id))
+
+    def rebuild_request_stats(self):
+        """
+        Recomputes the request statistics from all requests (a full scan). Requests finished
+        before finished_at was recorded are counted at their last update.
+        """
+        try:
+            cursor = self._conn.cursor()
+            cursor.execute(
+                "UPDATE exchange_requests SET finished_at = updated_at "
+                "WHERE finished_at IS NULL AND status IN (?, ?)", self.STATS_STATUSES)
+            cursor.execute("DELETE FROM request_stats_rollups")
+            for period, start_format in self.ROLLUP_PERIODS.items():
+                cursor.execute("""
+                INSERT INTO request_stats_rollups
+                    (period, period_start, status, requests, volume_usdt, payout_uah, referral_payout_usd, trx_requests)
+                SELECT ?, strftime(?, finished_at) AS period_start, status, COUNT(*),
+                       TOTAL(amount_currency), TOTAL(amount_uah), TOTAL(referral_payout_amount), TOTAL(needs_trx)
+                FROM exchange_requests WHERE status IN (?, ?)
+                GROUP BY period_start, status
+                """, (period, start_format, *self.STATS_STATUSES))
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"[System] - Failed to rebuild the request statistics: {e}")
+            self._conn.rollback()
+
+    def get_request_stats(self, period: str, since: str) -> list[dict]:
+        """Returns the 'hour' or 'day' request statistics rollups from `since` on, oldest first."""
+        query = "SELECT * FROM request_stats_rollups WHERE period = ? AND period_start >= ? ORDER BY period_start"
+        cursor = self._conn.cursor()
+        cursor.execute(query, (period, since))
+        return [dict(row) for row in cursor.fetchall()]
@@ -4,12 +4,18 @@
 
 import logging
 import re
+import time
+from datetime import datetime, timedelta, timezone
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ConversationHandler, ContextTypes, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 )
 from telegram.error import TelegramError
 import json
+
+from render_cache import RenderCache
+from sla_analytics import SlaAnalytics, format_duration
+from callback_router import encode_callback_data, decode_callback_data, action_pattern
 logger = logging.getLogger(__name__)
 
 
@@ -49,6 +55,15 @@ class AdminPanelHandler:
         'completed'
     ]
     TERMINAL_STATUSES = ['completed', 'declined']
+    APPLICATION_INFO_CACHE_SIZE = 256
+    PROFILE_DURATIONS = (10, 30, 60)
+    RATE_HISTORY_HOURS = 24
+    RATE_HISTORY_DAYS = 14
+    SPARKLINE_BARS = '▁▂▃▄▅▆▇█'
+    REQUEST_STATS_DAYS = 14
+    REQUEST_STATS_WINDOWS = (7, 30)
+    SLA_WINDOWS = (1, 7, 30)
+    SLA_DEFAULT_WINDOW = 7
 
     def __init__(self, bot_instance):
         """
@@ -56,6 +71,50 @@ class AdminPanelHandler:
         to access shared resources like configuration.
         """
         self.bot = bot_instance
+        self._application_info_cache = RenderCache(max_size=self.APPLICATION_INFO_CACHE_SIZE)
+        self.sla_analytics = SlaAnalytics(self.bot.db)
+        self.bot.metrics.register_cache(
+            'application_info', lambda: (self._application_info_cache.hits, self._application_info_cache.misses))
+        self.bot.templates.register('admin_main_menu_keyboard_enabled',
+                                    lambda: self._build_main_menu_keyboard(is_enabled=True))
+        self.bot.templates.register('admin_main_menu_keyboard_disabled',
+                                    lambda: self._build_main_menu_keyboard(is_enabled=False))
+
+    @staticmethod
+    def _build_main_menu_keyboard(is_enabled: bool) -> InlineKeyboardMarkup:
+        toggle_button_text = "🔴 Выключить бота" if is_enabled else "🟢 Включить бота"
+        toggle_button = InlineKeyboardButton(toggle_button_text, callback_data='toggle_bot_status')
+
+        return InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("📊 Информация", callback_data='admin_info'),
+                InlineKeyboardButton("⚙️ Настройки", callback_data='admin_settings'),
+            ],
+            [
+                InlineKeyboardButton("📂 Все заявки", callback_data='view_all_requests'),
+                InlineKeyboardButton("⏳ Активные заявки", callback_data='view_active_requests'),
+            ],
+            [
+                InlineKeyboardButton("🔍 Найти заявки", callback_data='find_user_applications'),
+                InlineKeyboardButton("🔧 Изменить статус", callback_data='change_status'),
+            ],
+            [
+                InlineKeyboardButton("🏆 Рефералка", callback_data='admin_referral_menu'),
+                InlineKeyboardButton("👑 Управление VIP", callback_data='admin_manage_vip')
+            ],
+            [
+                InlineKeyboardButton("🔄 Восстановить чат", callback_data='restore_application'),
+                toggle_button
+            ],
+            [
+                InlineKeyboardButton("📈 Метрики", callback_data='admin_metrics'),
+                InlineKeyboardButton("📉 История курса", callback_data='admin_rate_history'),
+            ],
+            [
+                InlineKeyboardButton("💰 Статистика", callback_data='admin_request_stats'),
+                InlineKeyboardButton("⏱ Сроки (SLA)", callback_data='admin_sla'),
+            ],
+        ])
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
@@ -91,35 +150,9 @@ class AdminPanelHandler:
         context.user_data.clear()
 
         is_enabled = self.bot.config.bot_enabled
-        toggle_button_text = "🔴 Выключить бота" if is_enabled else "🟢 Включить бота"
-        toggle_button = InlineKeyboardButton(toggle_button_text, callback_data='toggle_bot_status')
-
-        keyboard = [
-            [
-                InlineKeyboardButton("📊 Информация", callback_data='admin_info'),
-                InlineKeyboardButton("⚙️ Настройки", callback_data='admin_settings'),
-            ],
-            # --- ИЗМЕНЕНИЯ ---
-            [
-                InlineKeyboardButton("📂 Все заявки", callback_data='view_all_requests'),
-                InlineKeyboardButton("⏳ Активные заявки", callback_data='view_active_requests'),
-            ],
-            [
-                InlineKeyboardButton("🔍 Найти заявки", callback_data='find_user_applications'),
-                InlineKeyboardButton("🔧 Изменить статус", callback_data='change_status'),
-            ],
-            [
-                InlineKeyboardButton("🏆 Рефералка", callback_data='admin_referral_menu'),
-                InlineKeyboardButton("👑 Управление VIP", callback_data='admin_manage_vip')
-            ],
-            [
-                InlineKeyboardButton("🔄 Восстановить чат", callback_data='restore_application'),
-                toggle_button
-            ],
-            # --- КОНЕЦ ИЗМЕНЕНИЙ ---
-        ]
         text = "⚙️ Админ-панель"
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = self.bot.templates.get(
+            'admin_main_menu_keyboard_enabled' if is_enabled else 'admin_main_menu_keyboard_disabled')
 
         if update.callback_query:
             try:
@@ -152,6 +185,23 @@ class AdminPanelHandler:
 
         if data == 'admin_info':
             return await self._show_info(query)
+        elif data == 'admin_metrics':
+            return await self._show_metrics(query)
+        elif data == 'admin_rate_history':
+            return await self._show_rate_history(query)
+        elif data == 'admin_request_stats':
+            return await self._show_request_stats(query)
+        elif data == 'admin_loop_lag':
+            return await self._show_loop_lag(query)
+        elif data == 'admin_memory':
+            return await self._show_memory(query)
+        elif data == 'admin_memory_baseline':
+            return await self._take_memory_baseline(query)
+        elif data == 'admin_memory_diff':
+            return await self._send_memory_diff(query, context)
+        elif data == 'admin_memory_stop':
+            self.bot.memory_diagnostics.stop()
+            return await self._show_memory(query)
         elif data == 'admin_settings':
             return await self._show_settings_menu(query)
         elif data == 'admin_referral_menu':
@@ -211,16 +261,16 @@ class AdminPanelHandler:
                 status_icon = "✅" if req['status'] == 'completed' else "❌" if req['status'] == 'declined' else "⏳"
                 summary = f"{status_icon} ID: {req['id']} | @{req['username']} | {self.bot.exchange_handler.translate_status(req['status'])}"
                 keyboard_buttons.append([InlineKeyboardButton(
-                    summary, callback_data=f'view_req_details_{req["id"]}_{page}')])
+                    summary, callback_data=encode_callback_data('view_req_details', req['id'], page))])
 
         pagination_row = []
         if page > 1:
-            pagination_row.append(InlineKeyboardButton("⬅️", callback_data=f'req_page_{page - 1}'))
+            pagination_row.append(InlineKeyboardButton("⬅️", callback_data=encode_callback_data('req_page', page - 1)))
         if total_pages > 1:
             pagination_row.append(InlineKeyboardButton(
                 f"{page}/{total_pages}", callback_data='ignore_page'))
         if page < total_pages:
-            pagination_row.append(InlineKeyboardButton("➡️", callback_data=f'req_page_{page + 1}'))
+            pagination_row.append(InlineKeyboardButton("➡️", callback_data=encode_callback_data('req_page', page + 1)))
 
         if pagination_row:
             keyboard_buttons.append(pagination_row)
@@ -239,7 +289,7 @@ class AdminPanelHandler:
             await query.answer()
             return self.VIEW_ALL_REQUESTS
 
-        page = int(query.data.split('_')[-1])
+        page = decode_callback_data(query.data).args[0]
         return await self._show_all_requests_list(update, context, page=page)
 
     async def _show_request_details(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -247,9 +297,7 @@ class AdminPanelHandler:
         query = update.callback_query
         await query.answer()
 
-        parts = query.data.split('_')
-        request_id = int(parts[-2])
-        page = int(parts[-1])
+        request_id, page = decode_callback_data(query.data).args
 
         request_data = self.bot.db.get_request_by_id(request_id)
 
@@ -257,19 +305,19 @@ class AdminPanelHandler:
             await query.edit_message_text(
                 "❌ Заявка не найдена.",
                 reply_markup=InlineKeyboardMarkup(
-                    [[InlineKeyboardButton("⬅️ Назад к списку", callback_data=f'req_page_{page}')]])
+                    [[InlineKeyboardButton("⬅️ Назад к списку", callback_data=encode_callback_data('req_page', page))]])
             )
             return self.VIEW_ALL_REQUESTS
 
         text = self._format_application_info(dict(request_data))
 
         keyboard_rows = [
-            [InlineKeyboardButton("⬅️ Назад к списку", callback_data=f'req_page_{page}')]
+            [InlineKeyboardButton("⬅️ Назад к списку", callback_data=encode_callback_data('req_page', page))]
         ]
 
         if request_data['status'] not in self.TERMINAL_STATUSES:
             keyboard_rows.insert(0, [InlineKeyboardButton(
-                "🔄 Восстановить админ-сообщение", callback_data=f'admin_restore_msg_{request_id}')])
+                "🔄 Восстановить админ-сообщение", callback_data=encode_callback_data('admin_restore_msg', request_id))])
 
         reply_markup = InlineKeyboardMarkup(keyboard_rows)
 
@@ -294,18 +342,18 @@ class AdminPanelHandler:
             for req in requests:
                 summary = f"ID: {req['id']} | @{req['username']} | {self.bot.exchange_handler.translate_status(req['status'])}"
                 keyboard_buttons.append([InlineKeyboardButton(
-                    summary, callback_data=f'view_active_req_{req["id"]}_{page}')])
+                    summary, callback_data=encode_callback_data('view_active_req', req['id'], page))])
 
         pagination_row = []
         if page > 1:
             pagination_row.append(InlineKeyboardButton(
-                "⬅️", callback_data=f'active_req_page_{page - 1}'))
+                "⬅️", callback_data=encode_callback_data('active_req_page', page - 1)))
         if total_pages > 1:
             pagination_row.append(InlineKeyboardButton(
                 f"{page}/{total_pages}", callback_data='ignore_page'))
         if page < total_pages:
             pagination_row.append(InlineKeyboardButton(
-                "➡️", callback_data=f'active_req_page_{page + 1}'))
+                "➡️", callback_data=encode_callback_data('active_req_page', page + 1)))
 
         if pagination_row:
             keyboard_buttons.append(pagination_row)
@@ -324,7 +372,7 @@ class AdminPanelHandler:
             await query.answer()
             return self.VIEW_ACTIVE_REQUESTS
 
-        page = int(query.data.split('_')[-1])
+        page = decode_callback_data(query.data).args[0]
         return await self._show_active_requests_list(update, context, page=page)
 
     async def _show_active_request_details(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -332,9 +380,7 @@ class AdminPanelHandler:
         query = update.callback_query
         await query.answer()
 
-        parts = query.data.split('_')
-        request_id = int(parts[-2])
-        page = int(parts[-1])
+        request_id, page = decode_callback_data(query.data).args
 
         request_data = self.bot.db.get_request_by_id(request_id)
 
@@ -342,7 +388,7 @@ class AdminPanelHandler:
             await query.edit_message_text(
                 "❌ Заявка не найдена.",
                 reply_markup=InlineKeyboardMarkup(
-                    [[InlineKeyboardButton("⬅️ Назад к списку", callback_data=f'active_req_page_{page}')]])
+                    [[InlineKeyboardButton("⬅️ Назад к списку", callback_data=encode_callback_data('active_req_page', page))]])
             )
             return self.VIEW_ACTIVE_REQUESTS
 
@@ -350,8 +396,8 @@ class AdminPanelHandler:
 
         keyboard_rows = [
             [InlineKeyboardButton("🔄 Восстановить админ-сообщение",
-                                  callback_data=f'admin_restore_msg_{request_id}')],
-            [InlineKeyboardButton("⬅️ Назад к списку", callback_data=f'active_req_page_{page}')]
+                                  callback_data=encode_callback_data('admin_restore_msg', request_id))],
+            [InlineKeyboardButton("⬅️ Назад к списку", callback_data=encode_callback_data('active_req_page', page))]
         ]
 
         reply_markup = InlineKeyboardMarkup(keyboard_rows)
@@ -364,7 +410,7 @@ class AdminPanelHandler:
         """Handles the 'Restore Admin Message' button press from any view."""
         query = update.callback_query
 
-        request_id = int(query.data.split('_')[-1])
+        request_id = decode_callback_data(query.data).request_id
         admin_user = update.effective_user
 
         logger.info(
@@ -686,15 +732,21 @@ class AdminPanelHandler:
         logger.info(
             f"[Aid] ({admin_user.id}, {admin_user.username}) - Changing status of request #{request_id} to '{new_status}'.")
 
-        if new_status == 'declined':
-            await self.bot.exchange_handler.refund_referral_debit_for_request(request_id)
-
         request_data = self.bot.db.get_request_by_id(request_id)
         if not request_data:
             await query.edit_message_text(f"❌ Заявка с ID #{request_id} больше не найдена.")
             return await self._show_main_menu(update, context)
 
-        self.bot.db.update_request_status(request_id, new_status)
+        declined = None
+        if new_status == 'declined':
+            # Refunds the referral debit together with the decline; an already declined request is left as is.
+            declined = self.bot.db.decline_request(request_id, changed_by=admin_user.id,
+                                                   expected_statuses=self.bot.db.ACTIVE_STATUSES + ('completed',))
+        if declined:
+            request_data = declined
+            await self.bot.exchange_handler.notify_referral_refund(declined)
+        else:
+            self.bot.db.update_request_status(request_id, new_status, changed_by=admin_user.id)
         translated_new_status = self.bot.exchange_handler.translate_status(new_status)
         await query.edit_message_text(f"✅ Статус для заявки #{request_id} обновлен на '{translated_new_status}'.\n\nПересоздаю сообщения для пользователя и админов...")
 
@@ -777,21 +829,337 @@ class AdminPanelHandler:
                     f"[System] - Failed to parse admin_message_ids for request #{request_data['id']}: {e}")
 
     async def _show_info(self, query):
-        masked_password = '*' * len(self.bot.config.admin_password)
-        admin_ids_str = ', '.join(map(str, self.bot.config.admin_ids))
+        settings = self.bot.config.snapshot
+        masked_password = '*' * len(settings.admin_password)
+        admin_ids_str = ', '.join(map(str, sorted(settings.admin_ids)))
         text = (
             "📊 <b>Информация о боте</b>\n\n"
             f"👤 <b>Admin IDs:</b> <code>{admin_ids_str}</code>\n"
             f"🔐 <b>Пароль:</b> <code>{masked_password}</code>\n"
-            f"💱 <b>Курс:</b> <code>{self.bot.config.exchange_rate}</code>\n"
-            f"💼 <b>Кошелёк:</b> <code>{self.bot.config.wallet_address}</code>\n"
-            f"📞 <b>Поддержка:</b> <code>{self.bot.config.support_contact}</code>"
+            f"💱 <b>Курс:</b> <code>{self.bot.rate_engine.current_rate()}</code> "
+            f"({self.bot.rate_engine.describe()}), ручной: <code>{settings.exchange_rate}</code>\n"
+            f"💼 <b>Кошелёк:</b> <code>{settings.wallet_address}</code>\n"
+            f"📞 <b>Поддержка:</b> <code>{settings.support_contact}</code>\n\n"
+            f"🌐 <b>Bot API:</b>\n{self.bot.transport_stats.summary_text()}\n\n"
+            f"🧠 <b>Состояние пользователей:</b>\n{self.bot.user_state_manager.summary_text()}"
         )
         keyboard = InlineKeyboardMarkup(
             [[InlineKeyboardButton("⬅️ Назад", callback_data='admin_back_menu')]])
         await query.edit_message_text(text, reply_markup=keyboard, parse_mode='HTML')
         return self.ADMIN_MENU
 
+    async def _show_metrics(self, query):
+        text = f"📈 <b>Метрики</b>\n\n{self.bot.metrics.summary_text()}"
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Обновить", callback_data='admin_metrics'),
+             InlineKeyboardButton("🐢 Задержки цикла", callback_data='admin_loop_lag')],
+            [InlineKeyboardButton("🧠 Память", callback_data='admin_memory')],
+            [InlineKeyboardButton(f"🔬 Профиль {seconds} с", callback_data=encode_callback_data('admin_profile', seconds))
+             for seconds in self.PROFILE_DURATIONS],
+            [InlineKeyboardButton("⬅️ Назад", callback_data='admin_back_menu')],
+        ])
+        await self._edit_diagnostics_message(query, text, keyboard)
+        return self.ADMIN_MENU
+
+    @classmethod
+    def _sparkline(cls, values: list[float]) -> str:
+        low, high = min(values), max(values)
+        if high == low:
+            return cls.SPARKLINE_BARS[0] * len(values)
+        scale = (len(cls.SPARKLINE_BARS) - 1) / (high - low)
+        return ''.join(cls.SPARKLINE_BARS[round((value - low) * scale)] for value in values)
+
+    @staticmethod
+    def _fill_rollups(rows: list[dict], first: datetime, step: timedelta, count: int,
+                      rate_before: float | None) -> list[tuple[datetime, dict | None, float | None]]:
+        """
+        Lays the rollups out on a regular time axis. Periods without changes carry the rate
+        in effect forward: returns (period start, rollup or None, rate at the end of the period).
+        """
+        by_start = {row['period_start']: row for row in rows}
+        result = []
+        rate = rate_before
+        for index in range(count):
+            start = first + step * index
+            row = by_start.get(start.strftime('%Y-%m-%d %H:%M:%S'))
+            if row is not None:
+                rate = row['last_rate']
+            result.append((start, row, rate))
+        return result
+
+    def _render_rate_history(self) -> str:
+        """Renders the rate history from the hourly and daily rollups only."""
+        db = self.bot.db
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        first_hour = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=self.RATE_HISTORY_HOURS - 1)
+        first_day = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=self.RATE_HISTORY_DAYS - 1)
+        since_hour = first_hour.strftime('%Y-%m-%d %H:%M:%S')
+        since_day = first_day.strftime('%Y-%m-%d %H:%M:%S')
+        rate_before = db.get_rate_before(since_day)
+        hours = self._fill_rollups(db.get_rate_rollups('hour', since_hour), first_hour, timedelta(hours=1),
+                                   self.RATE_HISTORY_HOURS, db.get_rate_before(since_hour))
+        days = self._fill_rollups(db.get_rate_rollups('day', since_day), first_day, timedelta(days=1),
+                                  self.RATE_HISTORY_DAYS, rate_before)
+
+        lines = [
+            "📉 <b>История курса</b> (UTC)\n",
+            f"Сейчас: <code>{self.bot.rate_engine.current_rate()}</code> ({self.bot.rate_engine.describe()})",
+        ]
+        rates = [rate for _, _, rate in hours if rate is not None]
+        if not rates:
+            lines.append("\nИзменений курса ещё не было.")
+            return "\n".join(lines)
+
+        changed = [row for _, row, _ in hours if row is not None]
+        low = min([row['min_rate'] for row in changed] + rates)
+        high = max([row['max_rate'] for row in changed] + rates)
+        samples = sum(row['samples'] for row in changed)
+        average = sum(row['sum_rate'] for row in changed) / samples if samples else rates[-1]
+        lines.append(f"\n<b>{self.RATE_HISTORY_HOURS} ч:</b> <code>{self._sparkline(rates)}</code>")
+        lines.append(f"мин {low:.2f} · макс {high:.2f} · сред {average:.2f} · изменений: {samples}")
+
+        lines.append(f"\n<b>{self.RATE_HISTORY_DAYS} дн.:</b>")
+        previous = rate_before
+        for start, row, rate in days:
+            if rate is None:
+                continue
+            if row is None:
+                lines.append(f"<code>{start:%d.%m}  {rate:.2f}</code>")
+            else:
+                low = min(row['min_rate'], previous) if previous is not None else row['min_rate']
+                high = max(row['max_rate'], previous) if previous is not None else row['max_rate']
+                lines.append(f"<code>{start:%d.%m}  {low:.2f}–{high:.2f}  ср {row['sum_rate'] / row['samples']:.2f}"
+                             f"  ({row['samples']})</code>")
+            previous = rate
+        return "\n".join(lines)
+
+    async def _show_rate_history(self, query):
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Обновить", callback_data='admin_rate_history')],
+            [InlineKeyboardButton("⬅️ Назад", callback_data='admin_back_menu')],
+        ])
+        await self._edit_diagnostics_message(query, self._render_rate_history(), keyboard)
+        return self.ADMIN_MENU
+
+    @staticmethod
+    def _sum_request_stats(rows: list[dict]) -> dict:
+        """Adds up request statistics rollups per status."""
+        totals = {}
+        for row in rows:
+            total = totals.setdefault(row['status'], dict.fromkeys(
+                ('requests', 'volume_usdt', 'payout_uah', 'referral_payout_usd', 'trx_requests'), 0))
+            for key in total:
+                total[key] += row[key]
+        return totals
+
+    @staticmethod
+    def _format_request_stats(title: str, totals: dict) -> str:
+        completed = totals.get('completed', {})
+        declined = totals.get('declined', {})
+        return (f"<b>{title}:</b> ✅ {completed.get('requests', 0)} · ❌ {declined.get('requests', 0)}\n"
+                f"{completed.get('volume_usdt', 0):,.2f} USDT → {completed.get('payout_uah', 0):,.2f} UAH\n"
+                f"реф. выплаты ${completed.get('referral_payout_usd', 0):,.2f} · "
+                f"с TRX: {int(completed.get('trx_requests', 0))}")
+
+    def _render_request_stats(self) -> str:
+        """Renders the volume and revenue statistics from the hourly and daily rollups only."""
+        db = self.bot.db
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        first_hour = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=23)
+        days = max(self.REQUEST_STATS_WINDOWS + (self.REQUEST_STATS_DAYS,))
+        day_rows = db.get_request_stats('day', (today - timedelta(days=days - 1)).strftime('%Y-%m-%d %H:%M:%S'))
+        hour_rows = db.get_request_stats('hour', first_hour.strftime('%Y-%m-%d %H:%M:%S'))
+
+        def since(count):
+            start = (today - timedelta(days=count - 1)).strftime('%Y-%m-%d %H:%M:%S')
+            return self._sum_request_stats([row for row in day_rows if row['period_start'] >= start])
+
+        blocks = [
+            self._format_request_stats("Сегодня", since(1)),
+            self._format_request_stats("24 ч", self._sum_request_stats(hour_rows)),
+        ]
+        blocks.extend(self._format_request_stats(f"{count} дн.", since(count))
+                      for count in self.REQUEST_STATS_WINDOWS)
+
+        by_day = {}
+        for row in day_rows:
+            by_day.setdefault(row['period_start'], {})[row['status']] = row
+        lines = [f"<b>По дням ({self.REQUEST_STATS_DAYS} дн.):</b>"]
+        for index in range(self.REQUEST_STATS_DAYS - 1, -1, -1):
+            start = today - timedelta(days=index)
+            day = by_day.get(start.strftime('%Y-%m-%d %H:%M:%S'), {})
+            completed = day.get('completed', {})
+            lines.append(f"<code>{start:%d.%m}  ✅ {completed.get('requests', 0):>3}  "
+                         f"{completed.get('volume_usdt', 0):>10,.2f} USDT  "
+                         f"❌ {day.get('declined', {}).get('requests', 0):>3}</code>")
+        blocks.append("\n".join(lines))
+        return "💰 <b>Статистика заявок</b> (UTC, по времени завершения)\n\n" + "\n\n".join(blocks)
+
+    async def _show_request_stats(self, query):
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Обновить", callback_data='admin_request_stats')],
+            [InlineKeyboardButton("⬅️ Назад", callback_data='admin_back_menu')],
+        ])
+        await self._edit_diagnostics_message(query, self._render_request_stats(), keyboard)
+        return self.ADMIN_MENU
+
+    def _render_sla(self, days: int) -> str:
+        """Renders the time-in-state percentiles of the transitions made in the last `days` days."""
+        report = self.sla_analytics.report(timedelta(days=days))
+        translate = self.bot.exchange_handler.translate_status
+        lines = [f"⏱ <b>Сроки обработки за {days} дн.</b>\n",
+                 f"Переходов статусов: {report.transitions}"]
+        if not report.transitions:
+            lines.append("\nЗа этот период заявки не меняли статус.")
+            return "\n".join(lines)
+
+        def row(name, summary):
+            return (f"{name}: <code>{format_duration(summary.p50)} / {format_duration(summary.p90)} / "
+                    f"{format_duration(summary.p99)}</code> ({summary.count})")
+
+        lines.append("\n<b>Время в статусе</b> (p50 / p90 / p99):")
+        for stage, summary in sorted(report.stages.items(), key=lambda item: -item[1].p90):
+            lines.append(row(translate(stage), summary))
+        if report.admins:
+            lines.append("\n<b>Время до действия админа</b> (p50 / p90 / p99):")
+            for admin_id, summary in sorted(report.admins.items(), key=lambda item: -item[1].count):
+                lines.append(row(f"🛡️ <code>{admin_id}</code>", summary))
+                for (stage_admin, stage), stage_summary in sorted(report.admin_stages.items(),
+                                                                   key=lambda item: -item[1].count):
+                    if stage_admin == admin_id:
+                        lines.append("   " + row(translate(stage), stage_summary))
+        return "\n".join(lines)
+
+    async def _handle_sla(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Shows the SLA screen; the menu button has no window, the window buttons carry the days."""
+        query = update.callback_query
+        user = query.from_user
+
+        if user.id not in self.bot.config.admin_ids:
+            await query.answer("🚫 У вас нет доступа.", show_alert=True)
+            return ConversationHandler.END
+
+        await query.answer()
+        args = decode_callback_data(query.data).args
+        logger.info(f"[Aid] ({user.id}, {user.username}) - Opened the SLA report.")
+        return await self._show_sla(query, args[0] if args else self.SLA_DEFAULT_WINDOW)
+
+    async def _show_sla(self, query, days: int):
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton(f"{'• ' if window == days else ''}{window} дн.",
+                                  callback_data=encode_callback_data('admin_sla', window))
+             for window in self.SLA_WINDOWS],
+            [InlineKeyboardButton("⬅️ Назад", callback_data='admin_back_menu')],
+        ])
+        await self._edit_diagnostics_message(query, self._render_sla(days), keyboard)
+        return self.ADMIN_MENU
+
+    async def _show_loop_lag(self, query):
+        if self.bot.loop_monitor is None:
+            text = "🐢 Контроль задержек цикла отключён ([Watchdog] ENABLED = False)."
+        else:
+            text = f"🐢 <b>Задержки цикла событий</b>\n\n{self.bot.loop_monitor.summary_text()}"
+        keyboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Обновить", callback_data='admin_loop_lag')],
+            [InlineKeyboardButton("⬅️ Назад", callback_data='admin_metrics')],
+        ])
+        await self._edit_diagnostics_message(query, text, keyboard)
+        return self.ADMIN_MENU
+
+    async def _start_profiling(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Starts a profiler capture in the background; the report is sent as a document."""
+        query = update.callback_query
+        user = query.from_user
+
+        if user.id not in self.bot.config.admin_ids:
+            await query.answer("🚫 У вас нет доступа.", show_alert=True)
+            return ConversationHandler.END
+
+        if self.bot.profiler.running:
+            await query.answer("⏳ Профилирование уже запущено.", show_alert=True)
+            return self.ADMIN_MENU
+
+        await query.answer()
+        seconds = decode_callback_data(query.data).args[0]
+        logger.info(f"[Aid] ({user.id}, {user.username}) - Started profiling for {seconds} s.")
+        keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад", callback_data='admin_metrics')]])
+        await query.edit_message_text(
+            f"🔬 Профилирование запущено на {seconds} с. Отчёт придёт отдельным файлом.", reply_markup=keyboard)
+        context.application.create_task(self._send_profile_report(context.bot, query.message.chat_id, seconds))
+        return self.ADMIN_MENU
+
+    async def _send_profile_report(self, bot, chat_id: int, seconds: int):
+        try:
+            report = await self.bot.profiler.capture(seconds)
+        except RuntimeError:
+            await bot.send_message(chat_id=chat_id, text="⏳ Профилирование уже запущено.")
+            return
+        try:
+            await bot.send_document(
+                chat_id=chat_id,
+                document=report.encode('utf-8'),
+                filename=f"profile_{time.strftime('%Y%m%d_%H%M%S')}.txt",
+                caption=f"🔬 Профиль за {seconds} с"
+            )
+        except TelegramError as e:
+            logger.error(f"[System] - Failed to send the profiler report to {chat_id}: {e}")
+
+    async def _show_memory(self, query, note: str = ''):
+        diagnostics = self.bot.memory_diagnostics
+        if diagnostics.tracing:
+            status = "🟢 tracemalloc включён"
+            if diagnostics.baseline_taken_at:
+                status += f", базовый снимок: {diagnostics.baseline_taken_at:%d.%m %H:%M:%S}"
+        else:
+            status = "⚪️ tracemalloc выключен (включается вместе с базовым снимком)"
+        text = (
+            f"🧠 <b>Память</b>\n\n{status}\n\n"
+            f"{self.bot.user_state_manager.summary_text()}"
+        )
+        if note:
+            text += f"\n\n{note}"
+
+        rows = [[InlineKeyboardButton("📍 Базовый снимок", callback_data='admin_memory_baseline')]]
+        if diagnostics.baseline_taken_at:
+            rows.append([InlineKeyboardButton("📊 Сравнить с базой", callback_data='admin_memory_diff')])
+        if diagnostics.tracing:
+            rows.append([InlineKeyboardButton("⏹ Выключить tracemalloc", callback_data='admin_memory_stop')])
+        rows.append([InlineKeyboardButton("⬅️ Назад", callback_data='admin_metrics')])
+        await self._edit_diagnostics_message(query, text, InlineKeyboardMarkup(rows))
+        return self.ADMIN_MENU
+
+    async def _take_memory_baseline(self, query):
+        user = query.from_user
+        logger.info(f"[Aid] ({user.id}, {user.username}) - Took a memory baseline snapshot.")
+        await self.bot.memory_diagnostics.take_baseline()
+        return await self._show_memory(query, note="✅ Базовый снимок сохранён.")
+
+    async def _send_memory_diff(self, query, context: ContextTypes.DEFAULT_TYPE):
+        user = query.from_user
+        logger.info(f"[Aid] ({user.id}, {user.username}) - Requested a memory growth report.")
+        try:
+            summary, report = await self.bot.memory_diagnostics.diff_report()
+        except RuntimeError:
+            return await self._show_memory(query, note="⚠️ Сначала сделайте базовый снимок.")
+
+        await context.bot.send_document(
+            chat_id=query.message.chat_id,
+            document=report.encode('utf-8'),
+            filename=f"memory_{time.strftime('%Y%m%d_%H%M%S')}.txt",
+            caption="🧠 Рост памяти с базового снимка"
+        )
+        return await self._show_memory(query, note=summary)
+
+    @staticmethod
+    async def _edit_diagnostics_message(query, text: str, keyboard: InlineKeyboardMarkup):
+        try:
+            await query.edit_message_text(text, reply_markup=keyboard, parse_mode='HTML')
+        except TelegramError as e:
+            # Refreshing without new data leaves the message unchanged.
+            if 'not modified' not in str(e).lower():
+                raise
+
     async def _show_settings_menu(self, query):
         keyboard = InlineKeyboardMarkup([
             [InlineKeyboardButton("🔐 Пароль", callback_data='admin_set_password')],
@@ -823,6 +1191,11 @@ class AdminPanelHandler:
         return await self._show_main_menu(update, context)
 
     def _format_application_info(self, app) -> str:
+        cache_key = self.bot.exchange_handler._render_cache_key(app)
+        return self._application_info_cache.get_or_render(
+            cache_key, lambda: self._render_application_info(app))
+
+    def _render_application_info(self, app) -> str:
         referral_payout = app.get('referral_payout_amount', 0.0)
         rate = app.get('exchange_rate')
         payout_info = ""
@@ -895,6 +1268,9 @@ class AdminPanelHandler:
             new_rate = float(update.message.text.strip().replace(',', '.'))
             self.bot.config.exchange_rate = new_rate
             await self.bot.config.save()
+            if self.bot.rate_engine.fresh_quote() is None:
+                # While a fresh quote is served the manual rate is only the fallback, not the offered rate.
+                self.bot.db.record_rate(new_rate, 'manual')
             logger.info(
                 f"[Aid] ({user.id}, {user.username}) - Updated the exchange rate to: {new_rate}")
             await update.message.reply_text("✅ Курс обновлён.")
@@ -935,7 +1311,12 @@ class AdminPanelHandler:
             entry_points=[CommandHandler('a', self.start)],
             states={
                 self.ASK_PASSWORD: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.check_password)],
-                self.ADMIN_MENU: [CallbackQueryHandler(self.handle_callback, pattern='^admin_|find_user_applications|restore_application|change_status|toggle_bot_status|view_all_requests|view_active_requests')],
+                self.ADMIN_MENU: [
+                    # Before the generic handler, whose '^admin_' pattern also matches 'admin_sla'.
+                    CallbackQueryHandler(self._handle_sla, pattern=action_pattern('admin_sla')),
+                    CallbackQueryHandler(self.handle_callback, pattern='^admin_|find_user_applications|restore_application|change_status|toggle_bot_status|view_all_requests|view_active_requests'),
+                    CallbackQueryHandler(self._start_profiling, pattern=action_pattern('admin_profile')),
+                ],
                 self.SETTINGS_MENU: [CallbackQueryHandler(self.handle_callback, pattern='^admin_')],
                 self.SET_NEW_PASSWORD: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.set_new_password)],
                 self.SET_EXCHANGE_RATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.set_exchange_rate)],
@@ -948,21 +1329,21 @@ class AdminPanelHandler:
 
                 self.VIEW_ALL_REQUESTS: [
                     CallbackQueryHandler(self._show_request_details,
-                                         pattern=r'^view_req_details_'),
+                                         pattern=action_pattern('view_req_details')),
                     CallbackQueryHandler(self._handle_requests_page_navigation,
-                                         pattern=r'^req_page_'),
+                                         pattern=action_pattern('req_page')),
                     CallbackQueryHandler(self._restore_admin_message,
-                                         pattern=r'^admin_restore_msg_'),
+                                         pattern=action_pattern('admin_restore_msg')),
                     CallbackQueryHandler(self._show_main_menu, pattern='^admin_back_menu$')
                 ],
                 # --- НОВЫЙ БЛОК ДЛЯ АКТИВНЫХ ЗАЯВОК ---
                 self.VIEW_ACTIVE_REQUESTS: [
                     CallbackQueryHandler(self._show_active_request_details,
-                                         pattern=r'^view_active_req_'),
+                                         pattern=action_pattern('view_active_req')),
                     CallbackQueryHandler(
-                        self._handle_active_requests_page_navigation, pattern=r'^active_req_page_'),
+                        self._handle_active_requests_page_navigation, pattern=action_pattern('active_req_page')),
                     CallbackQueryHandler(self._restore_admin_message,
-                                         pattern=r'^admin_restore_msg_'),
+                                         pattern=action_pattern('admin_restore_msg')),
                     CallbackQueryHandler(self._show_main_menu, pattern='^admin_back_menu$')
                 ],
                 # --- КОНЕЦ ---
@@ -980,6 +1361,8 @@ class AdminPanelHandler:
                 self.AWAIT_USER_FOR_VIP: [MessageHandler(filters.TEXT & ~filters.COMMAND, self._ask_for_vip_status)],
                 self.SELECT_VIP_STATUS: [CallbackQueryHandler(self._process_vip_status_change, pattern='^set_vip_|admin_back_menu$')],
             },
-            fallbacks=[CommandHandler('a', self.start), CommandHandler('ac', self.close)]
+            fallbacks=[CommandHandler('a', self.start), CommandHandler('ac', self.close)],
+            name='admin_conversation',
+            persistent=self.bot.persistence is not None
         )
         application.add_handler(admin_conversation_handler)
@@ -1,11 +1,15 @@
 import logging
 import json
+from types import MappingProxyType
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ConversationHandler, ContextTypes, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 )
 from telegram.error import TelegramError
 
+from render_cache import RenderCache
+from callback_router import encode_callback_data, decode_callback_data, action_pattern
+from logging_setup import bind_log_context
 
 logger = logging.getLogger(__name__)
 
@@ -21,29 +25,47 @@ class ExchangeHandler:
         ENTERING_HASH, SELECTING_CANCELLATION_TYPE, AWAITING_REASON_TEXT,
         ASK_USE_REFERRAL_BALANCE, ASK_PAY_TRX_FROM_REFERRAL, AWAITING_REVIEW_TEXT
     ) = range(18)
+    # States in which the user types bank requisites; update capture masks every digit there.
+    REQUISITE_STATES = (ENTERING_CARD_DETAILS, ENTERING_CARD_NUMBER, ENTERING_INN_DETAILS)
+
+    ADMIN_RENDER_CACHE_SIZE = 512
 
     def __init__(self, bot_instance):
         self.bot = bot_instance
+        self._admin_render_cache = RenderCache(max_size=self.ADMIN_RENDER_CACHE_SIZE)
+        self.bot.metrics.register_cache(
+            'admin_render', lambda: (self._admin_render_cache.hits, self._admin_render_cache.misses))
+        self._register_templates()
+
+    def _register_templates(self):
+        """Registers the prebuilt texts and keyboards of the static user screens."""
+        templates = self.bot.templates
+        templates.register('main_menu_keyboard', self._build_main_menu_keyboard,
+                           depends_on=(('Settings', 'REVIEW_CHANNEL_URL'),))
+        templates.register('main_menu_texts', self._build_main_menu_texts)
+        templates.register('back_to_menu_keyboard', lambda: InlineKeyboardMarkup(
+            [[InlineKeyboardButton("⬅️ Назад", callback_data='back_to_menu')]]))
+        templates.register('currency_keyboard', lambda: InlineKeyboardMarkup([
+            [InlineKeyboardButton("USDT", callback_data='currency_usdt')],
+            [InlineKeyboardButton("⬅️ Назад", callback_data='back_to_menu')]
+        ]))
+        templates.register('rate_text', lambda: f"📉 Актуальный курс: 1 USDT = {self.bot.rate_engine.current_rate()} UAH",
+                           depends_on=(('Settings', 'EXCHANGE_RATE'),))
+        self.bot.rate_engine.add_change_listener(lambda: templates.invalidate('rate_text'))
+        templates.register('help_text', lambda: f"🔧 Помощь: Напиши {self.bot.config.support_contact} по любым вопросам относительно бота.",
+                           depends_on=(('Settings', 'SUPPORT_CONTACT'),))
+
+    def _build_main_menu_keyboard(self) -> InlineKeyboardMarkup:
+        first_row = [
+            InlineKeyboardButton("➸ Обменять", callback_data='exchange'),
+            InlineKeyboardButton("📉 Курс", callback_data='rate'),
+        ]
+        review_channel_url = self.bot.config.review_channel_url
+        if review_channel_url:
+            first_row.append(InlineKeyboardButton("📝 Отзывы", url=review_channel_url))
 
-    async def main_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Sends or edits a message to show the main menu."""
-        user = update.effective_user
-        profile_data = self.bot.db.get_user_profile(user.id)
-        vip_status = profile_data.get('vip_status') if profile_data else None
-
-        # Format VIP status
-        vip_status_text = ""
-        if vip_status == 'Gold':
-            vip_status_text = "\n\n👑 **Ваш статус:** 💎 Gold"
-        elif vip_status == 'Silver':
-            vip_status_text = "\n\n👑 **Ваш статус:** ⚪️ Silver"
-
-        keyboard = [
-            [
-                InlineKeyboardButton("➸ Обменять", callback_data='exchange'),
-                InlineKeyboardButton("📉 Курс", callback_data='rate'),
-                InlineKeyboardButton("📝 Отзывы", url=self.bot.config.review_channel_url)
-            ],
+        return InlineKeyboardMarkup([
+            first_row,
             [
                 InlineKeyboardButton("🔐 Личный кабинет", callback_data='user_cabinet'),
                 InlineKeyboardButton("🛠 Помощь", callback_data='user_help'),
@@ -51,21 +73,46 @@ class ExchangeHandler:
             [
                 InlineKeyboardButton("🏆 Реферальная программа", callback_data='referral_program')
             ]
-        ]
-        text = (
-            "👋 **Привет!**\n"
-            f"Добро пожаловать в **SafePay Bot** 🤝{vip_status_text}\n\n"
-            "⚡ _Обмен — быстро, удобно и безопасно_ 🔒\n\n"
-            "📂 **Выбери раздел ниже** ⬇️"
-        )
+        ])
+
+    @staticmethod
+    def _build_main_menu_texts() -> MappingProxyType:
+        """
+        Builds the main menu text for every VIP status, so only a lookup is left per update.
+        The mapping is read-only, as the registry shares it between all renders.
+        """
+        vip_status_texts = {
+            None: "",
+            'Gold': "\n\n👑 **Ваш статус:** 💎 Gold",
+            'Silver': "\n\n👑 **Ваш статус:** ⚪️ Silver",
+        }
+        return MappingProxyType({
+            vip_status: (
+                "👋 **Привет!**\n"
+                f"Добро пожаловать в **SafePay Bot** 🤝{vip_status_text}\n\n"
+                "⚡ _Обмен — быстро, удобно и безопасно_ 🔒\n\n"
+                "📂 **Выбери раздел ниже** ⬇️"
+            )
+            for vip_status, vip_status_text in vip_status_texts.items()
+        })
+
+    async def main_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Sends or edits a message to show the main menu."""
+        user = update.effective_user
+        profile_data = self.bot.db.get_user_profile(user.id)
+        vip_status = profile_data.get('vip_status') if profile_data else None
+
+        texts = self.bot.templates.get('main_menu_texts')
+        text = texts.get(vip_status, texts[None])
+        reply_markup = self.bot.templates.get('main_menu_keyboard')
 
         query = update.callback_query
         if query:
             await query.answer()
             if query.message:
-                await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="Markdown")
+                await query.edit_message_text(text, reply_markup=reply_markup, parse_mode="Markdown")
         elif update.message:
-            await update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="Markdown")
+            await update.message.reply_text(text, reply_markup=reply_markup, parse_mode="Markdown")
 
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE, called_from_referral: bool = False):
         """
@@ -127,28 +174,22 @@ class ExchangeHandler:
         logger.info(f"[Uid] ({user.id}, {user.username}) - Started exchange conversation.")
 
         context.user_data.clear()
-        keyboard = [
-            [InlineKeyboardButton("USDT", callback_data='currency_usdt')],
-            [InlineKeyboardButton("⬅️ Назад", callback_data='back_to_menu')]
-        ]
-        await query.edit_message_text("💱 Выберите валюту для обмена:", reply_markup=InlineKeyboardMarkup(keyboard))
+        await query.edit_message_text("💱 Выберите валюту для обмена:", reply_markup=self.bot.templates.get('currency_keyboard'))
         return self.CHOOSING_CURRENCY
 
     async def show_rate(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """A simple (non-conversation) handler to show the rate."""
         query = update.callback_query
         await query.answer()
-        keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data='back_to_menu')]]
-        await query.edit_message_text(f"📉 Актуальный курс: 1 USDT = {self.bot.config.exchange_rate} UAH", reply_markup=InlineKeyboardMarkup(keyboard))
+        await query.edit_message_text(self.bot.templates.get('rate_text'), reply_markup=self.bot.templates.get('back_to_menu_keyboard'))
 
     async def show_help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """A simple (non-conversation) handler to show help info."""
         query = update.callback_query
         await query.answer()
-        keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data='back_to_menu')]]
         await query.edit_message_text(
-            f"🔧 Помощь: Напиши {self.bot.config.support_contact} по любым вопросам относительно бота.",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            self.bot.templates.get('help_text'),
+            reply_markup=self.bot.templates.get('back_to_menu_keyboard')
         )
 
     async def choosing_currency(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -181,7 +222,7 @@ class ExchangeHandler:
             await update.message.reply_text("Пожалуйста, введите корректное число.")
             return self.ENTERING_AMOUNT
 
-        current_rate = self.bot.config.exchange_rate
+        current_rate = self.bot.rate_engine.current_rate()
         context.user_data['exchange_rate'] = current_rate
         context.user_data['amount'] = amount
         sum_uah = amount * current_rate
@@ -303,7 +344,7 @@ class ExchangeHandler:
             return self.ENTERING_CARD_DETAILS
 
         context.user_data['card_info'] = card_info
-        logger.info(f"[Uid] ({user.id}, {user.username}) - Entered IBAN: {card_info}")
+        logger.info(f"[Uid] ({user.id}, {user.username}) - Entered IBAN.")
         await update.message.reply_text(f"💳 Вы указали IBAN: {card_info}\n\n🔢 Теперь введите номер карты:")
         return self.ENTERING_CARD_NUMBER
 
@@ -315,7 +356,7 @@ class ExchangeHandler:
             return self.ENTERING_CARD_NUMBER
 
         context.user_data['card_number'] = card_number
-        logger.info(f"[Uid] ({user.id}, {user.username}) - Entered card number: {card_number}")
+        logger.info(f"[Uid] ({user.id}, {user.username}) - Entered card number.")
         await update.message.reply_text(f"🔢 Вы указали номер карты: {card_number}\n\n👤 Укажите ФИО:")
         return self.ENTERING_FIO_DETAILS
 
@@ -392,6 +433,7 @@ class ExchangeHandler:
             if not request_id:
                 await query.edit_message_text("❌ Произошла ошибка при создании заявки. Попробуйте снова.")
                 return ConversationHandler.END
+            bind_log_context(request_id=request_id)
 
             await self._process_standard_exchange(query, context, request_id)
             return ConversationHandler.END
@@ -458,9 +500,9 @@ class ExchangeHandler:
 
         user_keyboard = InlineKeyboardMarkup([
             [InlineKeyboardButton("✅ Я совершил(а) перевод",
-                                  callback_data=f"user_confirms_sending_{request_id}")],
+                                  callback_data=encode_callback_data('user_confirms_sending', request_id))],
             [InlineKeyboardButton("❌ Отменить заявку",
-                                  callback_data=f"cancel_by_user_{request_id}")]
+                                  callback_data=encode_callback_data('cancel_by_user', request_id))]
         ])
 
         wallet_address = self.bot.config.wallet_address
@@ -502,9 +544,9 @@ class ExchangeHandler:
             user_keyboard = InlineKeyboardMarkup(
                 [
                     [InlineKeyboardButton("✅ Я совершил(а) перевод",
-                                          callback_data=f"user_confirms_sending_{request_id}")],
+                                          callback_data=encode_callback_data('user_confirms_sending', request_id))],
                     [InlineKeyboardButton("❌ Отменить заявку",
-                                          callback_data=f"cancel_by_user_{request_id}")]
+                                          callback_data=encode_callback_data('cancel_by_user', request_id))]
                 ])
         elif status == 'awaiting confirmation':
             user_text = "✅ Спасибо, ваш хэш получен и отправлен на проверку."
@@ -516,7 +558,7 @@ class ExchangeHandler:
                 "❗️ В случае, если подтверждение будет отправлено до получения средств, организация не несёт ответственности за возможные последствия."
             user_keyboard = InlineKeyboardMarkup([[
                 InlineKeyboardButton("✅ Подтвердить получение средств",
-                                     callback_data=f"by_user_confirm_transfer_{request_id}")
+                                     callback_data=encode_callback_data('by_user_confirm_transfer', request_id))
             ]])
         elif status == 'declined':
             user_text = (
@@ -531,7 +573,7 @@ class ExchangeHandler:
                 "\n\n💬 Оставив свой отзыв вы получите $1 на реферальный счет."
             user_keyboard = InlineKeyboardMarkup([
                 [InlineKeyboardButton("✍️ Оставить отзыв",
-                                      callback_data=f"leave_review_{request_id}")]
+                                      callback_data=encode_callback_data('leave_review', request_id))]
             ])
 
         if user_text:
@@ -677,6 +719,7 @@ class ExchangeHandler:
             if not request_id:
                 await query.edit_message_text("❌ Произошла ошибка при создании заявки. Попробуйте снова.")
                 return ConversationHandler.END
+            bind_log_context(request_id=request_id)
 
             logger.info(
                 f"[Uid] ({user.id}, {user.username}) - Creating an exchange request with TRX (#{request_id}).")
@@ -699,10 +742,14 @@ class ExchangeHandler:
     async def ask_for_hash(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
-        request_id = int(query.data.split('_')[-1])
+        request_id = decode_callback_data(query.data).request_id
         user = query.from_user
         logger.info(
             f"[Uid] ({user.id}, {user.username}) - Confirmed the transfer for request #{request_id}, requesting hash.")
+        # Keeps the expiry job away while the user is looking up the hash.
+        if not self.bot.db.touch_request(request_id, ('awaiting payment',)):
+            await query.edit_message_text(f"❌ Заявка #{request_id} больше не ожидает оплаты.", reply_markup=None)
+            return ConversationHandler.END
         context.user_data['request_id'] = request_id
         await query.edit_message_text(text="✍️ Пожалуйста, отправьте хэш вашей транзакции:")
         return self.ENTERING_HASH
@@ -720,8 +767,12 @@ class ExchangeHandler:
             await update.message.reply_text("Произошла ошибка сессии. Начните сначала: /start")
             return ConversationHandler.END
 
+        if not self.bot.db.update_request_status(request_id, 'awaiting confirmation',
+                                                 expected_statuses=('awaiting payment',)):
+            await update.message.reply_text(
+                f"❌ Заявка #{request_id} больше не активна. Создайте новую заявку: /start")
+            return ConversationHandler.END
         self.bot.db.update_request_data(request_id, {'transaction_hash': submitted_hash})
-        self.bot.db.update_request_status(request_id, 'awaiting confirmation')
 
         request_data = self.bot.db.get_request_by_id(request_id)
 
@@ -731,8 +782,8 @@ class ExchangeHandler:
 
         admin_keyboard = InlineKeyboardMarkup([[
             InlineKeyboardButton("✅ Средства получены",
-                                 callback_data=f"confirm_payment_{request_id}"),
-            InlineKeyboardButton("❌ Отказать", callback_data=f"decline_request_{request_id}")
+                                 callback_data=encode_callback_data('confirm_payment', request_id)),
+            InlineKeyboardButton("❌ Отказать", callback_data=encode_callback_data('decline_request', request_id))
         ]])
 
         await self._update_admin_messages(request_id, final_admin_text, admin_keyboard)
@@ -740,9 +791,9 @@ class ExchangeHandler:
         return ConversationHandler.END
 
     async def handle_transfer_confirmation_trx(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # The query is answered once the transition is known, so a conflict can be shown as an alert.
         query = update.callback_query
-        await query.answer()
-        request_id = int(query.data.split('_')[-1])
+        request_id = decode_callback_data(query.data).request_id
         admin_user = query.from_user
         logger.info(
             f"[Aid] ({admin_user.id}) - Confirmed TRX transfer for request #{request_id}.")
@@ -751,12 +802,17 @@ class ExchangeHandler:
         if not request_data:
             await query.answer("Заявка не найдена!", show_alert=True)
             return
+        if not self.bot.db.update_request_status(request_id, 'awaiting payment', changed_by=admin_user.id,
+                                                 expected_statuses=('awaiting trx transfer',)):
+            await query.answer(f"Заявка #{request_id} уже не ожидает перевода TRX.", show_alert=True)
+            return
+        await query.answer()
 
         keyboard = InlineKeyboardMarkup([
             [InlineKeyboardButton("✅ Я совершил(а) перевод",
-                                  callback_data=f"user_confirms_sending_{request_id}")],
+                                  callback_data=encode_callback_data('user_confirms_sending', request_id))],
             [InlineKeyboardButton("❌ Отменить заявку",
-                                  callback_data=f"cancel_by_user_{request_id}")]
+                                  callback_data=encode_callback_data('cancel_by_user', request_id))]
         ])
 
         amount_to_send_usdt = request_data['amount_currency']
@@ -770,33 +826,37 @@ class ExchangeHandler:
             reply_markup=keyboard, parse_mode='Markdown'
         )
         self.bot.db.update_request_data(request_id, {'user_message_id': msg.message_id})
-        self.bot.db.update_request_status(request_id, 'awaiting payment')
 
         updated_text, _ = self._prepare_admin_notification(
             self.bot.db.get_request_by_id(request_id))
         updated_text += "\n\n✅1️⃣ Уведомление о переводе TRX отправлено"
 
         keyboard = InlineKeyboardMarkup([[
-            InlineKeyboardButton("❌ Отказать", callback_data=f"decline_request_{request_id}")
+            InlineKeyboardButton("❌ Отказать", callback_data=encode_callback_data('decline_request', request_id))
         ]])
         await self._update_admin_messages(request_id, updated_text, keyboard)
 
     async def handle_payment_confirmation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # The query is answered once the transition is known, so a conflict can be shown as an alert.
         query = update.callback_query
-        await query.answer()
-        request_id = int(query.data.split('_')[-1])
+        request_id = decode_callback_data(query.data).request_id
         admin_user = query.from_user
         logger.info(
             f"[Aid] ({admin_user.id}) - Confirmed payment receipt for request #{request_id}.")
 
         request_data = self.bot.db.get_request_by_id(request_id)
         if not request_data:
+            await query.answer("Заявка не найдена!", show_alert=True)
             return
+        if not self.bot.db.update_request_status(request_id, 'payment received', changed_by=admin_user.id,
+                                                 expected_statuses=('awaiting confirmation',)):
+            await query.answer(f"Заявка #{request_id} уже не ожидает подтверждения.", show_alert=True)
+            return
+        await query.answer()
 
         msg = await context.bot.send_message(chat_id=request_data['user_id'], text=f"✅ Средства по заявке #{request_id} получены.")
 
         self.bot.db.update_request_data(request_id, {'user_message_id': msg.message_id})
-        self.bot.db.update_request_status(request_id, 'payment received')
 
         updated_text, _ = self._prepare_admin_notification(
             self.bot.db.get_request_by_id(request_id))
@@ -805,26 +865,32 @@ class ExchangeHandler:
 
         keyboard = InlineKeyboardMarkup([[
             InlineKeyboardButton("✅ Перевод клиенту сделан",
-                                 callback_data=f"confirm_transfer_{request_id}"),
-            InlineKeyboardButton("❌ Отказать", callback_data=f"decline_request_{request_id}")
+                                 callback_data=encode_callback_data('confirm_transfer', request_id)),
+            InlineKeyboardButton("❌ Отказать", callback_data=encode_callback_data('decline_request', request_id))
         ]])
         await self._update_admin_messages(request_id, updated_text, keyboard)
 
     async def handle_transfer_confirmation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # The query is answered once the transition is known, so a conflict can be shown as an alert.
         query = update.callback_query
-        await query.answer()
-        request_id = int(query.data.split('_')[-1])
+        request_id = decode_callback_data(query.data).request_id
         admin_user = query.from_user
         logger.info(
             f"[Aid] ({admin_user.id}) - Confirmed funds transfer to the client for request #{request_id}.")
 
         request_data = self.bot.db.get_request_by_id(request_id)
         if not request_data:
+            await query.answer("Заявка не найдена!", show_alert=True)
+            return
+        if not self.bot.db.update_request_status(request_id, 'funds sent', changed_by=admin_user.id,
+                                                 expected_statuses=('payment received',)):
+            await query.answer(f"Заявка #{request_id} уже не в статусе «получен платёж».", show_alert=True)
             return
+        await query.answer()
 
         keyboard = InlineKeyboardMarkup([
             [InlineKeyboardButton("✅ Подтвердить получение средств",
-                                  callback_data=f"by_user_confirm_transfer_{request_id}")]
+                                  callback_data=encode_callback_data('by_user_confirm_transfer', request_id))]
         ])
         msg = await context.bot.send_message(
             chat_id=request_data['user_id'],
@@ -835,7 +901,6 @@ class ExchangeHandler:
         )
 
         self.bot.db.update_request_data(request_id, {'user_message_id': msg.message_id})
-        self.bot.db.update_request_status(request_id, 'funds sent')
 
         updated_text, _ = self._prepare_admin_notification(
             self.bot.db.get_request_by_id(request_id))
@@ -854,14 +919,14 @@ class ExchangeHandler:
 
     async def start_cancellation_flow(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         query = update.callback_query
-        request_id = int(query.data.split('_')[-1])
+        request_id = decode_callback_data(query.data).request_id
         context.chat_data['request_id_for_cancellation'] = request_id
 
         keyboard = [
             [InlineKeyboardButton("✏️ Указать причину и отменить",
-                                  callback_data=f"ask_reason_{request_id}")],
+                                  callback_data=encode_callback_data('ask_reason', request_id))],
             [InlineKeyboardButton("🚫 Отменить без причины",
-                                  callback_data=f"confirm_decline_no_reason_{request_id}")],
+                                  callback_data=encode_callback_data('confirm_decline_no_reason', request_id))],
             [InlineKeyboardButton("⬅️ Назад", callback_data="cancel_decline_process")]
         ]
         await query.answer()
@@ -877,17 +942,17 @@ class ExchangeHandler:
 
     async def handle_decline_request_no_reason(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         query = update.callback_query
-        request_id = int(query.data.split('_')[-1])
+        request_id = decode_callback_data(query.data).request_id
         admin_user = query.from_user
         await query.answer()
         logger.info(f"[Aid] ({admin_user.id}) - Declined request #{request_id} without reason.")
 
-        request_data = self.bot.db.get_request_by_id(request_id)
+        request_data = self.bot.db.decline_request(request_id, changed_by=admin_user.id)
         if not request_data:
-            await query.edit_message_text(f"❌ Заявка #{request_id} больше не найдена.")
+            await query.edit_message_text(f"❌ Заявка #{request_id} не найдена или уже завершена.")
             return ConversationHandler.END
 
-        await self.refund_referral_debit_for_request(request_id)
+        await self.notify_referral_refund(request_data)
 
         if request_data['user_message_id']:
             try:
@@ -909,8 +974,6 @@ class ExchangeHandler:
             logger.error(
                 f"[System] - Failed to send cancellation message to user {request_data['user_id']}: {e}")
 
-        self.bot.db.update_request_status(request_id, 'declined')
-
         updated_text, _ = self._prepare_admin_notification(
             self.bot.db.get_request_by_id(request_id))
         updated_text += f"\n\n📄 Прежний статус заявки: {self.translate_status(request_data['status'])}\n\n❌🚫 ЗАЯВКА ОТКЛОНЕНА (🛡️ админ @{admin_user.username or admin_user.id})"
@@ -929,13 +992,13 @@ class ExchangeHandler:
         logger.info(
             f"[Aid] ({admin_user.id}) - Cancelling request #{request_id} with reason: {reason}")
 
-        await self.refund_referral_debit_for_request(request_id)
-
-        request_data = self.bot.db.get_request_by_id(request_id)
+        request_data = self.bot.db.decline_request(request_id, changed_by=admin_user.id)
         if not request_data:
-            await update.message.reply_text(f"❌ Заявка #{request_id} не найдена.")
+            await update.message.reply_text(f"❌ Заявка #{request_id} не найдена или уже завершена.")
             return ConversationHandler.END
 
+        await self.notify_referral_refund(request_data)
+
         if request_data['user_message_id']:
             try:
                 await context.bot.delete_message(chat_id=request_data['user_id'], message_id=request_data['user_message_id'])
@@ -958,8 +1021,6 @@ class ExchangeHandler:
                 f"[System] - Failed to send cancellation message to user {request_data['user_id']}: {e}")
             await update.message.reply_text(f"⚠️ Не удалось отправить сообщение пользователю {request_data['user_id']}.")
 
-        self.bot.db.update_request_status(request_id, 'declined')
-
         updated_text, _ = self._prepare_admin_notification(
             self.bot.db.get_request_by_id(request_id))
         updated_text += (f"\n\n📄 Прежний статус заявки: {self.translate_status(request_data['status'])}\n"
@@ -998,25 +1059,22 @@ class ExchangeHandler:
     async def handle_by_user_transfer_confirmation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
-        request_id = int(query.data.split('_')[-1])
+        request_id = decode_callback_data(query.data).request_id
         user = query.from_user
         logger.info(
             f"[Uid] ({user.id}, {user.username}) - Confirmed receipt of funds for request #{request_id}.")
 
-        request_data = self.bot.db.get_request_by_id(request_id)
-        if not request_data:
+        if not self.bot.db.update_request_status(request_id, 'completed', expected_statuses=('funds sent',)):
             await query.edit_message_text("⏳ Сессия истекла. Начните заново: /start", reply_markup=None)
             return
 
-        self.bot.db.update_request_status(request_id, 'completed')
-
         await self.bot.referral_handler.credit_referrer(user.id)
         updated_text, _ = self._generate_admin_message_content(
             self.bot.db.get_request_by_id(request_id))
         await self._update_admin_messages(request_id, updated_text, None)
 
         review_keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("✍️ Оставить отзыв", callback_data=f"leave_review_{request_id}")]
+            [InlineKeyboardButton("✍️ Оставить отзыв", callback_data=encode_callback_data('leave_review', request_id))]
         ])
 
         await query.edit_message_text(
@@ -1027,58 +1085,104 @@ class ExchangeHandler:
             reply_markup=review_keyboard, parse_mode='Markdown'
         )
 
-    async def refund_referral_debit_for_request(self, request_id: int):
+    async def notify_referral_refund(self, request_data: dict):
         """
-        Checks if a cancelled request used referral funds and refunds them.
-        Sends a notification to the user about the refund.
+        Tells the user that the referral funds used in a declined request were returned.
+        The refund itself is made by DatabaseManager.decline_request together with the decline.
         """
-        logger.info(
-            f"[System] - Checking for referral refund for cancelled request #{request_id}.")
-        request_data = self.bot.db.get_request_by_id(request_id)
-        if not request_data:
-            logger.warning(f"[System] - Refund check failed: Request #{request_id} not found.")
-            return
-
-        amount_to_refund = request_data.get('referral_payout_amount', 0.0)
+        request_id = request_data['id']
+        amount_to_refund = request_data.get('referral_payout_amount') or 0
 
         if amount_to_refund > 0:
             user_id = request_data['user_id']
-            self.bot.db.update_referral_balance(user_id, amount_to_refund)
-            logger.info(
-                f"[System] - Refunded ${amount_to_refund:.2f} to user {user_id} for cancelled request #{request_id}.")
-
             try:
                 await self.bot.application.bot.send_message(
                     chat_id=user_id,
-                    text=f"💰 Средства в размере ${amount_to_refund:.2f} с вашего реферального баланса, которые были использованы в отмененной заявке #{request_id}, возвращены на ваш счет."
+                    text=self._referral_refund_text(request_id, amount_to_refund)
                 )
             except Exception as e:
                 logger.error(
                     f"[System] - Failed to send refund notification to user {user_id} for request #{request_id}: {e}")
 
+    @staticmethod
+    def _referral_refund_text(request_id: int, amount: float) -> str:
+        return (f"💰 Средства в размере ${amount:.2f} с вашего реферального баланса, которые были использованы "
+                f"в отмененной заявке #{request_id}, возвращены на ваш счет.")
+
+    async def notify_request_expired(self, request_data: dict, timeout_minutes: int):
+        """
+        Tells the user and the admins that a request was declined by the expiry job.
+        The database side (status and referral refund) is already done by then.
+        """
+        request_id = request_data['id']
+        user_id = request_data['user_id']
+        bot = self.bot.application.bot
+
+        if request_data['user_message_id']:
+            try:
+                await bot.delete_message(chat_id=user_id, message_id=request_data['user_message_id'])
+            except TelegramError as e:
+                logger.warning(f"[System] - Failed to delete old user message of expired request #{request_id}: {e}")
+        try:
+            msg = await bot.send_message(
+                chat_id=user_id,
+                text=(f"⌛ Заявка #{request_id} отменена автоматически: она не менялась больше {timeout_minutes} мин.\n\n"
+                      f"Вы можете создать новую заявку командой /start.\n"
+                      f"📞 По вопросам обращайтесь: {self.bot.config.support_contact}")
+            )
+            self.bot.db.update_request_data(request_id, {'user_message_id': msg.message_id})
+            amount_refunded = request_data.get('referral_payout_amount') or 0
+            if amount_refunded > 0:
+                await bot.send_message(chat_id=user_id, text=self._referral_refund_text(request_id, amount_refunded))
+        except Exception as e:
+            logger.error(f"[System] - Failed to notify user {user_id} about expired request #{request_id}: {e}")
+
+        admin_text, _ = self._prepare_admin_notification(self.bot.db.get_request_by_id(request_id))
+        admin_text += (f"\n\n📄 Прежний статус заявки: {self.translate_status(request_data['status'])}"
+                       f"\n\n⌛🚫 ЗАЯВКА ОТМЕНЕНА АВТОМАТИЧЕСКИ (нет изменений {timeout_minutes} мин.)")
+        await self._update_admin_messages(request_id, admin_text, None)
+
     async def cancel_request_by_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
-        request_id = int(query.data.split('_')[-1])
+        request_id = decode_callback_data(query.data).request_id
         user = query.from_user
         logger.info(
             f"[Uid] ({user.id}, {user.username}) - User initiated cancellation for request #{request_id}.")
 
-        request_data = self.bot.db.get_request_by_id(request_id)
-        if not request_data or request_data['status'] in ['completed', 'declined']:
+        request_data = self.bot.db.decline_request(request_id)
+        if not request_data:
             await query.edit_message_text("❌ Эту заявку уже нельзя отменить.", reply_markup=None)
             return
 
-        await self.refund_referral_debit_for_request(request_id)
-
-        self.bot.db.update_request_status(request_id, 'declined')
         await query.edit_message_text(f"✅ Ваша заявка #{request_id} была успешно отменена.", reply_markup=None)
+        await self.notify_referral_refund(request_data)
 
         admin_text, _ = self._prepare_admin_notification(self.bot.db.get_request_by_id(request_id))
         admin_text += f"\n\n❌🚫 ЗАЯВКА ОТМЕНЕНА ПОЛЬЗОВАТЕЛЕМ (@{user.username or user.id})"
         await self._update_admin_messages(request_id, admin_text, None)
 
+    @staticmethod
+    def _render_cache_key(request_data) -> tuple:
+        """
+        Identifies a version of a request for the admin render cache.
+        updated_at only has a one-second resolution, so the fields that can change
+        within the same second are part of the key as well.
+        """
+        return (request_data['id'], request_data.get('updated_at'),
+                request_data['status'], request_data.get('transaction_hash'))
+
+    def _get_vip_status(self, user_id):
+        user_profile = self.bot.db.get_user_profile(user_id)
+        return user_profile.get('vip_status') if user_profile else None
+
     def _prepare_admin_notification(self, request_data):
+        vip_status = self._get_vip_status(request_data['user_id'])
+        cache_key = ('notification', *self._render_cache_key(request_data), vip_status)
+        return self._admin_render_cache.get_or_render(
+            cache_key, lambda: self._render_admin_notification(request_data, vip_status))
+
+    def _render_admin_notification(self, request_data, vip_status):
         username_display = 'none'
         if request_data['username']:
             username_display = request_data['username'].replace('_', '\\_').replace(
@@ -1086,10 +1190,6 @@ class ExchangeHandler:
 
         def sanitize(text): return str(text).replace('`', "'") if text else ""
 
-        # Fetch user profile to get VIP status
-        user_profile = self.bot.db.get_user_profile(request_data['user_id'])
-        vip_status = user_profile.get('vip_status') if user_profile else None
-
         vip_status_text = ""
         if vip_status == 'Gold':
             vip_status_text = "👑 VIP-статус: 💎 Gold\n"
@@ -1139,11 +1239,10 @@ class ExchangeHandler:
 
         keyboard = InlineKeyboardMarkup([
             [InlineKeyboardButton(
-                "❌ Отказать", callback_data=f"decline_request_{request_data['id']}")]
+                "❌ Отказать", callback_data=encode_callback_data('decline_request', request_data['id']))]
         ])
 
         if request_data.get('needs_trx'):
-            trx_cost_usd = self.bot.config.trx_cost_usdt
             title = f"{title} (с TRX)"
             trx_info = f"⚠️ Клиент нуждается в TRX.\n📬 TRX-адрес: `{sanitize(request_data.get('trx_address'))}`"
 
@@ -1155,14 +1254,20 @@ class ExchangeHandler:
             if request_data['status'] == 'awaiting trx transfer':
                 keyboard = InlineKeyboardMarkup([
                     [InlineKeyboardButton(
-                        "✅ TRX переведено", callback_data=f"confirm_trx_transfer_{request_data['id']}")],
+                        "✅ TRX переведено", callback_data=encode_callback_data('confirm_trx_transfer', request_data['id']))],
                     [InlineKeyboardButton(
-                        "❌ Отказать", callback_data=f"decline_request_{request_data['id']}")]
+                        "❌ Отказать", callback_data=encode_callback_data('decline_request', request_data['id']))]
                 ])
         return base_text, keyboard
 
     def _generate_admin_message_content(self, request_data):
-        text, keyboard = self._prepare_admin_notification(request_data)
+        vip_status = self._get_vip_status(request_data['user_id'])
+        cache_key = ('content', *self._render_cache_key(request_data), vip_status)
+        return self._admin_render_cache.get_or_render(
+            cache_key, lambda: self._render_admin_message_content(request_data, vip_status))
+
+    def _render_admin_message_content(self, request_data, vip_status):
+        text, keyboard = self._render_admin_notification(request_data, vip_status)
         status, req_id = request_data['status'], request_data['id']
         tx_hash = request_data.get("transaction_hash") or "не указан"
 
@@ -1170,15 +1275,15 @@ class ExchangeHandler:
             text += f"\n\n✅2️⃣ Пользователь подтвердил перевод. Hash: `{tx_hash}`"
             keyboard = InlineKeyboardMarkup([
                 [InlineKeyboardButton("✅ Средства получены",
-                                      callback_data=f"confirm_payment_{req_id}")],
-                [InlineKeyboardButton("❌ Отказать", callback_data=f"decline_request_{req_id}")]
+                                      callback_data=encode_callback_data('confirm_payment', req_id))],
+                [InlineKeyboardButton("❌ Отказать", callback_data=encode_callback_data('decline_request', req_id))]
             ])
         elif status == 'payment received':
             text += f"\n\n✅ Hash: `{tx_hash}`\n\n✅3️⃣ Уведомление о получении средств отправлено."
             keyboard = InlineKeyboardMarkup([
                 [InlineKeyboardButton("✅ Перевод клиенту сделан",
-                                      callback_data=f"confirm_transfer_{req_id}")],
-                [InlineKeyboardButton("❌ Отказать", callback_data=f"decline_request_{req_id}")]
+                                      callback_data=encode_callback_data('confirm_transfer', req_id))],
+                [InlineKeyboardButton("❌ Отказать", callback_data=encode_callback_data('decline_request', req_id))]
             ])
         elif status == 'funds sent':
             text += f"\n\n✅ Hash: `{tx_hash}`\n\n✅4️⃣ Уведомление об отправке средств клиенту отправлено."
@@ -1339,25 +1444,29 @@ class ExchangeHandler:
                 CommandHandler('start', self.cancel_and_return_to_menu),
                 CallbackQueryHandler(self.main_menu, pattern='^back_to_menu$')
             ],
-            per_message=False
+            per_message=False,
+            name='exchange_conversation',
+            persistent=self.bot.persistence is not None
         )
 
         hash_conv_handler = ConversationHandler(
             entry_points=[CallbackQueryHandler(
-                self.ask_for_hash, pattern=r'^user_confirms_sending_')],
+                self.ask_for_hash, pattern=action_pattern('user_confirms_sending'))],
             states={self.ENTERING_HASH: [MessageHandler(
                 filters.TEXT & ~filters.COMMAND, self.process_hash)]},
             fallbacks=[CommandHandler('start', self.cancel_and_return_to_menu)],
+            name='hash_conversation',
+            persistent=self.bot.persistence is not None
         )
 
         cancellation_conv_handler = ConversationHandler(
             entry_points=[CallbackQueryHandler(
-                self.start_cancellation_flow, pattern=r'^decline_request_\d+')],
+                self.start_cancellation_flow, pattern=action_pattern('decline_request'))],
             states={
                 self.SELECTING_CANCELLATION_TYPE: [
-                    CallbackQueryHandler(self.ask_for_reason_text, pattern=r'^ask_reason_'),
+                    CallbackQueryHandler(self.ask_for_reason_text, pattern=action_pattern('ask_reason')),
                     CallbackQueryHandler(self.handle_decline_request_no_reason,
-                                         pattern=r'^confirm_decline_no_reason_'),
+                                         pattern=action_pattern('confirm_decline_no_reason')),
                 ],
                 self.AWAITING_REASON_TEXT: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_cancellation_with_reason)],
             },
@@ -1366,17 +1475,21 @@ class ExchangeHandler:
                 CallbackQueryHandler(self._cancel_cancellation_flow,
                                      pattern='^cancel_decline_process$')
             ],
-            conversation_timeout=300
+            conversation_timeout=300,
+            name='cancellation_conversation',
+            persistent=self.bot.persistence is not None
         )
 
         review_conv_handler = ConversationHandler(
-            entry_points=[CallbackQueryHandler(self.prompt_for_review, pattern=r'^leave_review_')],
+            entry_points=[CallbackQueryHandler(self.prompt_for_review, pattern=action_pattern('leave_review'))],
             states={
                 self.AWAITING_REVIEW_TEXT: [MessageHandler(
                     filters.TEXT & ~filters.COMMAND, self.process_review)]
             },
             fallbacks=[CommandHandler('start', self.cancel_and_return_to_menu)],
-            conversation_timeout=300
+            conversation_timeout=300,
+            name='review_conversation',
+            persistent=self.bot.persistence is not None
         )
 
         application.add_handler(exchange_conv_handler)
@@ -1384,19 +1497,15 @@ class ExchangeHandler:
         application.add_handler(cancellation_conv_handler)
         application.add_handler(review_conv_handler)
 
-        application.add_handler(CallbackQueryHandler(self.show_rate, pattern='^rate$'))
-        application.add_handler(CallbackQueryHandler(self.show_help, pattern='^user_help$'))
-        application.add_handler(CallbackQueryHandler(self.main_menu, pattern='^back_to_menu$'))
-
-        application.add_handler(CallbackQueryHandler(
-            self.handle_payment_confirmation, pattern=r'^confirm_payment_\d+'))
-        application.add_handler(CallbackQueryHandler(
-            self.handle_transfer_confirmation, pattern=r'^confirm_transfer_\d+'))
-        application.add_handler(CallbackQueryHandler(
-            self.handle_transfer_confirmation_trx, pattern=r'^confirm_trx_transfer_\d+'))
-        application.add_handler(CallbackQueryHandler(
-            self.handle_by_user_transfer_confirmation, pattern=r'^by_user_confirm_transfer_\d+'))
-        application.add_handler(CallbackQueryHandler(
-            self.cancel_request_by_user, pattern=r'^cancel_by_user_\d+'))
+        # Callbacks outside of conversations are dispatched by the shared callback router.
+        router = self.bot.callback_router
+        router.add_route('rate', self.show_rate)
+        router.add_route('user_help', self.show_help)
+        router.add_route('back_to_menu', self.main_menu)
+        router.add_route('confirm_payment', self.handle_payment_confirmation)
+        router.add_route('confirm_transfer', self.handle_transfer_confirmation)
+        router.add_route('confirm_trx_transfer', self.handle_transfer_confirmation_trx)
+        router.add_route('by_user_confirm_transfer', self.handle_by_user_transfer_confirmation)
+        router.add_route('cancel_by_user', self.cancel_request_by_user)
 
         application.add_handler(CommandHandler('start', self.start_command), group=1)
@@ -4,6 +4,8 @@ from telegram.ext import (
     ContextTypes, CommandHandler, CallbackQueryHandler, ConversationHandler
 )
 
+from callback_router import encode_callback_data, decode_callback_data, action_pattern
+
 logger = logging.getLogger(__name__)
 
 
@@ -57,14 +59,14 @@ class ReferralHandler:
         if total_pages > 1:
             if page > 1:
                 pagination_buttons.append(InlineKeyboardButton(
-                    "⬅️ Назад", callback_data=f'ref_page_{page - 1}'))
+                    "⬅️ Назад", callback_data=encode_callback_data('ref_page', page - 1)))
 
             pagination_buttons.append(InlineKeyboardButton(
                 f"📄 {page}/{total_pages}", callback_data='ref_page_ignore'))
 
             if page < total_pages:
                 pagination_buttons.append(InlineKeyboardButton(
-                    "Вперед ➡️", callback_data=f'ref_page_{page + 1}'))
+                    "Вперед ➡️", callback_data=encode_callback_data('ref_page', page + 1)))
 
         keyboard = []
         if pagination_buttons:
@@ -96,7 +98,7 @@ class ReferralHandler:
             await query.answer()
             return self.REFERRAL_MENU
 
-        page = int(query.data.split('_')[-1])
+        page = decode_callback_data(query.data).args[0]
         await self._display_referral_menu(update, context, page=page)
         return self.REFERRAL_MENU
 
@@ -201,12 +203,14 @@ class ReferralHandler:
                 self.REFERRAL_MENU: [
                     CallbackQueryHandler(self.back_to_main_menu_from_referral,
                                          pattern='^back_to_main_menu$'),
-                    CallbackQueryHandler(self.handle_page_navigation, pattern=r'^ref_page_')
+                    CallbackQueryHandler(self.handle_page_navigation, pattern=action_pattern('ref_page', 'ref_page_ignore'))
                 ]
             },
             fallbacks=[
                 CommandHandler('start', self.bot.exchange_handler.cancel_and_return_to_menu)
             ],
-            per_message=False
+            per_message=False,
+            name='referral_conversation',
+            persistent=self.bot.persistence is not None
         )
         application.add_handler(referral_conv_handler)
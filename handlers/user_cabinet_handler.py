@@ -20,6 +20,8 @@ class UserCabinetHandler:
         EDIT_FIO,
         EDIT_INN
     ) = range(20, 26)
+    # States in which the user types bank requisites; update capture masks every digit there.
+    REQUISITE_STATES = (EDIT_IBAN, EDIT_CARD_NUMBER, EDIT_INN)
 
     def __init__(self, bot_instance):
         self.bot = bot_instance
@@ -180,6 +182,8 @@ class UserCabinetHandler:
                 CommandHandler('start', self.cancel),
                 CallbackQueryHandler(self.handle_cabinet_menu, pattern='^back_to_main_menu$')
             ],
-            per_message=False
+            per_message=False,
+            name='cabinet_conversation',
+            persistent=self.bot.persistence is not None
         )
         application.add_handler(cabinet_conv_handler)
\ No newline at end of file
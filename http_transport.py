@@ -0,0 +1,166 @@
+# http_transport.py
+
+import time
+import logging
+from collections import defaultdict, deque
+
+import httpx
+from telegram.request import HTTPXRequest
+
+from percentiles import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class TransportStats:
+    """
+    Collects connection-pool wait times, connection setup times and request latencies of the Bot API client.
+    Only the most recent samples are kept, so memory usage stays constant.
+    """
+
+    def __init__(self, max_samples: int = 1000):
+        self._max_samples = max_samples
+        self._pool_waits = defaultdict(lambda: deque(maxlen=self._max_samples))
+        self._connects = defaultdict(lambda: deque(maxlen=self._max_samples))
+        self._latencies = defaultdict(lambda: deque(maxlen=self._max_samples))
+        self._request_counts = defaultdict(int)
+        self._error_counts = defaultdict(int)
+        self._request_listeners = []
+
+    def add_request_listener(self, callback):
+        """Registers a callback(api_method, seconds, ok) that is called for every finished request."""
+        self._request_listeners.append(callback)
+
+    def record_pool_wait(self, pool_name: str, seconds: float):
+        self._pool_waits[pool_name].append(seconds)
+
+    def record_connect(self, pool_name: str, seconds: float):
+        self._connects[pool_name].append(seconds)
+
+    def record_request(self, api_method: str, seconds: float, ok: bool):
+        self._latencies[api_method].append(seconds)
+        self._request_counts[api_method] += 1
+        if not ok:
+            self._error_counts[api_method] += 1
+        for callback in self._request_listeners:
+            callback(api_method, seconds, ok)
+
+    @staticmethod
+    def _describe(samples) -> dict:
+        ordered = sorted(samples)
+        return {
+            'samples': len(ordered),
+            'avg_ms': (sum(ordered) / len(ordered) * 1000) if ordered else 0.0,
+            'p50_ms': percentile(ordered, 50) * 1000,
+            'p95_ms': percentile(ordered, 95) * 1000,
+            'max_ms': (ordered[-1] * 1000) if ordered else 0.0,
+        }
+
+    def snapshot(self) -> dict:
+        """Returns the aggregated statistics as a plain dictionary."""
+        return {
+            'pool_wait': {name: self._describe(samples) for name, samples in self._pool_waits.items()},
+            'connect': {name: self._describe(samples) for name, samples in self._connects.items()},
+            'requests': {
+                method: {
+                    **self._describe(samples),
+                    'total': self._request_counts[method],
+                    'errors': self._error_counts[method],
+                }
+                for method, samples in self._latencies.items()
+            },
+        }
+
+    def summary_text(self) -> str:
+        """Formats the statistics as a short HTML block for the admin panel."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, stats in snapshot['pool_wait'].items():
+            lines.append(
+                f"⏳ Пул <code>{name}</code>: p50 {stats['p50_ms']:.1f} мс, p95 {stats['p95_ms']:.1f} мс")
+        for name, stats in snapshot['connect'].items():
+            lines.append(
+                f"🔌 Соединения <code>{name}</code>: {stats['samples']} шт., "
+                f"p50 {stats['p50_ms']:.0f} мс, p95 {stats['p95_ms']:.0f} мс")
+        for method, stats in sorted(snapshot['requests'].items()):
+            lines.append(
+                f"📡 <code>{method}</code>: {stats['total']} шт., ошибок {stats['errors']}, "
+                f"p50 {stats['p50_ms']:.0f} мс, p95 {stats['p95_ms']:.0f} мс")
+        return "\n".join(lines) if lines else "Нет данных."
+
+
+class InstrumentedHTTPXRequest(HTTPXRequest):
+    """
+    HTTPXRequest that reports how long each request waited for a pooled connection,
+    how long opening a new connection took and how long the whole Bot API call took.
+    """
+
+    def __init__(self, stats: TransportStats, pool_name: str, httpx_kwargs: dict | None = None, **kwargs):
+        self._stats = stats
+        self._pool_name = pool_name
+        httpx_kwargs = dict(httpx_kwargs or {})
+        httpx_kwargs['event_hooks'] = {'request': [self._on_request]}
+        super().__init__(httpx_kwargs=httpx_kwargs, **kwargs)
+
+    async def _on_request(self, request: httpx.Request):
+        started = time.perf_counter()
+        connect_started = None
+        sent = False
+
+        async def trace(event_name: str, info: dict):
+            # httpcore has no pool-acquire event. A request served by a pooled connection
+            # starts with sending; one that opens a new connection starts with connection.*
+            # events, and that setup time (including TCP and TLS) is not a pool wait.
+            nonlocal connect_started, sent
+            if sent or not event_name.endswith('.started'):
+                return
+            now = time.perf_counter()
+            if event_name.startswith('connection.'):
+                if connect_started is None:
+                    connect_started = now
+                return
+            sent = True
+            if connect_started is None:
+                self._stats.record_pool_wait(self._pool_name, now - started)
+            else:
+                self._stats.record_connect(self._pool_name, now - connect_started)
+
+        request.extensions['trace'] = trace
+
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs) -> tuple[int, bytes]:
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, request_data, **kwargs)
+        except Exception:
+            self._stats.record_request(api_method, time.perf_counter() - started, ok=False)
+            raise
+        self._stats.record_request(api_method, time.perf_counter() - started, ok=code == 200)
+        return code, payload
+
+
+def build_request(config, stats: TransportStats, pool_name: str, pool_size: int) -> InstrumentedHTTPXRequest:
+    """
+    Builds a Bot API request object from the [Transport] profile in settings.ini.
+    :param config: The ConfigManager instance.
+    :param stats: Shared statistics collector.
+    :param pool_name: Name used in the statistics, e.g. 'requests' or 'get_updates'.
+    :param pool_size: Maximum number of connections in this pool.
+    """
+    keepalive_connections = config.transport_keepalive_connections
+    limits = httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=min(pool_size, keepalive_connections) if keepalive_connections is not None else pool_size,
+        keepalive_expiry=config.transport_keepalive_expiry
+    )
+    return InstrumentedHTTPXRequest(
+        stats,
+        pool_name,
+        httpx_kwargs={'limits': limits},
+        connection_pool_size=pool_size,
+        http_version=config.transport_http_version,
+        connect_timeout=config.transport_connect_timeout,
+        read_timeout=config.transport_read_timeout,
+        write_timeout=config.transport_write_timeout,
+        pool_timeout=config.transport_pool_timeout
+    )
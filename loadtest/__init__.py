@@ -0,0 +1,6 @@
+"""
+Offline load testing: a local stand-in for the Telegram Bot API and a driver that walks
+virtual users and admins through the exchange flow against a real bot process.
+
+Run from the repository root:  python -m loadtest.driver --help
+"""
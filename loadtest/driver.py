@@ -0,0 +1,403 @@
+# loadtest/driver.py
+"""
+Walks virtual users through the whole exchange flow against a real bot process that talks
+to the local Bot API stand-in, and reports throughput and latency per step.
+
+Each virtual user sends /start, opens the exchange, enters the amount and requisites,
+confirms the request, confirms the transfer and sends the hash. Virtual admins click
+"confirm_payment" and "confirm_transfer" on the notifications they receive, and the user
+finally confirms the receipt of funds. A step's latency is the time from pushing the
+update until the bot's answer reaches the chat that waits for it, so it includes the
+polling round trip, the handler and the stand-in's simulated latency.
+
+The bot is started as a subprocess in a scratch directory with its own settings.ini,
+database and logs, which are kept for inspection after the run.
+
+Run from the repository root, e.g.:
+    python -m loadtest.driver --users 2000 --concurrency 200 --ramp-up 20
+    python -m loadtest.driver --users 500 --latency 0.05 --jitter 0.05 --error-rate sendMessage=0.01
+"""
+
+import os
+import sys
+import time
+import random
+import signal
+import asyncio
+import logging
+import argparse
+import tempfile
+import configparser
+
+from callback_router import decode_callback_data
+from percentiles import percentile
+from loadtest.fake_bot_api import FakeBotApi
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_TOKEN = '123456:LOADTEST'
+FIRST_USER_ID = 100_000_001
+FIRST_ADMIN_ID = 900_000_001
+
+STEPS = (
+    'start', 'open_exchange', 'choose_currency', 'amount', 'bank_name', 'iban', 'card_number', 'fio',
+    'inn', 'send_exchange', 'confirm_sending', 'hash', 'admin_confirm_payment', 'admin_confirm_transfer',
+    'confirm_receipt',
+)
+
+
+class StepFailed(Exception):
+    pass
+
+
+class StepStats:
+    """Latencies and failures of one step."""
+
+    def __init__(self):
+        self.latencies = []
+        self.failures = 0
+
+    def describe(self, duration: float) -> dict:
+        ordered = sorted(self.latencies)
+        return {
+            'count': len(ordered),
+            'failures': self.failures,
+            'per_second': len(ordered) / duration if duration else 0.0,
+            'p50_ms': percentile(ordered, 50) * 1000,
+            'p99_ms': percentile(ordered, 99) * 1000,
+            'max_ms': (ordered[-1] * 1000) if ordered else 0.0,
+        }
+
+
+def _sent_by_bot(event) -> bool:
+    return event.method in ('sendMessage', 'editMessageText')
+
+
+def _offering(action: str):
+    """Predicate for a bot message that has a button for the given action."""
+    return lambda event: _sent_by_bot(event) and event.has_action(action)
+
+
+class LoadTest:
+    """Runs the virtual users and admins and collects per-step statistics."""
+
+    def __init__(self, api: FakeBotApi, users: int, admins: int, concurrency: int, ramp_up: float,
+                 think_time: float, step_timeout: float, admin_timeout: float):
+        self.api = api
+        self.users = users
+        self.admin_ids = [FIRST_ADMIN_ID + index for index in range(admins)]
+        self.concurrency = concurrency
+        self.ramp_up = ramp_up
+        self.think_time = think_time
+        self.step_timeout = step_timeout
+        self.admin_timeout = admin_timeout
+
+        self.stats = {step: StepStats() for step in STEPS}
+        self.completed = 0
+        self.failed = 0
+        self.duration = 0.0
+        self._request_users = {}  # request_id -> user dict
+        self._hash_answered = {}  # request_id -> asyncio.Event
+        self._clicked = set()
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f"Load {user_id}", 'username': f"load{user_id}"}
+
+    async def _think(self):
+        if self.think_time > 0:
+            await asyncio.sleep(random.uniform(0, 2 * self.think_time))
+
+    async def _step(self, step: str, chat_id: int, push, predicate, timeout: float | None = None):
+        """Pushes an update and waits for the bot's answer in the given chat."""
+        chat = self.api.chats[chat_id]
+        cursor = len(chat.events)
+        started = time.monotonic()
+        push()
+        try:
+            _, event = await chat.wait_for(predicate, cursor, timeout or self.step_timeout)
+        except asyncio.TimeoutError:
+            self.stats[step].failures += 1
+            raise StepFailed(step) from None
+        self.stats[step].latencies.append(time.monotonic() - started)
+        return event
+
+    async def _send(self, step: str, user: dict, text: str, predicate=_sent_by_bot):
+        await self._think()
+        return await self._step(step, user['id'], lambda: self.api.push_message(user, text), predicate)
+
+    async def _click(self, step: str, user: dict, event, action: str, predicate=_sent_by_bot):
+        await self._think()
+        data = event.find_button(action)
+        if data is None:
+            self.stats[step].failures += 1
+            raise StepFailed(f"{step}: no '{action}' button")
+        return await self._step(step, user['id'], lambda: self.api.push_callback_query(user, event, data), predicate)
+
+    async def _run_user(self, user_id: int):
+        user = self._user(user_id)
+        event = await self._send('start', user, '/start', _offering('exchange'))
+        event = await self._click('open_exchange', user, event, 'exchange', _offering('currency_usdt'))
+        await self._click('choose_currency', user, event, 'currency_usdt')
+        await self._send('amount', user, str(random.randint(50, 500)))
+        await self._send('bank_name', user, 'Monobank')
+        await self._send('iban', user, 'UA' + ''.join(random.choices('0123456789', k=27)))
+        await self._send('card_number', user, '4111 1111 1111 1111')
+        await self._send('fio', user, 'Шевченко Тарас Григорович')
+        event = await self._send('inn', user, '1234567890', _offering('send_exchange'))
+        event = await self._click('send_exchange', user, event, 'send_exchange', _offering('user_confirms_sending'))
+
+        request_id = decode_callback_data(event.find_button('user_confirms_sending')).request_id
+        self._request_users[request_id] = user
+        hash_answered = self._hash_answered[request_id] = asyncio.Event()
+        await self._click('confirm_sending', user, event, 'user_confirms_sending')
+        cursor = len(self.api.chats[user_id].events)
+        await self._send('hash', user, f"{random.getrandbits(256):064x}")
+        hash_answered.set()
+
+        # The admins take it from here; wait until the funds are reported as sent.
+        try:
+            _, event = await self.api.chats[user_id].wait_for(
+                _offering('by_user_confirm_transfer'), cursor, self.admin_timeout)
+        except asyncio.TimeoutError:
+            raise StepFailed('admin_confirm_transfer') from None
+        await self._click('confirm_receipt', user, event, 'by_user_confirm_transfer', _offering('leave_review'))
+
+    async def _user_session(self, user_id: int, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            try:
+                await self._run_user(user_id)
+                self.completed += 1
+            except StepFailed as e:
+                self.failed += 1
+                logger.debug(f"User {user_id} stopped at {e}")
+
+    async def _admin_click(self, admin: dict, event, action: str, request_id: int):
+        user = self._request_users.get(request_id)
+        if user is None:
+            return
+        # The notification reaches the admins just before the user's hash is acknowledged;
+        # wait for that answer so it is not taken for the answer to the admin's click.
+        await self._hash_answered[request_id].wait()
+        # The admin's click is answered in the user's chat.
+        expected = _sent_by_bot if action == 'confirm_payment' else _offering('by_user_confirm_transfer')
+        step = f"admin_{action}"
+        try:
+            await self._think()
+            data = event.find_button(action)
+            await self._step(step, user['id'], lambda: self.api.push_callback_query(admin, event, data), expected)
+        except StepFailed:
+            pass
+
+    async def _run_admin(self, index: int):
+        """Clicks through the notifications of the requests assigned to this admin."""
+        admin = self._user(self.admin_ids[index])
+        chat = self.api.chats[admin['id']]
+        cursor = 0
+        clicks = set()
+
+        def actionable(event):
+            return event.method == 'sendMessage' and (
+                event.has_action('confirm_payment') or event.has_action('confirm_transfer'))
+
+        try:
+            while True:
+                cursor, event = await chat.wait_for(actionable, cursor)
+                cursor += 1
+                action = 'confirm_payment' if event.has_action('confirm_payment') else 'confirm_transfer'
+                request_id = decode_callback_data(event.find_button(action)).request_id
+                # Every admin gets every notification; each request is handled by one of them.
+                if request_id % len(self.admin_ids) != index or (request_id, action) in self._clicked:
+                    continue
+                self._clicked.add((request_id, action))
+                task = asyncio.create_task(self._admin_click(admin, event, action, request_id))
+                clicks.add(task)
+                task.add_done_callback(clicks.discard)
+        finally:
+            # Clicks for users who failed earlier would wait forever.
+            for task in list(clicks):
+                task.cancel()
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        admin_tasks = [asyncio.create_task(self._run_admin(index)) for index in range(len(self.admin_ids))]
+        started = time.monotonic()
+        sessions = []
+        interval = self.ramp_up / self.users if self.users else 0
+        for offset in range(self.users):
+            sessions.append(asyncio.create_task(self._user_session(FIRST_USER_ID + offset, semaphore)))
+            if interval:
+                await asyncio.sleep(interval)
+        await asyncio.gather(*sessions)
+        self.duration = time.monotonic() - started
+        for task in admin_tasks:
+            task.cancel()
+        await asyncio.gather(*admin_tasks, return_exceptions=True)
+
+    def report(self) -> str:
+        updates = sum(len(stats.latencies) + stats.failures for stats in self.stats.values())
+        lines = [
+            f"Users: {self.users} ({self.completed} completed, {self.failed} failed), "
+            f"admins: {len(self.admin_ids)}, duration: {self.duration:.1f} s",
+            f"Throughput: {self.completed / self.duration if self.duration else 0:.1f} exchanges/s, "
+            f"{updates / self.duration if self.duration else 0:.1f} updates/s",
+            "",
+            f"{'step':<24}{'count':>8}{'failed':>8}{'per s':>9}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+        ]
+        for step, stats in self.stats.items():
+            row = stats.describe(self.duration)
+            lines.append(f"{step:<24}{row['count']:>8}{row['failures']:>8}{row['per_second']:>9.1f}"
+                         f"{row['p50_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}")
+        lines.append("")
+        lines.append("Bot API requests: " + ", ".join(
+            f"{method} {count}" for method, count in sorted(self.api.request_counts.items())))
+        if self.api.injected_errors:
+            lines.append("Injected errors: " + ", ".join(
+                f"{method} {count}" for method, count in sorted(self.api.injected_errors.items())))
+        return "\n".join(lines)
+
+
+class BotProcess:
+    """Runs main.py in a scratch directory configured to talk to the stand-in."""
+
+    def __init__(self, workdir: str, base_url: str, admin_ids: list[int], overrides: dict[tuple[str, str], str]):
+        self.workdir = workdir
+        self.base_url = base_url
+        self.admin_ids = admin_ids
+        self.overrides = overrides
+        self._process = None
+        self._stderr = None
+
+    def write_settings(self):
+        config = configparser.ConfigParser()
+        config.optionxform = str
+        config['User'] = {
+            'TOKEN': BOT_TOKEN,
+            'ADMIN_CHAT_ID': ','.join(str(admin_id) for admin_id in self.admin_ids),
+        }
+        config['Settings'] = {
+            'EXCHANGE_RATE': '41.5',
+            'ADMIN_PASSWORD': 'loadtest',
+            'WALLET_ADDRESS': 'TLoadTestWalletAddress',
+            'SUPPORT_CONTACT': '@support',
+            'TRX_COST_USDT': '15.0',
+            'BOT_ENABLED': 'True',
+            'REVIEW_CHANNEL_ID': 'your_channel_id_here',
+            'REVIEW_CHANNEL_URL': 'your_channel_url_here',
+            'MIN_REFERRAL_PAYOUT_USD': '20.0',
+        }
+        config['Transport'] = {'BASE_URL': self.base_url}
+        config['Metrics'] = {'ENABLED': 'False'}
+        for (section, option), value in self.overrides.items():
+            if not config.has_section(section):
+                config.add_section(section)
+            config.set(section, option, value)
+        with open(os.path.join(self.workdir, 'settings.ini'), 'w', encoding='utf-8') as settings_file:
+            config.write(settings_file)
+
+    async def start(self):
+        self.write_settings()
+        self._stderr = open(os.path.join(self.workdir, 'bot.stderr'), 'wb')
+        self._process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(PROJECT_ROOT, 'main.py'), cwd=self.workdir,
+            stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL, stderr=self._stderr)
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    async def stop(self, timeout: float = 30):
+        if self.running:
+            if sys.platform == 'win32':
+                self._process.terminate()
+            else:
+                self._process.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(self._process.wait(), timeout)
+            except asyncio.TimeoutError:
+                self._process.kill()
+                await self._process.wait()
+        if self._stderr is not None:
+            self._stderr.close()
+            self._stderr = None
+
+
+def _parse_pairs(values: list[str], convert=float) -> dict:
+    """Parses repeated 'name=value' arguments."""
+    pairs = {}
+    for item in values:
+        name, _, value = item.partition('=')
+        pairs[name.strip()] = convert(value)
+    return pairs
+
+
+def _parse_overrides(values: list[str]) -> dict[tuple[str, str], str]:
+    overrides = {}
+    for key, value in _parse_pairs(values, str).items():
+        section, _, option = key.partition('.')
+        overrides[(section, option)] = value
+    return overrides
+
+
+async def _main(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix='exchange_bot_loadtest_')
+    os.makedirs(workdir, exist_ok=True)
+    if os.path.exists(os.path.join(workdir, 'database')):
+        raise SystemExit(f"{workdir} already contains a database; use an empty directory.")
+
+    api = FakeBotApi(port=args.port, latency=args.latency, jitter=args.jitter,
+                     method_latency=_parse_pairs(args.method_latency),
+                     error_rates=_parse_pairs(args.error_rate), error_code=args.error_code)
+    await api.start()
+    test = LoadTest(api, users=args.users, admins=args.admins, concurrency=args.concurrency,
+                    ramp_up=args.ramp_up, think_time=args.think_time, step_timeout=args.step_timeout,
+                    admin_timeout=args.admin_timeout)
+    overrides = _parse_overrides(args.bot_setting)
+    overrides.setdefault(('Logging', 'LEVEL'), args.bot_log_level)
+    bot = BotProcess(workdir, api.base_url, test.admin_ids, overrides)
+
+    print(f"Working directory: {workdir}")
+    await bot.start()
+    try:
+        try:
+            await asyncio.wait_for(api.polling_started.wait(), args.startup_timeout)
+        except asyncio.TimeoutError:
+            raise SystemExit(f"The bot did not start polling; see {workdir}/bot.stderr and {workdir}/log.")
+        print(f"Bot is polling. Running {args.users} users with {args.admins} admins...")
+        await test.run()
+    finally:
+        await bot.stop()
+        await api.stop()
+    print(test.report())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000, help="number of virtual users")
+    parser.add_argument('--admins', type=int, default=2, help="number of virtual admins")
+    parser.add_argument('--concurrency', type=int, default=200, help="users walking the flow at the same time")
+    parser.add_argument('--ramp-up', type=float, default=10.0, help="seconds over which the users are started")
+    parser.add_argument('--think-time', type=float, default=0.0, help="mean pause between steps, seconds")
+    parser.add_argument('--step-timeout', type=float, default=30.0, help="seconds to wait for an answer")
+    parser.add_argument('--admin-timeout', type=float, default=120.0,
+                        help="seconds a user waits for the admins after sending the hash")
+    parser.add_argument('--port', type=int, default=8081, help="port of the Bot API stand-in")
+    parser.add_argument('--latency', type=float, default=0.0, help="Bot API response delay, seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random extra delay up to this many seconds")
+    parser.add_argument('--method-latency', action='append', default=[], metavar='METHOD=SECONDS')
+    parser.add_argument('--error-rate', action='append', default=[], metavar='METHOD=SHARE')
+    parser.add_argument('--error-code', type=int, default=500, help="error code of injected errors (e.g. 429)")
+    parser.add_argument('--bot-setting', action='append', default=[], metavar='SECTION.OPTION=VALUE',
+                        help="extra settings.ini value for the bot, e.g. Persistence.ENABLED=False")
+    parser.add_argument('--bot-log-level', default='WARNING', help="log level of the bot process")
+    parser.add_argument('--startup-timeout', type=float, default=30.0)
+    parser.add_argument('--workdir', help="scratch directory for the bot (default: a new temporary directory)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(_main(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+# loadtest/fake_bot_api.py
+
+import json
+import time
+import random
+import asyncio
+import logging
+from collections import defaultdict, deque
+from typing import NamedTuple
+
+from aiohttp import web
+
+from callback_router import decode_callback_data
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'Load Test Bot', 'username': 'loadtest_bot'}
+
+
+class BotEvent(NamedTuple):
+    """A message the bot sent or edited in a chat, as seen by the stand-in."""
+    method: str
+    chat_id: int | str
+    message_id: int
+    text: str
+    reply_markup: dict | None
+    received_at: float
+
+    def callback_data(self) -> list[str]:
+        if not self.reply_markup:
+            return []
+        return [button['callback_data']
+                for row in self.reply_markup.get('inline_keyboard', [])
+                for button in row if 'callback_data' in button]
+
+    def find_button(self, action: str) -> str | None:
+        """Returns the callback data of the first button that triggers the given action."""
+        for data in self.callback_data():
+            payload = decode_callback_data(data)
+            if payload is not None and payload.action == action:
+                return data
+        return None
+
+    def has_action(self, action: str) -> bool:
+        return self.find_button(action) is not None
+
+    def as_message(self) -> dict:
+        return _message_json(self.chat_id, self.message_id, self.text, self.reply_markup, from_user=BOT_USER)
+
+
+def _message_json(chat_id, message_id: int, text: str, reply_markup: dict | None = None,
+                  from_user: dict | None = None) -> dict:
+    message = {
+        'message_id': message_id,
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private'},
+        'text': text,
+    }
+    if from_user is not None:
+        message['from'] = from_user
+    if reply_markup:
+        message['reply_markup'] = reply_markup
+    return message
+
+
+class ChatLog:
+    """Everything the bot sent to one chat, in order, with a way to wait for what comes next."""
+
+    def __init__(self):
+        self.events: list[BotEvent] = []
+        self.next_message_id = 1
+        self._changed = asyncio.Condition()
+
+    async def append(self, event: BotEvent):
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def wait_for(self, predicate, start: int = 0, timeout: float | None = None) -> tuple[int, BotEvent]:
+        """
+        Waits for the first event at or after index `start` that satisfies the predicate.
+        Returns its index and the event. Raises asyncio.TimeoutError if nothing matches in time.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        async with self._changed:
+            while True:
+                for index in range(start, len(self.events)):
+                    if predicate(self.events[index]):
+                        return index, self.events[index]
+                start = len(self.events)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise asyncio.TimeoutError
+                await asyncio.wait_for(self._changed.wait(), remaining)
+
+
+class FakeBotApi:
+    """
+    A local stand-in for the Telegram Bot API, served at /bot<token>/<method>.
+
+    It implements the methods the bot uses: getUpdates (long polling over updates pushed
+    by the load-test driver), sendMessage, editMessageText, deleteMessage and
+    answerCallbackQuery, plus getMe and the webhook calls made at startup; any other
+    method succeeds with True. Every request can be delayed (a base latency with jitter,
+    overridable per method) and a share of requests per method can be answered with an
+    error, to see how the bot behaves when Telegram is slow or failing.
+    """
+
+    def __init__(self, listen: str = '127.0.0.1', port: int = 8081, latency: float = 0.0,
+                 jitter: float = 0.0, method_latency: dict[str, float] | None = None,
+                 error_rates: dict[str, float] | None = None, error_code: int = 500):
+        """
+        :param latency: Base delay (seconds) before every response.
+        :param jitter: Maximum random delay (seconds) added on top of the latency.
+        :param method_latency: Per-method delay overriding the base latency, e.g. {'sendMessage': 0.2}.
+        :param error_rates: Per-method share (0..1) of requests answered with an error.
+        :param error_code: Error code of injected errors; 429 answers carry retry_after=1.
+        """
+        self.listen = listen
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.method_latency = method_latency or {}
+        self.error_rates = error_rates or {}
+        self.error_code = error_code
+
+        self.chats = defaultdict(ChatLog)
+        self.request_counts = defaultdict(int)
+        self.injected_errors = defaultdict(int)
+        self.polling_started = asyncio.Event()
+        self.last_request_at = time.monotonic()
+
+        self._pending_updates = deque()
+        self._new_updates = asyncio.Event()
+        self._next_update_id = 1
+        self._next_callback_id = 1
+        self._runner = None
+
+        self._methods = {
+            'getMe': self._get_me,
+            'getUpdates': self._get_updates,
+            'sendMessage': self._send_message,
+            'sendDocument': self._send_message,
+            'sendPhoto': self._send_message,
+            'editMessageText': self._edit_message,
+        }
+
+        self.app = web.Application()
+        self.app.router.add_route('*', '/bot{token}/{method}', self._handle)
+
+    @property
+    def base_url(self) -> str:
+        """Value for the bot's [Transport] BASE_URL."""
+        return f"http://{self.listen}:{self.port}/bot"
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        logger.info(f"Fake Bot API is listening on {self.base_url}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @property
+    def pending_count(self) -> int:
+        """Updates pushed but not yet confirmed by the bot."""
+        return len(self._pending_updates)
+
+    # --- Updates pushed by the driver ---
+
+    def push_update(self, update: dict) -> int:
+        """Queues an update for the bot's next getUpdates call and returns its update_id."""
+        update_id = self._next_update_id
+        self._next_update_id += 1
+        update['update_id'] = update_id
+        self._pending_updates.append(update)
+        self._new_updates.set()
+        return update_id
+
+    def push_message(self, user: dict, text: str) -> int:
+        chat = self.chats[user['id']]
+        message = _message_json(user['id'], chat.next_message_id, text, from_user=user)
+        chat.next_message_id += 1
+        if text.startswith('/'):
+            command = text.split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        return self.push_update({'message': message})
+
+    def push_callback_query(self, user: dict, event: BotEvent, data: str) -> int:
+        """Queues a press of the button with the given callback data on the message of `event`."""
+        callback_id = str(self._next_callback_id)
+        self._next_callback_id += 1
+        return self.push_update({'callback_query': {
+            'id': callback_id,
+            'from': user,
+            'chat_instance': str(event.chat_id),
+            'data': data,
+            'message': event.as_message(),
+        }})
+
+    # --- HTTP handling ---
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.request_counts[method] += 1
+        if method != 'getUpdates':
+            self.last_request_at = time.monotonic()
+        params = await self._read_params(request)
+
+        delay = self.method_latency.get(method, self.latency)
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if random.random() < self.error_rates.get(method, 0.0):
+            self.injected_errors[method] += 1
+            return self._error_response()
+
+        handler = self._methods.get(method)
+        result = await handler(params) if handler else True
+        return web.json_response({'ok': True, 'result': result})
+
+    def _error_response(self) -> web.Response:
+        body = {'ok': False, 'error_code': self.error_code, 'description': 'Injected error'}
+        if self.error_code == 429:
+            body['description'] = 'Too Many Requests: retry after 1'
+            body['parameters'] = {'retry_after': 1}
+        return web.json_response(body, status=self.error_code)
+
+    @staticmethod
+    async def _read_params(request: web.Request) -> dict:
+        """PTB posts form data with JSON-encoded values for non-string parameters."""
+        if request.content_type == 'application/json':
+            return await request.json()
+        form = await request.post()
+        params = {}
+        for name, value in form.items():
+            if isinstance(value, str):
+                params[name] = value
+            else:
+                params[name] = getattr(value, 'filename', None) or name
+        params.update({name: value for name, value in request.query.items() if name not in params})
+        return params
+
+    @staticmethod
+    def _chat_id(params: dict) -> int | str:
+        chat_id = str(params.get('chat_id', ''))
+        return int(chat_id) if chat_id.lstrip('-').isdigit() else chat_id
+
+    @staticmethod
+    def _reply_markup(params: dict) -> dict | None:
+        markup = params.get('reply_markup')
+        if isinstance(markup, str):
+            markup = json.loads(markup)
+        return markup or None
+
+    async def _get_me(self, params: dict) -> dict:
+        return BOT_USER
+
+    async def _get_updates(self, params: dict) -> list[dict]:
+        self.polling_started.set()
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 100))
+        timeout = float(params.get('timeout', 0))
+
+        # Updates below the offset have been confirmed by the bot.
+        while self._pending_updates and self._pending_updates[0]['update_id'] < offset:
+            self._pending_updates.popleft()
+        if not self._pending_updates and timeout > 0:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return [self._pending_updates[index] for index in range(min(limit, len(self._pending_updates)))]
+
+    async def _send_message(self, params: dict) -> dict:
+        chat_id = self._chat_id(params)
+        chat = self.chats[chat_id]
+        message_id = chat.next_message_id
+        chat.next_message_id += 1
+        text = params.get('text') or params.get('caption') or ''
+        event = BotEvent('sendMessage', chat_id, message_id, text, self._reply_markup(params), time.monotonic())
+        await chat.append(event)
+        return event.as_message()
+
+    async def _edit_message(self, params: dict) -> dict:
+        chat_id = self._chat_id(params)
+        message_id = int(params.get('message_id', 0))
+        event = BotEvent('editMessageText', chat_id, message_id, params.get('text', ''),
+                         self._reply_markup(params), time.monotonic())
+        await self.chats[chat_id].append(event)
+        return event.as_message()
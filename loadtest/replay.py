@@ -0,0 +1,237 @@
+# loadtest/replay.py
+"""
+Replays captured production updates (see [Capture] in settings.ini) against a bot process
+that talks to the local Bot API stand-in, and reports how long every handler took.
+
+The updates are pushed in their captured order, either on the captured schedule (scaled
+by --speed) or as fast as the bot takes them (--speed 0). The bot runs in a scratch
+directory with its own settings.ini, logs and database; pass a copy of the production
+database taken when the capture started (--database) so request ids and profiles
+referenced by the updates exist. Handler timings are read from the bot's metrics endpoint
+after the replay, so two runs (e.g. before and after a change) can be compared directly.
+
+Run from the repository root, e.g.:
+    python -m loadtest.replay capture/updates-20250101.jsonl.gz --speed 0
+    python -m loadtest.replay capture/*.jsonl.gz --speed 10 --database backup/SafePay_bot.db
+"""
+
+import os
+import re
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+
+import aiohttp
+
+from update_capture import read_capture
+from loadtest.driver import BotProcess, _parse_overrides
+from loadtest.fake_bot_api import FakeBotApi
+
+logger = logging.getLogger(__name__)
+
+HANDLER_METRIC = 'bot_handler_duration_seconds'
+_SAMPLE_RE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+_LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def load_captures(paths: list[str]) -> tuple[list[int], list[tuple[float, dict]]]:
+    """Returns the admin ids recorded in the headers and the (timestamp, update) pairs of all files."""
+    admin_ids = set()
+    updates = []
+    for path in paths:
+        for header, timestamp, update in read_capture(path):
+            admin_ids.update(header.get('admin_ids', ()))
+            updates.append((timestamp, update))
+    updates.sort(key=lambda item: item[0])
+    return sorted(admin_ids), updates
+
+
+class HandlerTiming:
+    """Handler latency reconstructed from the histogram series of one handler."""
+
+    def __init__(self):
+        self.buckets = []  # (upper bound, cumulative count)
+        self.total = 0.0
+        self.count = 0
+
+    def quantile(self, q: float) -> float:
+        """Estimates a quantile as the upper bound of the bucket it falls into."""
+        rank = q * self.count
+        for bound, cumulative in sorted(self.buckets):
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+
+def parse_handler_timings(text: str) -> dict[tuple[str, str, str], HandlerTiming]:
+    """Extracts the handler latency histogram from the text exposition format."""
+    timings = {}
+    for line in text.splitlines():
+        match = _SAMPLE_RE.match(line)
+        if match is None or not match.group(1).startswith(HANDLER_METRIC):
+            continue
+        labels = {name: value.replace('\\"', '"').replace('\\\\', '\\')
+                  for name, value in _LABEL_RE.findall(match.group(2))}
+        key = (labels.get('conversation', ''), labels.get('state', ''), labels.get('callback', ''))
+        timing = timings.setdefault(key, HandlerTiming())
+        suffix = match.group(1)[len(HANDLER_METRIC):]
+        value = float(match.group(3))
+        if suffix == '_bucket':
+            timing.buckets.append((float(labels['le']), value))
+        elif suffix == '_sum':
+            timing.total = value
+        elif suffix == '_count':
+            timing.count = int(value)
+    return timings
+
+
+class Replay:
+    """Pushes the captured updates into the stand-in on the captured schedule."""
+
+    def __init__(self, api: FakeBotApi, updates: list[tuple[float, dict]], speed: float, max_gap: float):
+        self.api = api
+        self.updates = updates
+        self.speed = speed
+        self.max_gap = max_gap
+        self.duration = 0.0
+        self.behind = 0.0  # Largest delay behind the schedule, seconds.
+
+    @property
+    def captured_duration(self) -> float:
+        if not self.updates:
+            return 0.0
+        return self.updates[-1][0] - self.updates[0][0]
+
+    async def run(self, settle: float, drain_timeout: float):
+        started = time.monotonic()
+        offset = 0.0  # Position on the (gap-limited) capture timeline.
+        previous = self.updates[0][0] if self.updates else 0.0
+        for timestamp, update in self.updates:
+            offset += min(timestamp - previous, self.max_gap)
+            previous = timestamp
+            if self.speed > 0:
+                delay = started + offset / self.speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.behind = max(self.behind, -delay)
+            elif self.api.pending_count >= 100:
+                # As fast as possible, but without piling everything into the stand-in at once.
+                while self.api.pending_count >= 50:
+                    await asyncio.sleep(0.001)
+            self.api.push_update(update)
+        await self._drain(settle, drain_timeout)
+        self.duration = time.monotonic() - started - settle
+
+    async def _drain(self, settle: float, timeout: float):
+        """Waits until the bot has taken every update and stopped calling the API."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.api.pending_count == 0 and time.monotonic() - self.api.last_request_at >= settle:
+                return
+            await asyncio.sleep(0.1)
+        logger.warning(f"The bot did not settle within {timeout} s; "
+                       f"{self.api.pending_count} updates are still pending.")
+
+
+def report(replay: Replay, api: FakeBotApi, timings: dict) -> str:
+    captured = replay.captured_duration
+    count = len(replay.updates)
+    lines = [
+        f"Updates: {count}, captured over {captured:.1f} s "
+        f"({count / captured if captured else 0:.1f} updates/s)",
+        f"Replayed in {replay.duration:.1f} s ({count / replay.duration if replay.duration > 0 else 0:.1f} updates/s)"
+        + (f", at most {replay.behind:.2f} s behind schedule" if replay.speed > 0 else ""),
+    ]
+    rows = [(' / '.join(part for part in key if part), timing)
+            for key, timing in sorted(timings.items(), key=lambda item: -item[1].total) if timing.count]
+    width = max([len(name) for name, _ in rows] + [len('handler')]) + 2
+    lines.append("")
+    lines.append(f"{'handler':<{width}}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'total s':>10}")
+    for name, timing in rows:
+        lines.append(f"{name:<{width}}{timing.count:>8}{timing.total / timing.count * 1000:>10.2f}"
+                     f"{timing.quantile(0.5) * 1000:>10.1f}{timing.quantile(0.99) * 1000:>10.1f}"
+                     f"{timing.total:>10.2f}")
+    lines.append("")
+    lines.append("Bot API requests: " + ", ".join(
+        f"{method} {count}" for method, count in sorted(api.request_counts.items())))
+    return "\n".join(lines)
+
+
+async def _fetch_metrics(port: int) -> str:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+            response.raise_for_status()
+            return await response.text()
+
+
+async def _main(args):
+    admin_ids, updates = load_captures(args.captures)
+    if not updates:
+        raise SystemExit("The capture files contain no updates.")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='exchange_bot_replay_')
+    os.makedirs(workdir, exist_ok=True)
+    if os.path.exists(os.path.join(workdir, 'database')):
+        raise SystemExit(f"{workdir} already contains a database; use an empty directory.")
+    if args.database:
+        os.makedirs(os.path.join(workdir, 'database'))
+        shutil.copyfile(args.database, os.path.join(workdir, 'database', 'SafePay_bot.db'))
+
+    api = FakeBotApi(port=args.port, latency=args.latency)
+    await api.start()
+    overrides = _parse_overrides(args.bot_setting)
+    overrides.setdefault(('Logging', 'LEVEL'), args.bot_log_level)
+    overrides[('Metrics', 'ENABLED')] = 'True'
+    overrides[('Metrics', 'LISTEN')] = '127.0.0.1'
+    overrides[('Metrics', 'PORT')] = str(args.metrics_port)
+    bot = BotProcess(workdir, api.base_url, admin_ids or [1], overrides)
+    replay = Replay(api, updates, speed=args.speed, max_gap=args.max_gap)
+
+    print(f"Working directory: {workdir}")
+    await bot.start()
+    try:
+        try:
+            await asyncio.wait_for(api.polling_started.wait(), args.startup_timeout)
+        except asyncio.TimeoutError:
+            raise SystemExit(f"The bot did not start polling; see {workdir}/bot.stderr and {workdir}/log.")
+        speed = f"{args.speed}x" if args.speed > 0 else "as fast as possible"
+        print(f"Bot is polling. Replaying {len(updates)} updates ({speed})...")
+        await replay.run(args.settle, args.drain_timeout)
+        metrics = await _fetch_metrics(args.metrics_port)
+    finally:
+        await bot.stop()
+        await api.stop()
+    print(report(replay, api, parse_handler_timings(metrics)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('captures', nargs='+', help="capture files written by the bot")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="replay speed relative to the capture; 0 replays as fast as possible")
+    parser.add_argument('--max-gap', type=float, default=60.0,
+                        help="idle periods longer than this many captured seconds are shortened to it")
+    parser.add_argument('--database', help="database to copy into the scratch directory before the replay")
+    parser.add_argument('--port', type=int, default=8081, help="port of the Bot API stand-in")
+    parser.add_argument('--latency', type=float, default=0.0, help="Bot API response delay, seconds")
+    parser.add_argument('--metrics-port', type=int, default=9109, help="port of the bot's metrics endpoint")
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help="seconds without Bot API calls after which the replay counts as finished")
+    parser.add_argument('--drain-timeout', type=float, default=300.0)
+    parser.add_argument('--bot-setting', action='append', default=[], metavar='SECTION.OPTION=VALUE',
+                        help="extra settings.ini value for the bot, e.g. Persistence.ENABLED=False")
+    parser.add_argument('--bot-log-level', default='WARNING', help="log level of the bot process")
+    parser.add_argument('--startup-timeout', type=float, default=30.0)
+    parser.add_argument('--workdir', help="scratch directory for the bot (default: a new temporary directory)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(_main(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+# logging_setup.py
+
+import os
+import re
+import sys
+import json
+import queue
+import random
+import logging
+import contextvars
+import logging.handlers
+from datetime import datetime, timezone
+
+from telegram import Update
+from telegram.ext import TypeHandler, ContextTypes
+
+from callback_router import decode_callback_data, REQUEST_ID_ACTIONS
+
+TEXT_FORMAT = '%(asctime)s - %(name)-29s - %(levelname)-8s - %(message)s'
+
+_current_user_id = contextvars.ContextVar('log_user_id', default=None)
+_current_request_id = contextvars.ContextVar('log_request_id', default=None)
+
+# Card numbers (13-19 digits, optionally grouped) and IBANs.
+_CARD_NUMBER_RE = re.compile(r'\b(?:\d[ -]?){12,18}\d\b')
+_IBAN_RE = re.compile(r'\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]){10,30}\b')
+
+
+def _passes_luhn(digits: str) -> bool:
+    total = 0
+    for index, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if index % 2:
+            value = value * 2 - 9 if value > 4 else value * 2
+        total += value
+    return total % 10 == 0
+
+
+def _mask_card_number(match: re.Match) -> str:
+    value = match.group(0)
+    # Only Luhn-valid numbers are cards; this keeps e.g. channel ids readable.
+    if not _passes_luhn(re.sub(r'[ -]', '', value)):
+        return value
+    return f"***{value[-4:]}"
+
+
+def _mask_iban(match: re.Match) -> str:
+    return f"***{match.group(0)[-4:]}"
+
+
+def redact(text: str) -> str:
+    """Masks card numbers and IBANs, keeping only their last four characters."""
+    return _IBAN_RE.sub(_mask_iban, _CARD_NUMBER_RE.sub(_mask_card_number, text))
+
+
+def bind_log_context(user_id: int | None = None, request_id: int | None = None):
+    """
+    Attaches user_id / request_id to every record logged by the current update.
+    PTB handles an update within a single task, so the values do not leak into other updates.
+    """
+    if user_id is not None:
+        _current_user_id.set(user_id)
+    if request_id is not None:
+        _current_request_id.set(request_id)
+
+
+async def _bind_update_context(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    _current_user_id.set(update.effective_user.id if update.effective_user else None)
+    request_id = None
+    if update.callback_query and update.callback_query.data:
+        payload = decode_callback_data(update.callback_query.data)
+        if payload is not None and payload.action in REQUEST_ID_ACTIONS:
+            request_id = payload.request_id
+    _current_request_id.set(request_id)
+
+
+class ContextFilter(logging.Filter):
+    """Copies the bound log context onto the record. Runs in the thread that logs."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.user_id = _current_user_id.get()
+        record.request_id = _current_request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Drops a share of records below WARNING for noisy modules.
+    Rates are configured per logger name prefix; the longest matching prefix wins.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._rates = {}
+        self._resolved = {}
+
+    def configure(self, rates: dict[str, float]):
+        self._rates = dict(rates)
+        self._resolved = {}
+
+    def _rate_for(self, name: str) -> float:
+        try:
+            return self._resolved[name]
+        except KeyError:
+            pass
+        rate = 1.0
+        best_length = -1
+        for prefix, prefix_rate in self._rates.items():
+            if (name == prefix or name.startswith(prefix + '.')) and len(prefix) > best_length:
+                rate, best_length = prefix_rate, len(prefix)
+        self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self._rates:
+            return True
+        rate = self._rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on the queue without formatting them.
+    The default QueueHandler merges the message and formats tracebacks in the logging thread;
+    here that happens in the listener thread. Records never leave the process, so the
+    arguments do not have to be made picklable.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class RedactingFormatter(logging.Formatter):
+    """The regular text format with card numbers and IBANs masked."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return redact(super().format(record))
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': redact(record.getMessage()),
+            'user_id': getattr(record, 'user_id', None),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        if record.exc_info:
+            entry['exc_info'] = redact(self.formatException(record.exc_info))
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class LoggingPipeline:
+    """
+    Routes all log records through a queue to a listener thread that does the formatting
+    and the file and console I/O, so logging never blocks the event loop.
+
+    start() installs the pipeline with default settings, so that records logged while the
+    configuration is loaded are not lost; apply_config() then applies the [Logging] section.
+    """
+
+    LOG_CONTEXT_HANDLER_GROUP = -101
+
+    def __init__(self, log_dir: str = 'log'):
+        self.log_dir = log_dir
+        self._queue = queue.SimpleQueue()
+        self._queue_handler = LazyQueueHandler(self._queue)
+        self._queue_handler.addFilter(ContextFilter())
+        self._sampling_filter = SamplingFilter()
+        self._queue_handler.addFilter(self._sampling_filter)
+        self._listener = None
+        self._configured_levels = {}
+
+    @property
+    def queue_size(self) -> int:
+        """Number of records waiting to be written by the listener thread."""
+        return self._queue.qsize()
+
+    def _build_handlers(self, rotation: str = 'size', max_bytes: int = 10 * 1024 * 1024,
+                        backup_count: int = 5, when: str = 'midnight', json_enabled: bool = True) -> list:
+        os.makedirs(self.log_dir, exist_ok=True)
+
+        def file_handler(filename: str):
+            path = os.path.join(self.log_dir, filename)
+            if rotation == 'time':
+                return logging.handlers.TimedRotatingFileHandler(
+                    path, when=when, backupCount=backup_count, encoding='utf-8')
+            return logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+
+        text_formatter = RedactingFormatter(TEXT_FORMAT)
+        text_file = file_handler('bot.log')
+        text_file.setFormatter(text_formatter)
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(text_formatter)
+        handlers = [text_file, console]
+
+        if json_enabled:
+            json_file = file_handler('bot.jsonl')
+            json_file.setFormatter(JsonFormatter())
+            handlers.append(json_file)
+        return handlers
+
+    def start(self, level: int = logging.INFO):
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self._queue_handler)
+        root.setLevel(level)
+
+        self._listener = logging.handlers.QueueListener(
+            self._queue, *self._build_handlers(), respect_handler_level=True)
+        self._listener.start()
+
+    def apply_config(self, config):
+        """Applies levels, sampling and rotation settings from the [Logging] section."""
+        logging.getLogger().setLevel(config.logging_level)
+
+        # Restore loggers that were configured before and are no longer listed.
+        module_levels = config.logging_module_levels
+        for name in self._configured_levels.keys() - module_levels.keys():
+            logging.getLogger(name).setLevel(logging.NOTSET)
+        for name, level in module_levels.items():
+            logging.getLogger(name).setLevel(level)
+        self._configured_levels = module_levels
+
+        self._sampling_filter.configure(config.logging_sampling)
+
+        handlers = self._build_handlers(
+            rotation=config.logging_rotation,
+            max_bytes=config.logging_max_bytes,
+            backup_count=config.logging_backup_count,
+            when=config.logging_rotation_when,
+            json_enabled=config.logging_json_enabled
+        )
+        # Swap the handlers between two listener runs; stop() drains the queue first.
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener.handlers = tuple(handlers)
+        self._listener.start()
+
+    def stop(self):
+        """Flushes all queued records and closes the handlers."""
+        if self._listener is None:
+            return
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
+
+    def setup_handlers(self, application):
+        """Registers a handler that binds the log context of each update before any other handler runs."""
+        application.add_handler(TypeHandler(Update, _bind_update_context), group=self.LOG_CONTEXT_HANDLER_GROUP)
+
@@ -0,0 +1,176 @@
+# loop_watchdog.py
+
+import os
+import sys
+import html
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+
+from percentiles import percentile
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+# Frames of the watchdog itself and of the metrics wrappers say nothing about the blocking code.
+_IGNORED_FILES = {os.path.abspath(__file__), os.path.join(PROJECT_ROOT, 'metrics.py')}
+
+
+class _Offender:
+    __slots__ = ('count', 'max_blocked', 'stack')
+
+    def __init__(self, stack: list[str]):
+        self.count = 0
+        self.max_blocked = 0.0
+        self.stack = stack
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes up a coroutine that sleeps for a fixed interval.
+
+    A watcher thread checks the heartbeat written by that coroutine. When the loop has not
+    reached it for longer than the threshold, something is blocking the loop thread; the
+    watcher then captures the loop thread's current stack, so the blocking call (e.g. a
+    DatabaseManager method called from a handler) is recorded while it is still running.
+    Stalls are aggregated by the innermost frames of the bot's own code.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25, report_interval: float = 300,
+                 max_samples: int = 5000, on_sample=None):
+        self.interval = interval
+        self.threshold = threshold
+        self.report_interval = report_interval
+        self._on_sample = on_sample
+
+        self._samples = deque(maxlen=max_samples)
+        self._offenders = {}
+        self._lock = threading.Lock()
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id = None
+        self._current_stall = None
+
+        self._task = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """Starts measuring. Must be called from the event loop thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self._measure_loop())
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+        logger.info(f"[System] - Event loop watchdog started (threshold: {self.threshold * 1000:.0f} ms).")
+
+    async def stop(self):
+        self._stop_event.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+
+    async def _measure_loop(self):
+        next_report = time.monotonic() + self.report_interval
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - expected)
+            self._samples.append(lag)
+            if self._on_sample:
+                self._on_sample(lag)
+            if now >= next_report:
+                next_report = now + self.report_interval
+                self._log_report()
+
+    def _watch(self):
+        """Runs in the watcher thread."""
+        while not self._stop_event.wait(self.interval / 2):
+            blocked_for = time.monotonic() - self._heartbeat - self.interval
+            if blocked_for < self.threshold:
+                self._current_stall = None
+                continue
+
+            if self._current_stall is None:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = traceback.extract_stack(frame) if frame is not None else []
+                del frame
+                key, lines = self._describe(stack)
+                with self._lock:
+                    offender = self._offenders.get(key)
+                    if offender is None:
+                        offender = self._offenders[key] = _Offender(lines)
+                    offender.count += 1
+                self._current_stall = offender
+                logger.warning(
+                    f"[System] - Event loop blocked for over {blocked_for * 1000:.0f} ms in {key}:\n" + "\n".join(lines))
+
+            with self._lock:
+                self._current_stall.max_blocked = max(self._current_stall.max_blocked, blocked_for)
+
+    @staticmethod
+    def _describe(stack: traceback.StackSummary) -> tuple[str, list[str]]:
+        """Returns an aggregation key made of the innermost project frames and a readable stack."""
+        project_frames = [frame for frame in stack
+                          if frame.filename.startswith(PROJECT_ROOT + os.sep) and frame.filename not in _IGNORED_FILES]
+        frames = project_frames or list(stack)[-1:]
+        key = " ← ".join(f"{os.path.basename(frame.filename)}:{frame.name}" for frame in reversed(frames[-2:]))
+        lines = [f"  {os.path.relpath(frame.filename, PROJECT_ROOT)}:{frame.lineno} in {frame.name}"
+                 for frame in frames[-8:]]
+        if stack and project_frames and stack[-1] is not project_frames[-1]:
+            innermost = stack[-1]
+            lines.append(f"  ... {os.path.basename(innermost.filename)}:{innermost.lineno} in {innermost.name}")
+        return key or "<unknown>", lines
+
+    def percentiles(self) -> dict:
+        ordered = sorted(self._samples)
+        return {
+            'samples': len(ordered),
+            'p50_ms': percentile(ordered, 50) * 1000,
+            'p95_ms': percentile(ordered, 95) * 1000,
+            'p99_ms': percentile(ordered, 99) * 1000,
+            'max_ms': (ordered[-1] * 1000) if ordered else 0.0,
+        }
+
+    def top_offenders(self, limit: int = 5) -> list[tuple[str, int, float]]:
+        """Returns (key, stall count, longest stall in seconds), worst first."""
+        with self._lock:
+            rows = [(key, offender.count, offender.max_blocked) for key, offender in self._offenders.items()]
+        return sorted(rows, key=lambda row: (row[2], row[1]), reverse=True)[:limit]
+
+    def _log_report(self):
+        stats = self.percentiles()
+        offenders = "; ".join(f"{key} ×{count} (max {blocked * 1000:.0f} ms)"
+                              for key, count, blocked in self.top_offenders(3))
+        logger.info(
+            f"[System] - Event loop lag: p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms, "
+            f"p99 {stats['p99_ms']:.1f} ms, max {stats['max_ms']:.1f} ms. Top offenders: {offenders or 'none'}.")
+
+    def summary_text(self) -> str:
+        """Formats lag percentiles and the top offenders as a short HTML block for the admin panel."""
+        stats = self.percentiles()
+        lines = [
+            f"⏱ Задержка цикла: p50 {stats['p50_ms']:.1f} мс, p95 {stats['p95_ms']:.1f} мс, "
+            f"p99 {stats['p99_ms']:.1f} мс, макс. {stats['max_ms']:.0f} мс",
+            f"🚧 Порог блокировки: {self.threshold * 1000:.0f} мс",
+        ]
+        offenders = self.top_offenders()
+        if offenders:
+            lines.append("\n<b>Что блокировало цикл:</b>")
+            for key, count, blocked in offenders:
+                lines.append(f"• <code>{html.escape(key)}</code>: {count} раз, до {blocked * 1000:.0f} мс")
+        else:
+            lines.append("Блокировок не обнаружено.")
+        return "\n".join(lines)
@@ -1,28 +1,41 @@
 import os
 import sys
+import signal
+import asyncio
 import logging
 import warnings
 
 from telegram.ext import ApplicationBuilder
 
-from config_manager import ConfigManager
+from config_manager import ConfigManager, ConfigWatcher
 from database_manager import DatabaseManager
 from handlers.admin_handler import AdminPanelHandler
 from handlers.exchange_handler import ExchangeHandler
 from handlers.user_cabinet_handler import UserCabinetHandler
 from handlers.referral_handler import ReferralHandler
+from webhook_server import WebhookServer
+from http_transport import TransportStats, build_request
+from sqlite_persistence import SQLitePersistence
+from shared_settings import SharedSettingsStore
+from rate_engine import RateEngine, build_providers
+from notification_queue import NotificationQueue
+from request_expiry import RequestExpiry
+from sla_monitor import SlaMonitor
+from user_state_manager import UserStateManager
+from template_registry import TemplateRegistry
+from callback_router import CallbackRouter, decode_callback_data
+from metrics import MetricsRegistry, MetricsServer
+from loop_watchdog import LoopLagMonitor
+from profiler import ProfilerCapture
+from memory_diagnostics import MemoryDiagnostics
+from logging_setup import LoggingPipeline
+from update_capture import UpdateCapture
 
 os.makedirs("log", exist_ok=True)
 os.makedirs("database", exist_ok=True)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)-29s - %(levelname)-8s - %(message)s',
-    handlers=[
-        logging.FileHandler("log/bot.log", encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+logging_pipeline = LoggingPipeline(log_dir="log")
+logging_pipeline.start()
 logger = logging.getLogger(__name__)
 logging.getLogger("httpx").setLevel(logging.WARNING)
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -39,12 +52,115 @@ class Bot:
 
         self.config = ConfigManager()
         self.config.load()
+        logging_pipeline.apply_config(self.config)
+
+        self.templates = TemplateRegistry()
+        self.config.add_change_listener(self.templates.on_config_changed)
+        self.config.add_change_listener(self._on_config_changed)
+        self.config_watcher = None
+        if self.config.reload_interval > 0:
+            self.config_watcher = ConfigWatcher(self.config, self.config.reload_interval)
+        self.callback_router = CallbackRouter()
+        self.metrics = MetricsRegistry()
+        self.metrics_server = None
+        self._services_started = False
+        self.profiler = ProfilerCapture(self.metrics)
 
         self.db = DatabaseManager()
         self.db.connect()
         self.db.setup_database()
+        self.metrics.instrument_database(self.db)
+
+        self.shared_settings = None
+        if self.config.shared_settings_enabled:
+            self.shared_settings = SharedSettingsStore(
+                self.db, self.config, self.config.shared_settings_poll_interval)
+            self.shared_settings.attach()
+
+        self.transport_stats = TransportStats()
+        self.transport_stats.add_request_listener(self.metrics.observe_bot_api)
+        builder = (
+            ApplicationBuilder()
+            .token(self.config.token)
+            .request(build_request(self.config, self.transport_stats, 'requests',
+                                   self.config.transport_pool_size))
+            .get_updates_request(build_request(self.config, self.transport_stats, 'get_updates',
+                                               self.config.transport_get_updates_pool_size))
+        )
+        if self.config.transport_base_url:
+            builder = builder.base_url(self.config.transport_base_url)
+        if self.config.webhook_enabled:
+            # A bounded queue lets the webhook server apply backpressure instead of buffering forever.
+            builder = builder.update_queue(asyncio.Queue(maxsize=self.config.webhook_queue_size))
+
+        self.persistence = None
+        if self.config.persistence_enabled:
+            self.persistence = SQLitePersistence(
+                self.db.db_path, update_interval=self.config.persistence_update_interval)
+            builder = builder.persistence(self.persistence)
+        builder = builder.post_init(self._post_init).post_stop(self._post_stop).post_shutdown(self._post_shutdown)
+        self.application = builder.build()
+        self._register_metrics()
+
+        self.loop_monitor = None
+        if self.config.watchdog_enabled:
+            self.loop_monitor = LoopLagMonitor(
+                interval=self.config.watchdog_interval,
+                threshold=self.config.watchdog_threshold,
+                report_interval=self.config.watchdog_report_interval,
+                on_sample=self.metrics.observe_loop_lag
+            )
+
+        self.user_state_manager = UserStateManager(
+            self.application,
+            ttl_seconds=self.config.user_state_ttl_seconds,
+            max_users=self.config.user_state_max_users,
+            sweep_interval=self.config.user_state_sweep_interval
+        )
+        self.memory_diagnostics = MemoryDiagnostics(self.user_state_manager, logging_pipeline)
+
+        self.update_capture = None
+        if self.config.capture_enabled:
+            self.update_capture = UpdateCapture(
+                self.config.capture_path,
+                anonymize=self.config.capture_anonymize,
+                admin_ids=self.config.admin_ids,
+                sensitive_states={
+                    'exchange_conversation': ExchangeHandler.REQUISITE_STATES,
+                    'cabinet_conversation': UserCabinetHandler.REQUISITE_STATES,
+                }
+            )
 
-        self.application = ApplicationBuilder().token(self.config.token).build()
+        self.rate_engine = RateEngine(
+            self.config,
+            build_providers(self.config),
+            refresh_interval=self.config.rates_refresh_interval,
+            max_age=self.config.rates_max_age,
+            margin_percent=self.config.rates_margin_percent,
+            spread=self.config.rates_spread,
+            decimals=self.config.rates_decimals
+        )
+        self.rate_engine.add_change_listener(self._record_rate_change)
+
+        self.notifications = NotificationQueue(self.config.notifications_rate)
+        self.request_expiry = None
+        if self.config.expiry_enabled:
+            self.request_expiry = RequestExpiry(
+                self,
+                self.notifications,
+                interval=self.config.expiry_interval,
+                timeouts=self.config.expiry_timeouts,
+                batch_size=self.config.expiry_batch_size
+            )
+        self.sla_monitor = None
+        if self.config.sla_enabled:
+            self.sla_monitor = SlaMonitor(
+                self,
+                self.notifications,
+                limits=self.config.sla_limits,
+                check_interval=self.config.sla_check_interval
+            )
+            self.db.add_status_listener(self.sla_monitor.on_status_changed)
 
         self.admin_handler = AdminPanelHandler(self)
         self.exchange_handler = ExchangeHandler(self)
@@ -57,20 +173,168 @@ class Bot:
         """
         self.admin_handler.setup_handlers(self.application)
         self.exchange_handler.setup_handlers(self.application)
+        self.callback_router.setup_handlers(self.application)
         self.user_cabinet_handler.setup_handlers(self.application)
         self.referral_handler.setup_handlers(self.application)
+        self.user_state_manager.setup_handlers(self.application)
+        logging_pipeline.setup_handlers(self.application)
+        if self.update_capture is not None:
+            self.update_capture.setup_handlers(self.application)
+        self.metrics.instrument_application(self.application, self.callback_router)
         logger.info("[System] - Handlers have been successfully set up.")
 
+    def _register_metrics(self):
+        """Registers the queues and caches whose state is exported with the metrics."""
+        self.metrics.register_queue('updates', lambda: self.application.update_queue.qsize())
+        self.metrics.register_queue('logging', lambda: logging_pipeline.queue_size)
+        if self.persistence is not None:
+            self.metrics.register_queue('persistence', lambda: self.persistence.pending_count)
+        self.metrics.register_queue('notifications', lambda: self.notifications.pending_count)
+        self.metrics.register_cache('templates', lambda: (self.templates.hits, self.templates.misses))
+        self.metrics.register_cache('callback_data', lambda: (
+            decode_callback_data.cache_info().hits, decode_callback_data.cache_info().misses))
+
+    def _record_rate_change(self):
+        """Keeps the rate history complete when the rate engine switches quotes or falls back."""
+        quote = self.rate_engine.fresh_quote()
+        if quote is not None:
+            self.db.record_rate(quote.rate, quote.source, quote.market_rate)
+        else:
+            self.db.record_rate(self.config.exchange_rate, 'manual')
+
+    def _on_config_changed(self, section, option):
+        """Applies changed logging settings; other startup-only settings need a restart."""
+        if section == 'Logging':
+            logging_pipeline.apply_config(self.config)
+
+    async def _post_init(self, application):
+        """Starts background services once the application is initialized."""
+        self._services_started = True
+        self.user_state_manager.start()
+        if self.config_watcher is not None:
+            self.config_watcher.start()
+        if self.shared_settings is not None:
+            self.shared_settings.start()
+        self.rate_engine.start()
+        self.notifications.start()
+        if self.request_expiry is not None:
+            self.request_expiry.start()
+        if self.sla_monitor is not None:
+            self.sla_monitor.start()
+        if self.update_capture is not None:
+            self.update_capture.start()
+        if self.loop_monitor is not None:
+            self.loop_monitor.start()
+        if self.config.metrics_enabled:
+            self.metrics_server = MetricsServer(
+                self.metrics, listen=self.config.metrics_listen, port=self.config.metrics_port)
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                logger.error(f"[System] - Failed to start the metrics endpoint: {e}")
+                self.metrics_server = None
+
+    async def _post_stop(self, application):
+        """Stops background services before the application shuts down."""
+        if not self._services_started:
+            return
+        self._services_started = False
+        await self.user_state_manager.stop()
+        if self.config_watcher is not None:
+            await self.config_watcher.stop()
+        if self.shared_settings is not None:
+            await self.shared_settings.stop()
+        await self.rate_engine.stop()
+        if self.request_expiry is not None:
+            await self.request_expiry.stop()
+        if self.sla_monitor is not None:
+            await self.sla_monitor.stop()
+        await self.notifications.stop()
+        await self.config.flush()
+        if self.loop_monitor is not None:
+            await self.loop_monitor.stop()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        if self.update_capture is not None:
+            self.update_capture.stop()
+
+    async def _post_shutdown(self, application):
+        """
+        Stops the background services if post_stop did not run, which the application skips
+        when it never started (e.g. because starting the updater or the webhook failed).
+        """
+        await self._post_stop(application)
+
     def run(self):
         """
         Starts the bot.
         """
         try:
+            if self.config.webhook_enabled and not self.config.webhook_secret_token:
+                # Without the secret anyone who can reach the port could post forged updates.
+                logger.critical("[System] - Webhook mode requires [Webhook] SECRET_TOKEN; refusing to start.")
+                sys.exit(1)
             self.setup_handlers()
             logger.info("[System] - Bot is running and ready to work...")
-            self.application.run_polling()
+            if self.config.webhook_enabled:
+                asyncio.run(self._run_webhook())
+            else:
+                self.application.run_polling(allowed_updates=self.config.allowed_updates)
         finally:
             self.db.close()
+            logging_pipeline.stop()
+
+    async def _run_webhook(self):
+        """
+        Runs the application with the embedded webhook server instead of long polling.
+        Mirrors the lifecycle of Application.run_polling(), including the post_* hooks.
+        """
+        application = self.application
+        server = WebhookServer(
+            application,
+            listen=self.config.webhook_listen,
+            port=self.config.webhook_port,
+            path=self.config.webhook_path,
+            secret_token=self.config.webhook_secret_token
+        )
+
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                # Signal handlers are not supported on Windows event loops.
+                pass
+
+        await application.initialize()
+        try:
+            if application.post_init:
+                await application.post_init(application)
+            await application.start()
+            await server.start()
+
+            if self.config.webhook_url:
+                await application.bot.set_webhook(
+                    url=self.config.webhook_url,
+                    secret_token=self.config.webhook_secret_token,
+                    allowed_updates=self.config.allowed_updates
+                )
+                logger.info(f"[System] - Webhook registered at {self.config.webhook_url}.")
+
+            logger.info("[System] - Bot is running in webhook mode.")
+            await stop_event.wait()
+        finally:
+            logger.info("[System] - Stopping the webhook server...")
+            await server.stop()
+            if application.running:
+                await application.stop()
+            # Unlike run_polling(), also after a failed start: post_init has started the background services.
+            if application.post_stop:
+                await application.post_stop(application)
+            await application.shutdown()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+# memory_diagnostics.py
+
+import io
+import os
+import html
+import asyncio
+import sysconfig
+import logging
+import tracemalloc
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+STDLIB_ROOT = sysconfig.get_paths()['stdlib']
+
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def _module_name(filename: str) -> str:
+    """Shortens a file path to a module-like name: relative to the bot, site-packages or the stdlib."""
+    if filename.startswith(PROJECT_ROOT + os.sep):
+        return os.path.relpath(filename, PROJECT_ROOT)
+    marker = f"site-packages{os.sep}"
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    if filename.startswith(STDLIB_ROOT + os.sep):
+        return os.path.join('stdlib', os.path.relpath(filename, STDLIB_ROOT))
+    return filename
+
+
+def _format_size(size: int) -> str:
+    sign = '-' if size < 0 else '+'
+    size = abs(size)
+    if size >= 1024 * 1024:
+        return f"{sign}{size / 1024 / 1024:.1f} MiB"
+    return f"{sign}{size / 1024:.1f} KiB"
+
+
+class MemoryDiagnostics:
+    """
+    Finds what makes the process grow by diffing tracemalloc snapshots against a baseline.
+
+    Tracing is started only on demand, because it slows down every allocation while active.
+    A baseline snapshot is taken when tracing starts (or on request); each diff attributes
+    the growth since then to modules and source lines and adds the number of tracked
+    conversations and user_data entries, which are the usual suspects.
+    """
+
+    TRACEBACK_FRAMES = 1
+    TOP_MODULES = 15
+    TOP_LINES = 25
+
+    def __init__(self, user_state_manager, logging_pipeline):
+        self.user_state_manager = user_state_manager
+        self.logging_pipeline = logging_pipeline
+        self._baseline = None
+        self._baseline_taken_at = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    @property
+    def baseline_taken_at(self) -> datetime | None:
+        return self._baseline_taken_at
+
+    @staticmethod
+    async def _take_snapshot() -> tracemalloc.Snapshot:
+        loop = asyncio.get_running_loop()
+        snapshot = await loop.run_in_executor(None, tracemalloc.take_snapshot)
+        return snapshot.filter_traces(_SNAPSHOT_FILTERS)
+
+    async def take_baseline(self):
+        """Starts tracing if needed and remembers the current allocations as the baseline."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.TRACEBACK_FRAMES)
+            logger.info("[System] - tracemalloc started.")
+        self._baseline = await self._take_snapshot()
+        self._baseline_taken_at = datetime.now()
+        logger.info("[System] - Memory baseline snapshot taken.")
+
+    def stop(self):
+        """Stops tracing and frees the baseline."""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("[System] - tracemalloc stopped.")
+        self._baseline = None
+        self._baseline_taken_at = None
+
+    async def diff_report(self) -> tuple[str, str]:
+        """
+        Diffs a new snapshot against the baseline.
+        Returns a short HTML summary for the admin panel and the full text report.
+        """
+        if self._baseline is None:
+            raise RuntimeError("No baseline snapshot has been taken.")
+        snapshot = await self._take_snapshot()
+        state = self.user_state_manager.stats()
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._build_report, self._baseline, snapshot, state)
+
+    def _build_report(self, baseline: tracemalloc.Snapshot, snapshot: tracemalloc.Snapshot,
+                      state: dict) -> tuple[str, str]:
+        by_file = snapshot.compare_to(baseline, 'filename')
+        by_line = snapshot.compare_to(baseline, 'lineno')
+        current, peak = tracemalloc.get_traced_memory()
+        total_diff = sum(stat.size_diff for stat in by_file)
+
+        module_growth = {}
+        for stat in by_file:
+            name = _module_name(stat.traceback[0].filename)
+            module_growth[name] = module_growth.get(name, 0) + stat.size_diff
+        top_modules = sorted(module_growth.items(), key=lambda item: item[1], reverse=True)[:self.TOP_MODULES]
+
+        out = io.StringIO()
+        out.write("Memory growth report\n")
+        out.write(f"Baseline: {self._baseline_taken_at:%Y-%m-%d %H:%M:%S}, now: {datetime.now():%Y-%m-%d %H:%M:%S}\n")
+        out.write(f"Traced memory: {current / 1024 / 1024:.1f} MiB (peak {peak / 1024 / 1024:.1f} MiB), "
+                  f"growth since baseline: {_format_size(total_diff)}\n\n")
+
+        out.write("Per-user state:\n")
+        out.write(f"  tracked users: {state['tracked_users']}\n")
+        out.write(f"  user_data: {state['user_data'][0]} entries, ~{state['user_data'][1] / 1024:.1f} KiB\n")
+        out.write(f"  chat_data: {state['chat_data'][0]} entries, ~{state['chat_data'][1] / 1024:.1f} KiB\n")
+        for name, (count, size) in state['conversations'].items():
+            out.write(f"  conversation {name}: {count} tracked, ~{size / 1024:.1f} KiB\n")
+        out.write(f"  log records waiting to be written: {self.logging_pipeline.queue_size}\n\n")
+
+        out.write(f"Growth by module (top {self.TOP_MODULES}):\n")
+        for name, size_diff in top_modules:
+            out.write(f"  {_format_size(size_diff):>12}  {name}\n")
+
+        out.write(f"\nGrowth by line (top {self.TOP_LINES}):\n")
+        for stat in by_line[:self.TOP_LINES]:
+            frame = stat.traceback[0]
+            out.write(f"  {_format_size(stat.size_diff):>12}  {stat.count_diff:+8d} blocks  "
+                      f"{_module_name(frame.filename)}:{frame.lineno}\n")
+
+        summary_lines = [
+            f"📦 Отслеживается: {current / 1024 / 1024:.1f} МБ (пик {peak / 1024 / 1024:.1f} МБ)",
+            f"📈 Рост с базового снимка: {_format_size(total_diff)}",
+            "",
+            "<b>Больше всего выросли:</b>",
+        ]
+        summary_lines += [f"• <code>{html.escape(name)}</code>: {_format_size(size_diff)}"
+                          for name, size_diff in top_modules[:5]]
+        return "\n".join(summary_lines), out.getvalue()
@@ -0,0 +1,331 @@
+# metrics.py
+
+import time
+import logging
+import functools
+from bisect import bisect_left
+
+from aiohttp import web
+from telegram.ext import ConversationHandler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_names: tuple, labels: tuple) -> str:
+    if not label_names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(label_names, labels)) + '}'
+
+
+class Histogram:
+    """
+    A labelled histogram with fixed buckets.
+    Observing a value is a bisect and three increments; buckets are made cumulative only when rendered.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts, sum, count, max]
+
+    def observe(self, labels: tuple, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0, 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+        if value > series[3]:
+            series[3] = value
+
+    def quantile(self, labels: tuple, q: float) -> float:
+        """Estimates a quantile as the upper bound of the bucket it falls into."""
+        counts, _, count, maximum = self._series[labels]
+        rank = q * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return min(bound, maximum)
+        return maximum
+
+    def totals(self) -> tuple[int, float]:
+        """Returns the number and the sum of all observations across all label sets."""
+        count = total = 0
+        for series in self._series.values():
+            count += series[2]
+            total += series[1]
+        return count, total
+
+    def series(self) -> dict:
+        """Returns {labels: (count, sum)}."""
+        return {labels: (series[2], series[1]) for labels, series in self._series.items()}
+
+    def render(self, lines: list):
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} histogram")
+        for labels, (counts, total, count, _) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.label_names + ('le',), labels + (bound,))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names + ('le',), labels + ('+Inf',))} {count}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+
+    def inc(self, labels: tuple, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, labels: tuple) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self, lines: list):
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} counter")
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+
+
+class CallbackMetric:
+    """A gauge or counter whose values are collected from a callable when the metrics are rendered."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, collect, metric_type: str = 'gauge'):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.metric_type = metric_type
+        self._collect = collect
+
+    def collect(self) -> list:
+        """Returns [(labels, value)]. A failing collector yields no samples."""
+        try:
+            return list(self._collect())
+        except Exception as e:
+            logger.warning(f"[System] - Failed to collect metric {self.name}: {e}")
+            return []
+
+    def render(self, lines: list):
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} {self.metric_type}")
+        for labels, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+
+
+class MetricsRegistry:
+    """
+    Collects handler, database and Bot API latencies, queue depths and cache hit rates,
+    and renders them in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self.handler_latency = Histogram(
+            'bot_handler_duration_seconds', 'Handler callback latency.', ('conversation', 'state', 'callback'))
+        self.handler_errors = Counter(
+            'bot_handler_errors_total', 'Handler callbacks that raised an exception.',
+            ('conversation', 'state', 'callback'))
+        self.db_latency = Histogram(
+            'bot_db_query_duration_seconds', 'DatabaseManager method latency.', ('method',))
+        self.bot_api_latency = Histogram(
+            'bot_api_request_duration_seconds', 'Bot API request latency.', ('method',),
+            buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+        self.bot_api_errors = Counter(
+            'bot_api_request_errors_total', 'Failed Bot API requests.', ('method',))
+        self.loop_lag = Histogram(
+            'bot_event_loop_lag_seconds', 'Event loop scheduling lag.', (),
+            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+        self.queue_depth = CallbackMetric(
+            'bot_queue_depth', 'Number of items waiting in internal queues.', ('queue',), self._collect_queues)
+        self.cache_hits = CallbackMetric(
+            'bot_cache_hits_total', 'Cache hits.', ('cache',), lambda: self._collect_caches(0), 'counter')
+        self.cache_misses = CallbackMetric(
+            'bot_cache_misses_total', 'Cache misses.', ('cache',), lambda: self._collect_caches(1), 'counter')
+
+        self._queues = {}
+        self._caches = {}
+        self._metrics = [self.handler_latency, self.handler_errors, self.db_latency, self.bot_api_latency,
+                         self.bot_api_errors, self.loop_lag, self.queue_depth, self.cache_hits, self.cache_misses]
+
+    def register_queue(self, name: str, depth):
+        """Registers a callable returning the current depth of a queue."""
+        self._queues[name] = depth
+
+    def register_cache(self, name: str, stats):
+        """Registers a callable returning the (hits, misses) counters of a cache."""
+        self._caches[name] = stats
+
+    def _collect_queues(self):
+        return [((name,), depth()) for name, depth in self._queues.items()]
+
+    def _collect_caches(self, index: int):
+        return [((name,), stats()[index]) for name, stats in self._caches.items()]
+
+    # --- Instrumentation ---
+
+    def _wrap_handler_callback(self, callback, labels: tuple):
+        @functools.wraps(callback)
+        async def timed(update, context):
+            started = time.perf_counter()
+            try:
+                return await callback(update, context)
+            except Exception:
+                self.handler_errors.inc(labels)
+                raise
+            finally:
+                self.handler_latency.observe(labels, time.perf_counter() - started)
+        return timed
+
+    @staticmethod
+    def _state_names(conversation: ConversationHandler) -> dict:
+        """Maps state numbers to the names of the constants they are defined as."""
+        names = {}
+        for handlers in conversation.states.values():
+            owner = getattr(handlers[0].callback, '__self__', None) if handlers else None
+            if owner is not None:
+                for attribute, value in vars(type(owner)).items():
+                    if attribute.isupper() and isinstance(value, int) and value in conversation.states:
+                        names.setdefault(value, attribute)
+        return names
+
+    def instrument_application(self, application, callback_router):
+        """
+        Wraps the callbacks of all registered handlers with latency measurement.
+        Must be called after all handlers are set up.
+        """
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                if isinstance(handler, ConversationHandler):
+                    name = handler.name or ''
+                    state_names = self._state_names(handler)
+                    for state_handler in handler.entry_points:
+                        self._instrument_handler(state_handler, name, 'entry')
+                    for state, state_handlers in handler.states.items():
+                        for state_handler in state_handlers:
+                            self._instrument_handler(state_handler, name, state_names.get(state, str(state)))
+                    for state_handler in handler.fallbacks:
+                        self._instrument_handler(state_handler, name, 'fallback')
+                elif handler.callback != callback_router.dispatch:
+                    self._instrument_handler(handler, '', '')
+
+        callback_router.wrap_routes(
+            lambda action, callback: self._wrap_handler_callback(callback, ('callback_router', '', action)))
+
+    def _instrument_handler(self, handler, conversation: str, state: str):
+        callback_name = getattr(handler.callback, '__name__', repr(handler.callback))
+        handler.callback = self._wrap_handler_callback(handler.callback, (conversation, state, callback_name))
+
+    def instrument_database(self, db, exclude: tuple = ('connect', 'close', 'setup_database', 'add_status_listener')):
+        """Replaces the public query methods of the DatabaseManager instance with timed wrappers."""
+        for name, attribute in vars(type(db)).items():
+            if name.startswith('_') or name in exclude or not callable(attribute):
+                continue
+            method = getattr(db, name)
+            setattr(db, name, self._wrap_db_method(method, (name,)))
+
+    def _wrap_db_method(self, method, labels: tuple):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.db_latency.observe(labels, time.perf_counter() - started)
+        return timed
+
+    def observe_loop_lag(self, seconds: float):
+        """LoopLagMonitor sample listener."""
+        self.loop_lag.observe((), seconds)
+
+    def observe_bot_api(self, api_method: str, seconds: float, ok: bool):
+        """TransportStats request listener."""
+        self.bot_api_latency.observe((api_method,), seconds)
+        if not ok:
+            self.bot_api_errors.inc((api_method,))
+
+    # --- Output ---
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            metric.render(lines)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _top_by_p95(histogram: Histogram, limit: int) -> list:
+        rows = [(histogram.quantile(labels, 0.95), labels, count)
+                for labels, (count, _) in histogram.series().items()]
+        return sorted(rows, reverse=True)[:limit]
+
+    def summary_text(self, limit: int = 5) -> str:
+        """Formats the slowest handlers, queries and Bot API methods, queues and caches for the admin panel."""
+        lines = ["⚙️ <b>Обработчики</b> (p95, самые медленные):"]
+        for p95, (conversation, state, callback), count in self._top_by_p95(self.handler_latency, limit):
+            where = f"{conversation}/{state}/" if conversation else ""
+            lines.append(f"• <code>{where}{callback}</code>: {p95 * 1000:.0f} мс ({count} шт.)")
+
+        lines.append("\n🗄 <b>База данных</b> (p95):")
+        for p95, (method,), count in self._top_by_p95(self.db_latency, limit):
+            lines.append(f"• <code>{method}</code>: {p95 * 1000:.1f} мс ({count} шт.)")
+
+        lines.append("\n📡 <b>Bot API</b> (p95):")
+        for p95, (method,), count in self._top_by_p95(self.bot_api_latency, limit):
+            errors = self.bot_api_errors.get((method,))
+            lines.append(f"• <code>{method}</code>: {p95 * 1000:.0f} мс ({count} шт., ошибок {errors})")
+
+        lines.append("\n📥 <b>Очереди:</b> " + ", ".join(
+            f"{labels[0]} {value}" for labels, value in self.queue_depth.collect()))
+
+        hits = dict(self.cache_hits.collect())
+        misses = dict(self.cache_misses.collect())
+        cache_parts = []
+        for labels, hit_count in hits.items():
+            total = hit_count + misses.get(labels, 0)
+            cache_parts.append(f"{labels[0]} {hit_count / total * 100:.0f}%" if total else f"{labels[0]} —")
+        lines.append("🎯 <b>Кэши:</b> " + ", ".join(cache_parts))
+        return "\n".join(lines)
+
+
+class MetricsServer:
+    """Serves the metrics on a local HTTP endpoint for Prometheus to scrape."""
+
+    def __init__(self, registry: MetricsRegistry, listen: str, port: int, path: str = '/metrics'):
+        self.registry = registry
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self._runner = None
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get(self.path, self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        logger.info(f"[System] - Metrics are served on http://{self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,67 @@
+# notification_queue.py
+
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationQueue:
+    """
+    Sends notifications produced in bulk (e.g. by background jobs) at a bounded rate, so a
+    burst of them does not run into Telegram's flood limits or crowd out the replies to users.
+
+    A notification is a coroutine function without arguments that sends one or more
+    messages; at most `rate` of them are started per second, one at a time. Notifications
+    still queued when the bot stops are dropped and counted in the log.
+    """
+
+    def __init__(self, rate: float, max_size: int = 10000):
+        self.rate = rate
+        self.sent = 0
+        self.failed = 0
+        self._queue = asyncio.Queue(maxsize=max_size)
+        self._task = None
+
+    @property
+    def pending_count(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, notification) -> bool:
+        """Queues a notification; returns False if the queue is full and it was dropped."""
+        try:
+            self._queue.put_nowait(notification)
+            return True
+        except asyncio.QueueFull:
+            logger.error("[System] - Notification queue is full; dropping a notification.")
+            return False
+
+    def start(self):
+        self._task = asyncio.create_task(self._send_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.pending_count:
+            logger.warning(f"[System] - {self.pending_count} queued notifications were not sent before shutdown.")
+
+    async def _send_loop(self):
+        interval = 1 / self.rate if self.rate > 0 else 0
+        while True:
+            notification = await self._queue.get()
+            started = time.monotonic()
+            try:
+                await notification()
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"[System] - Failed to send a queued notification: {e}", exc_info=True)
+            delay = interval - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
@@ -0,0 +1,9 @@
+# percentiles.py
+
+
+def percentile(sorted_samples: list[float], percent: float) -> float:
+    """Returns the nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(percent / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
@@ -0,0 +1,85 @@
+# profiler.py
+
+import io
+import time
+import asyncio
+import cProfile
+import logging
+import pstats
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilerCapture:
+    """
+    Profiles the running bot for a fixed time without a restart.
+
+    cProfile is enabled on the event loop thread, where all handlers run, so the report covers
+    every update processed during the capture. The wall-clock time spent in database queries
+    and Bot API requests is taken from the metrics histograms over the same period.
+    Only one capture can run at a time.
+    """
+
+    TOP_FUNCTIONS = 40
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.running = False
+
+    def _io_totals(self) -> dict:
+        return {
+            'db': self.metrics.db_latency.totals(),
+            'bot_api': self.metrics.bot_api_latency.totals(),
+            'handlers': self.metrics.handler_latency.totals(),
+        }
+
+    async def capture(self, seconds: float) -> str:
+        """Profiles the process for the given number of seconds and returns a text report."""
+        if self.running:
+            raise RuntimeError("A profiler capture is already running.")
+        self.running = True
+        profile = cProfile.Profile()
+        started_at = datetime.now()
+        totals_before = self._io_totals()
+        started = time.perf_counter()
+        logger.info(f"[System] - Profiler capture started for {seconds} s.")
+        try:
+            profile.enable()
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+            self.running = False
+        elapsed = time.perf_counter() - started
+        totals_after = self._io_totals()
+        logger.info("[System] - Profiler capture finished.")
+
+        # Sorting the statistics can take a moment on a busy process.
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._format_report, profile, started_at, elapsed, totals_before, totals_after)
+
+    def _format_report(self, profile: cProfile.Profile, started_at: datetime, elapsed: float,
+                       totals_before: dict, totals_after: dict) -> str:
+        out = io.StringIO()
+        out.write("Bot process profile\n")
+        out.write(f"Started: {started_at:%Y-%m-%d %H:%M:%S}, duration: {elapsed:.1f} s (cProfile, event loop thread)\n\n")
+
+        out.write("Wall-clock time in instrumented calls during the capture:\n")
+        labels = {
+            'db': "Database (blocks the event loop)",
+            'bot_api': "Bot API requests (awaited)",
+            'handlers': "Handlers (including the above)",
+        }
+        for key, label in labels.items():
+            count = totals_after[key][0] - totals_before[key][0]
+            seconds = totals_after[key][1] - totals_before[key][1]
+            share = seconds / elapsed * 100 if elapsed else 0.0
+            out.write(f"  {label:<34} {seconds:9.3f} s  {count:6d} calls  {share:5.1f}% of the capture\n")
+        out.write("  Awaited Bot API requests overlap with other work; database time does not.\n\n")
+
+        stats = pstats.Stats(profile, stream=out).strip_dirs()
+        out.write(f"Hottest functions by own time (top {self.TOP_FUNCTIONS}):\n")
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(self.TOP_FUNCTIONS)
+        out.write(f"\nHottest functions by cumulative time (top {self.TOP_FUNCTIONS}):\n")
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.TOP_FUNCTIONS)
+        return out.getvalue()
@@ -0,0 +1,240 @@
+# rate_engine.py
+
+import time
+import json
+import asyncio
+import logging
+from typing import NamedTuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class RateQuote(NamedTuple):
+    """A market rate and the rate offered to users, derived from it by the margin rules."""
+    market_rate: float
+    rate: float
+    source: str
+    fetched_at: float  # time.monotonic()
+    fetched_wall: float  # time.time(), for display
+
+
+def _extract(data, path: str):
+    """Follows a dotted path ('data.0.rate') through nested dicts and lists."""
+    for key in filter(None, path.split('.')):
+        data = data[int(key)] if isinstance(data, list) else data[key]
+    return data
+
+
+def _parse_rate(value) -> float:
+    rate = float(value)
+    if not rate > 0:
+        raise ValueError(f"rate must be positive, got {value!r}")
+    return rate
+
+
+class RateProvider:
+    """Base class of the rate sources; fetch() returns the market rate or raises."""
+    name = 'provider'
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def fetch(self) -> float:
+        raise NotImplementedError
+
+
+class HttpJsonRateProvider(RateProvider):
+    """Reads the rate from a JSON document served over HTTP, e.g. an exchange ticker."""
+    name = 'http'
+
+    def __init__(self, url: str, path: str = '', timeout: float = 5.0):
+        self.url = url
+        self.path = path
+        self.timeout = timeout
+        self._client = None
+
+    async def start(self):
+        self._client = httpx.AsyncClient(timeout=self.timeout)
+
+    async def stop(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch(self) -> float:
+        response = await self._client.get(self.url)
+        response.raise_for_status()
+        return _parse_rate(_extract(response.json(), self.path))
+
+
+class FileRateProvider(RateProvider):
+    """Reads the rate from a local file written by another process: a plain number or JSON."""
+    name = 'file'
+
+    def __init__(self, path: str, json_path: str = ''):
+        self.path = path
+        self.json_path = json_path
+
+    def _read(self) -> float:
+        with open(self.path, 'r', encoding='utf-8') as rate_file:
+            content = rate_file.read().strip()
+        if self.json_path:
+            return _parse_rate(_extract(json.loads(content), self.json_path))
+        return _parse_rate(content)
+
+    async def fetch(self) -> float:
+        return await asyncio.get_running_loop().run_in_executor(None, self._read)
+
+
+class StaticRateProvider(RateProvider):
+    """Always returns the same rate; for tests and load tests."""
+    name = 'static'
+
+    def __init__(self, rate: float):
+        self.rate = rate
+
+    async def fetch(self) -> float:
+        return self.rate
+
+
+def build_providers(config) -> list[RateProvider]:
+    """Creates the providers listed in [Rates] PROVIDERS, in order of preference."""
+    providers = []
+    for name in config.rates_providers:
+        if name == 'http' and config.rates_http_url:
+            providers.append(HttpJsonRateProvider(
+                config.rates_http_url, config.rates_http_path, config.rates_http_timeout))
+        elif name == 'file' and config.rates_file_path:
+            providers.append(FileRateProvider(config.rates_file_path, config.rates_file_json_path))
+        elif name == 'static' and config.rates_static_rate > 0:
+            providers.append(StaticRateProvider(config.rates_static_rate))
+        else:
+            logger.error(f"[System] - Rate provider '{name}' is unknown or not configured; skipping it.")
+    return providers
+
+
+class RateEngine:
+    """
+    Serves the exchange rate offered to users.
+
+    Providers are polled in the background every `refresh_interval` seconds, in order of
+    preference; the first one that answers sets the quote. The offered rate is the market
+    rate minus `margin_percent` percent and a fixed `spread`, rounded to `decimals`.
+    A quote older than `max_age` seconds is stale, and the manual rate from the settings
+    is used instead, as it is when no provider is configured. current_rate() only reads
+    the cached quote, so user requests never wait for a provider.
+    """
+
+    def __init__(self, config, providers: list[RateProvider], refresh_interval: float = 60.0,
+                 max_age: float = 300.0, margin_percent: float = 0.0, spread: float = 0.0, decimals: int = 2):
+        self.config = config
+        self.providers = providers
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.margin_percent = margin_percent
+        self.spread = spread
+        self.decimals = decimals
+        self.failures = 0
+        self._quote = None
+        self._serving_quote = False
+        self._listeners = []
+        self._task = None
+
+    def add_change_listener(self, callback):
+        """Registers a callback() that is called when the offered rate changes."""
+        self._listeners.append(callback)
+
+    def _notify(self):
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"[System] - Rate change listener failed: {e}")
+
+    def apply_margin(self, market_rate: float) -> float:
+        return round(market_rate * (1 - self.margin_percent / 100) - self.spread, self.decimals)
+
+    def fresh_quote(self) -> RateQuote | None:
+        """Returns the cached quote if it is not stale."""
+        quote = self._quote
+        if quote is not None and time.monotonic() - quote.fetched_at <= self.max_age:
+            return quote
+        return None
+
+    def current_rate(self) -> float:
+        """The rate offered to users right now: a fresh quote, otherwise the manual rate."""
+        quote = self.fresh_quote()
+        return quote.rate if quote is not None else self.config.exchange_rate
+
+    async def refresh(self) -> RateQuote | None:
+        """Asks the providers for a new market rate; keeps the previous quote if all of them fail."""
+        for provider in self.providers:
+            try:
+                market_rate = await provider.fetch()
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"[System] - Rate provider '{provider.name}' failed: {e}")
+                continue
+            rate = self.apply_margin(market_rate)
+            if rate <= 0:
+                logger.error(f"[System] - Rate {market_rate} from '{provider.name}' is too low for the margin rules.")
+                continue
+            previous = self.current_rate()
+            self._quote = RateQuote(market_rate, rate, provider.name, time.monotonic(), time.time())
+            self._serving_quote = True
+            if rate != previous:
+                logger.info(f"[System] - Exchange rate updated from '{provider.name}': {rate} (market {market_rate}).")
+                self._notify()
+            return self._quote
+        return None
+
+    def _check_staleness(self):
+        if self._serving_quote and self.fresh_quote() is None:
+            self._serving_quote = False
+            logger.warning(f"[System] - The rate quote is older than {self.max_age}s; "
+                           f"falling back to the manual rate {self.config.exchange_rate}.")
+            self._notify()
+
+    def describe(self) -> str:
+        """Short description of the rate source for the admin panel."""
+        quote = self.fresh_quote()
+        if quote is None:
+            if not self.providers:
+                return "ручной"
+            return "ручной (нет свежей котировки)"
+        age = int(time.monotonic() - quote.fetched_at)
+        return f"{quote.source}, рынок {quote.market_rate}, {age} с назад"
+
+    def start(self):
+        if not self.providers:
+            return
+        self._task = asyncio.create_task(self._refresh_loop())
+        logger.info(f"[System] - Rate engine started with providers: "
+                    f"{', '.join(provider.name for provider in self.providers)}.")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for provider in self.providers:
+            await provider.stop()
+
+    async def _refresh_loop(self):
+        for provider in self.providers:
+            await provider.start()
+        while True:
+            try:
+                await self.refresh()
+                self._check_staleness()
+            except Exception as e:
+                logger.error(f"[System] - Rate refresh failed: {e}", exc_info=True)
+            await asyncio.sleep(self.refresh_interval)
@@ -0,0 +1,40 @@
+# render_cache.py
+
+from collections import OrderedDict
+
+
+class RenderCache:
+    """
+    A size-bounded LRU cache for rendered message texts and keyboards.
+    Keys must change whenever the rendered data changes (e.g. include the row's updated_at),
+    so entries never have to be invalidated explicitly.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key, render):
+        """Returns the cached value for the key, or calls render() and caches its result."""
+        value = self._entries.get(key, self._MISSING)
+        if value is not self._MISSING:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = render()
+        self._entries[key] = value
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,75 @@
+# request_expiry.py
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class RequestExpiry:
+    """
+    Declines requests that have been waiting for the user for too long, so they stop
+    blocking /start and cluttering the list of active requests.
+
+    Every `interval` seconds the requests in each of the `timeouts` statuses that have not
+    changed for longer than its timeout are looked up through the (status, updated_at)
+    index, at most `batch_size` at a time. Each batch is declined, and its referral debits
+    refunded, in one transaction; the user and admin notifications go through the
+    throttled notification queue.
+    """
+
+    def __init__(self, bot, notifications, interval: float, timeouts: dict[str, float], batch_size: int = 100):
+        self.bot = bot
+        self.notifications = notifications
+        self.interval = interval
+        self.timeouts = timeouts
+        self.batch_size = batch_size
+        self.expired = 0
+        self._task = None
+
+    async def run_once(self) -> int:
+        """Expires every stale request; returns how many were declined."""
+        total = 0
+        now = datetime.now(timezone.utc)
+        for status, timeout in self.timeouts.items():
+            updated_before = (now - timedelta(seconds=timeout)).strftime('%Y-%m-%d %H:%M:%S')
+            while True:
+                batch = self.bot.db.get_stale_requests(status, updated_before, self.batch_size)
+                expired = self.bot.db.expire_requests([request['id'] for request in batch], status, updated_before)
+                for request in expired:
+                    self.notifications.submit(self._notification(request, int(timeout // 60)))
+                total += len(expired)
+                if len(batch) < self.batch_size or not expired:
+                    break
+                # Let handlers run between batches.
+                await asyncio.sleep(0)
+        self.expired += total
+        return total
+
+    def _notification(self, request: dict, timeout_minutes: int):
+        async def notify():
+            await self.bot.exchange_handler.notify_request_expired(request, timeout_minutes)
+        return notify
+
+    def start(self):
+        self._task = asyncio.create_task(self._expiry_loop())
+        timeouts = ", ".join(f"'{status}' after {timeout / 60:g} min" for status, timeout in self.timeouts.items())
+        logger.info(f"[System] - Request expiry started: {timeouts or 'no statuses configured'}.")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _expiry_loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"[System] - Request expiry failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,84 @@
+# shared_settings.py
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Runtime settings that admins change in the bot and that every instance must agree on.
+SHARED_OPTIONS = (
+    ('Settings', 'EXCHANGE_RATE'),
+    ('Settings', 'BOT_ENABLED'),
+    ('Settings', 'WALLET_ADDRESS'),
+    ('Settings', 'SUPPORT_CONTACT'),
+    ('Settings', 'TRX_COST_USDT'),
+    ('Settings', 'MIN_REFERRAL_PAYOUT_USD'),
+)
+
+
+class SharedSettingsStore:
+    """
+    Keeps the shared runtime settings in the bot's database, so several bot instances
+    using the same database see an admin's change without touching settings.ini.
+
+    Every change gets a new version number. Each instance caches the values in its
+    ConfigManager and polls the highest version, a single indexed lookup; only when it
+    moved are the changed rows fetched. A change therefore reaches every instance within
+    one poll interval. settings.ini only seeds values the database does not have yet.
+    """
+
+    def __init__(self, db, config, poll_interval: float):
+        self.db = db
+        self.config = config
+        self.poll_interval = poll_interval
+        self.version = 0
+        self._options = {(section, option.lower()) for section, option in SHARED_OPTIONS}
+        self._task = None
+
+    def handles(self, section: str, option: str) -> bool:
+        return (section, option.lower()) in self._options
+
+    def attach(self):
+        """Seeds the missing values from settings.ini, loads all values and routes changes here."""
+        for section, option in SHARED_OPTIONS:
+            value = self.config.get(section, option)
+            if value is not None:
+                self.db.set_shared_setting(section, option, value, only_if_missing=True)
+        self.config.use_shared_store(self)
+        self.refresh()
+        logger.info(f"[System] - Shared settings loaded from the database (version {self.version}).")
+
+    def write(self, section: str, option: str, value: str) -> bool:
+        """Stores a changed value; the other instances pick it up on their next poll."""
+        return self.db.set_shared_setting(section, option, value)
+
+    def refresh(self) -> bool:
+        """Applies the values changed by any instance since the last refresh."""
+        if self.db.get_shared_settings_version() == self.version:
+            return False
+        rows = self.db.get_shared_settings(self.version)
+        if not rows:
+            return False
+        self.version = rows[-1]['version']
+        self.config.apply_shared_settings({(row['section'], row['option']): row['value'] for row in rows})
+        return True
+
+    def start(self):
+        self._task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"[System] - Shared settings refresh failed: {e}", exc_info=True)
@@ -0,0 +1,67 @@
+# sla_analytics.py
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+from percentiles import percentile
+
+
+class LatencySummary(NamedTuple):
+    """Time spent in a status, in seconds."""
+    count: int
+    p50: float
+    p90: float
+    p99: float
+
+    @classmethod
+    def from_samples(cls, samples: list[float]) -> 'LatencySummary':
+        ordered = sorted(samples)
+        return cls(len(ordered), percentile(ordered, 50), percentile(ordered, 90), percentile(ordered, 99))
+
+
+def format_duration(seconds: float) -> str:
+    """Short human-readable duration for the admin panel."""
+    if seconds < 60:
+        return f"{seconds:.0f} с"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} мин"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f} ч"
+    return f"{seconds / 86400:.1f} дн"
+
+
+class SlaReport:
+    """Time-in-state percentiles of the transitions made within one window."""
+
+    def __init__(self, since: datetime, events: list[dict]):
+        self.since = since
+        by_stage = defaultdict(list)
+        by_admin = defaultdict(list)
+        by_admin_stage = defaultdict(list)
+        for event in events:
+            by_stage[event['from_status']].append(event['duration_seconds'])
+            if event['changed_by'] is not None:
+                by_admin[event['changed_by']].append(event['duration_seconds'])
+                by_admin_stage[(event['changed_by'], event['from_status'])].append(event['duration_seconds'])
+        self.transitions = len(events)
+        # How long requests waited in each status before leaving it, whoever moved them on.
+        self.stages = {stage: LatencySummary.from_samples(samples) for stage, samples in by_stage.items()}
+        # How long requests waited for each admin to act on them.
+        self.admins = {admin_id: LatencySummary.from_samples(samples) for admin_id, samples in by_admin.items()}
+        self.admin_stages = {key: LatencySummary.from_samples(samples) for key, samples in by_admin_stage.items()}
+
+
+class SlaAnalytics:
+    """
+    Computes per-stage and per-admin time-in-state percentiles from request_status_events.
+    Every event already carries the time the request spent in its previous status, so a
+    window is a single range scan over the created_at index.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def report(self, window: timedelta) -> SlaReport:
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - window
+        return SlaReport(since, self.db.get_status_events(since.strftime('%Y-%m-%d %H:%M:%S')))
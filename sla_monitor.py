@@ -0,0 +1,130 @@
+# sla_monitor.py
+
+import time
+import heapq
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from sla_analytics import format_duration
+
+logger = logging.getLogger(__name__)
+
+# Longest digest listing; the rest is summarized, so the message stays within Telegram's limit.
+DIGEST_MAX_ITEMS = 30
+
+
+class SlaMonitor:
+    """
+    Escalates requests that wait on the admins longer than the limit for their status.
+
+    The deadline of every request in a monitored status sits in a min-heap, loaded from the
+    database at startup and kept current by the database's status listener: a transition
+    into a monitored status pushes a new deadline, and entries whose request has moved on
+    since are skipped when they come up. Every `check_interval` seconds the expired
+    deadlines are popped and all newly overdue requests go to the admins in one digest,
+    through the throttled notification queue. A request is escalated once per status it
+    enters.
+    """
+
+    def __init__(self, bot, notifications, limits: dict[str, float], check_interval: float = 60.0):
+        self.bot = bot
+        self.notifications = notifications
+        self.limits = limits
+        self.check_interval = check_interval
+        self.escalated = 0
+        self._heap = []  # (deadline, request_id, status)
+        self._deadlines = {}  # request_id -> (status, deadline) of the entry that is still valid
+        self._task = None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._deadlines)
+
+    def _track(self, request_id: int, status: str, entered_at: float):
+        deadline = entered_at + self.limits[status]
+        self._deadlines[request_id] = (status, deadline)
+        heapq.heappush(self._heap, (deadline, request_id, status))
+
+    def load(self):
+        """Fills the heap from the requests currently in a monitored status."""
+        self._heap.clear()
+        self._deadlines.clear()
+        for row in self.bot.db.get_requests_in_statuses(tuple(self.limits)):
+            entered_at = datetime.strptime(row['status_since'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+            self._track(row['id'], row['status'], entered_at.timestamp())
+
+    def on_status_changed(self, request_id: int, old_status: str, new_status: str):
+        """Database status listener."""
+        if new_status in self.limits:
+            self._track(request_id, new_status, time.time())
+        else:
+            self._deadlines.pop(request_id, None)
+
+    def pop_overdue(self, now: float) -> list[tuple[int, str, float]]:
+        """Removes and returns (request id, status, deadline) of every valid entry past its deadline."""
+        overdue = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, request_id, status = heapq.heappop(self._heap)
+            if self._deadlines.get(request_id) == (status, deadline):
+                del self._deadlines[request_id]
+                overdue.append((request_id, status, deadline))
+        return overdue
+
+    def check(self) -> int:
+        """Queues one digest with the requests that became overdue; returns how many there are."""
+        now = time.time()
+        overdue = []
+        for request_id, status, deadline in self.pop_overdue(now):
+            # Another instance sharing the database may have moved the request on.
+            request = self.bot.db.get_request_by_id(request_id)
+            if request is not None and request['status'] == status:
+                overdue.append((request_id, status, now - deadline + self.limits[status]))
+        if overdue:
+            self.escalated += len(overdue)
+            logger.warning(f"[System] - {len(overdue)} requests are past their SLA: "
+                           f"{', '.join(f'#{request_id}' for request_id, _, _ in overdue)}.")
+            self.notifications.submit(self._digest(overdue))
+        return len(overdue)
+
+    def render_digest(self, overdue: list[tuple[int, str, float]]) -> str:
+        translate = self.bot.exchange_handler.translate_status
+        lines = [f"⏰ Заявки ждут администратора дольше положенного ({len(overdue)}):\n"]
+        for request_id, status, waiting in sorted(overdue, key=lambda item: -item[2])[:DIGEST_MAX_ITEMS]:
+            lines.append(f"#{request_id} — {translate(status)}: {format_duration(waiting)} "
+                         f"(лимит {format_duration(self.limits[status])})")
+        if len(overdue) > DIGEST_MAX_ITEMS:
+            lines.append(f"…и ещё {len(overdue) - DIGEST_MAX_ITEMS}")
+        return "\n".join(lines)
+
+    def _digest(self, overdue: list[tuple[int, str, float]]):
+        async def send():
+            text = self.render_digest(overdue)
+            for admin_id in self.bot.config.admin_ids:
+                try:
+                    await self.bot.application.bot.send_message(chat_id=admin_id, text=text)
+                except Exception as e:
+                    logger.error(f"[System] - Failed to send the SLA digest to admin {admin_id}: {e}")
+        return send
+
+    def start(self):
+        self.load()
+        self._task = asyncio.create_task(self._check_loop())
+        logger.info(f"[System] - SLA monitor started with {self.pending_count} pending requests.")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _check_loop(self):
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"[System] - SLA check failed: {e}", exc_info=True)
+            await asyncio.sleep(self.check_interval)
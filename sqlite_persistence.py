@@ -0,0 +1,247 @@
+# sqlite_persistence.py
+
+import asyncio
+import json
+import logging
+import sqlite3
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+# First delay before retrying a failed write; it doubles up to update_interval.
+MIN_RETRY_DELAY = 0.5
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    Stores user_data, chat_data and ConversationHandler states in the bot's SQLite database.
+
+    Unlike PicklePersistence, nothing is rewritten wholesale: the application hands over only
+    the entries that were accessed since the last run (every `update_interval` seconds),
+    entries whose serialized value did not change are skipped, and the remaining ones are
+    written together in a single transaction off the event loop. A failed write is retried
+    with a growing delay. The bookkeeping of what is stored only happens on the event loop.
+    The tables themselves are created by DatabaseManager.setup_database().
+    """
+
+    def __init__(self, db_path: str, update_interval: float = 10):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, callback_data=False),
+            update_interval=update_interval
+        )
+        self.db_path = db_path
+        self._conn = None
+        self._write_task = None
+        self._retry_handle = None
+        self._retry_delay = 0.0
+
+        # Pending changes: key -> serialized value, or None to delete the row.
+        self._pending_user_data = {}
+        self._pending_chat_data = {}
+        self._pending_conversations = {}
+
+        # Serialized values as they are currently stored, used to skip unchanged entries.
+        self._stored_user_data = {}
+        self._stored_chat_data = {}
+        self._stored_conversations = {}
+
+        # The batch being written right now; deduplication treats it as already stored.
+        self._writing_user_data = {}
+        self._writing_chat_data = {}
+        self._writing_conversations = {}
+
+    @property
+    def pending_count(self) -> int:
+        """Number of changes waiting to be written to the database."""
+        return len(self._pending_user_data) + len(self._pending_chat_data) + len(self._pending_conversations)
+
+    def _get_connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self._conn
+
+    async def _fetch_all(self, query: str, params: tuple = ()) -> list:
+        def fetch():
+            return self._get_connection().execute(query, params).fetchall()
+        return await asyncio.get_running_loop().run_in_executor(None, fetch)
+
+    async def get_user_data(self) -> dict:
+        rows = await self._fetch_all("SELECT user_id, data FROM persistence_user_data")
+        self._stored_user_data = {user_id: data for user_id, data in rows}
+        logger.info(f"[System] - Restored user_data for {len(rows)} users from the database.")
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    async def get_chat_data(self) -> dict:
+        rows = await self._fetch_all("SELECT chat_id, data FROM persistence_chat_data")
+        self._stored_chat_data = {chat_id: data for chat_id, data in rows}
+        return {chat_id: json.loads(data) for chat_id, data in rows}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        rows = await self._fetch_all(
+            "SELECT conversation_key, state FROM persistence_conversations WHERE name = ?", (name,))
+        conversations = {}
+        for conversation_key, state in rows:
+            self._stored_conversations[(name, conversation_key)] = state
+            conversations[tuple(json.loads(conversation_key))] = state
+        logger.info(f"[System] - Restored {len(conversations)} '{name}' conversations from the database.")
+        return conversations
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._queue_change(self._pending_user_data, self._writing_user_data, self._stored_user_data, user_id,
+                           json.dumps(data, ensure_ascii=False, sort_keys=True))
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._queue_change(self._pending_chat_data, self._writing_chat_data, self._stored_chat_data, chat_id,
+                           json.dumps(data, ensure_ascii=False, sort_keys=True))
+
+    async def update_conversation(self, name: str, key: tuple, new_state) -> None:
+        self._queue_change(self._pending_conversations, self._writing_conversations, self._stored_conversations,
+                           (name, json.dumps(list(key))), new_state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._queue_change(self._pending_user_data, self._writing_user_data, self._stored_user_data, user_id, None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._queue_change(self._pending_chat_data, self._writing_chat_data, self._stored_chat_data, chat_id, None)
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        # This instance is the only writer, so the in-memory data is always up to date.
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
+
+    def _queue_change(self, pending: dict, writing: dict, stored: dict, key, value):
+        """Queues a change unless the stored (or currently written) value is already identical."""
+        # A missing key reads as None, so deleting a row that was never stored is skipped as well.
+        current = writing[key] if key in writing else stored.get(key)
+        if key not in pending and current == value:
+            return
+        pending[key] = value
+        self._start_writing()
+
+    def _start_writing(self):
+        # While a retry is scheduled, new changes wait for it instead of hitting the database again.
+        if self._retry_handle is None and (self._write_task is None or self._write_task.done()):
+            self._write_task = asyncio.create_task(self._write_pending())
+
+    def _retry(self):
+        self._retry_handle = None
+        self._start_writing()
+
+    def _take_pending(self) -> tuple[dict, dict, dict]:
+        batch = (self._pending_user_data, self._pending_chat_data, self._pending_conversations)
+        self._pending_user_data, self._pending_chat_data, self._pending_conversations = {}, {}, {}
+        return batch
+
+    async def _write_pending(self):
+        # Yield once so that all changes of the current persistence run end up in one transaction.
+        await asyncio.sleep(0)
+        loop = asyncio.get_running_loop()
+        while self._pending_user_data or self._pending_chat_data or self._pending_conversations:
+            batch = self._take_pending()
+            self._writing_user_data, self._writing_chat_data, self._writing_conversations = batch
+            try:
+                written = await loop.run_in_executor(None, self._write_batch, *batch)
+            finally:
+                self._writing_user_data, self._writing_chat_data, self._writing_conversations = {}, {}, {}
+            if not written:
+                self._requeue(batch)
+                self._retry_delay = min(max(self._retry_delay * 2, MIN_RETRY_DELAY), self.update_interval)
+                logger.warning(f"[System] - Retrying the persistence write in {self._retry_delay:g} s.")
+                self._retry_handle = loop.call_later(self._retry_delay, self._retry)
+                return
+            self._retry_delay = 0.0
+            self._mark_stored(batch)
+
+    def _requeue(self, batch: tuple[dict, dict, dict]):
+        """Puts a batch that failed back in front of the changes made since; newer values win."""
+        for pending, changes in zip((self._pending_user_data, self._pending_chat_data, self._pending_conversations),
+                                    batch):
+            for key, value in changes.items():
+                pending.setdefault(key, value)
+
+    def _mark_stored(self, batch: tuple[dict, dict, dict]):
+        for stored, changes in zip((self._stored_user_data, self._stored_chat_data, self._stored_conversations),
+                                   batch):
+            for key, value in changes.items():
+                if value is None:
+                    stored.pop(key, None)
+                else:
+                    stored[key] = value
+
+    def _write_batch(self, user_data: dict, chat_data: dict, conversations: dict) -> bool:
+        """
+        Writes a batch of changes in a single transaction; returns False if it failed.
+        Runs in a worker thread, so it only touches the database.
+        """
+        conn = self._get_connection()
+        try:
+            with conn:
+                self._write_data_table(conn, 'persistence_user_data', 'user_id', user_data)
+                self._write_data_table(conn, 'persistence_chat_data', 'chat_id', chat_data)
+
+                conversation_upserts = [(name, key, state) for (name, key), state in conversations.items()
+                                        if state is not None]
+                conversation_deletes = [(name, key) for (name, key), state in conversations.items()
+                                        if state is None]
+                conn.executemany(
+                    "INSERT INTO persistence_conversations (name, conversation_key, state) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name, conversation_key) DO UPDATE SET state = excluded.state, "
+                    "updated_at = CURRENT_TIMESTAMP",
+                    conversation_upserts)
+                conn.executemany(
+                    "DELETE FROM persistence_conversations WHERE name = ? AND conversation_key = ?",
+                    conversation_deletes)
+        except sqlite3.Error as e:
+            logger.error(f"[System] - Failed to write persistence batch: {e}")
+            return False
+        logger.debug(
+            f"[System] - Persisted {len(user_data)} user_data, {len(chat_data)} chat_data "
+            f"and {len(conversations)} conversation changes.")
+        return True
+
+    @staticmethod
+    def _write_data_table(conn, table_name: str, key_column: str, changes: dict):
+        upserts = [(key, data) for key, data in changes.items() if data is not None]
+        deletes = [(key,) for key, data in changes.items() if data is None]
+        conn.executemany(
+            f"INSERT INTO {table_name} ({key_column}, data) VALUES (?, ?) "
+            f"ON CONFLICT({key_column}) DO UPDATE SET data = excluded.data, updated_at = CURRENT_TIMESTAMP",
+            upserts)
+        conn.executemany(f"DELETE FROM {table_name} WHERE {key_column} = ?", deletes)
+
+    async def flush(self) -> None:
+        """Writes all pending changes and closes the connection. Called on shutdown."""
+        if self._write_task is not None:
+            await self._write_task
+        if self._retry_handle is not None:
+            self._retry_handle.cancel()
+            self._retry_handle = None
+        batch = self._take_pending()
+        if any(batch):
+            # A last attempt, through the executor like every other write.
+            if await asyncio.get_running_loop().run_in_executor(None, self._write_batch, *batch):
+                self._mark_stored(batch)
+            else:
+                logger.error(f"[System] - {sum(map(len, batch))} persistence changes were lost on shutdown.")
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        logger.info("[System] - Persistence flushed to the database.")
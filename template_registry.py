@@ -0,0 +1,61 @@
+# template_registry.py
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateRegistry:
+    """
+    Caches prebuilt texts and keyboards for static screens.
+
+    Each template is produced by a builder function the first time it is requested and
+    reused afterwards. Templates that depend on configuration values declare them as
+    (section, option) pairs and are rebuilt lazily after one of those settings changes.
+    Cached values must be immutable; InlineKeyboardMarkup objects are.
+    """
+
+    def __init__(self):
+        self._builders = {}
+        self._dependencies = {}
+        self._cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, name: str, builder, depends_on: tuple = ()):
+        """
+        Registers a template.
+        :param name: Unique template name.
+        :param builder: Callable without arguments that returns the template value.
+        :param depends_on: (section, option) pairs of settings the template is built from.
+        """
+        self._builders[name] = builder
+        self._dependencies[name] = {(section, option.lower()) for section, option in depends_on}
+        self._cache.pop(name, None)
+
+    def get(self, name: str):
+        """Returns the cached template, building it on first use."""
+        try:
+            value = self._cache[name]
+            self.hits += 1
+            return value
+        except KeyError:
+            self.misses += 1
+        value = self._builders[name]()
+        self._cache[name] = value
+        return value
+
+    def invalidate(self, name: str | None = None):
+        """Drops one template, or all of them if no name is given."""
+        if name is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(name, None)
+
+    def on_config_changed(self, section: str, option: str):
+        """Config change listener: drops the templates built from the changed setting."""
+        changed = (section, option.lower())
+        for name, dependencies in self._dependencies.items():
+            if changed in dependencies and name in self._cache:
+                del self._cache[name]
+                logger.info(f"[System] - Template '{name}' invalidated by a change of [{section}] {option}.")
@@ -0,0 +1,72 @@
+# tests/conftest.py
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram import Bot
+
+from benchmarks.stubs import InMemoryRequest, make_bot_stub
+from database_manager import DatabaseManager
+
+
+class RecordingRequest(InMemoryRequest):
+    """InMemoryRequest that keeps every Bot API call as (method, parameters)."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        params = request_data.json_parameters if request_data else {}
+        self.calls.append((url.rsplit('/', 1)[-1], params))
+        return await super().do_request(url, method, request_data, **kwargs)
+
+    def methods(self, api_method: str) -> list[dict]:
+        return [params for name, params in self.calls if name == api_method]
+
+
+@pytest.fixture
+def db():
+    manager = DatabaseManager(':memory:')
+    manager.connect()
+    manager.setup_database()
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def user():
+    return SimpleNamespace(id=7, username='user7')
+
+
+@pytest.fixture
+def create_request(db, user):
+    """Creates a request for `user`; keyword arguments go into the user_data of the exchange flow."""
+    def create(**user_data):
+        return db.create_exchange_request(
+            user, {'currency': 'USDT', 'amount': 100.0, 'sum_uah': 4150.0, 'exchange_rate': 41.5, **user_data})
+    return create
+
+
+@pytest.fixture
+def api_calls():
+    return RecordingRequest()
+
+
+@pytest.fixture
+def telegram_bot(api_calls):
+    bot = Bot('123456:TEST', request=api_calls, get_updates_request=InMemoryRequest())
+    asyncio.run(bot.initialize())
+    return bot
+
+
+@pytest.fixture
+def bot(telegram_bot):
+    """main.Bot stand-in with an in-memory database and the exchange handler attached."""
+    from handlers.exchange_handler import ExchangeHandler
+
+    stub = make_bot_stub(telegram_bot)
+    stub.exchange_handler = ExchangeHandler(stub)
+    yield stub
+    stub.db.close()
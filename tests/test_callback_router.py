@@ -0,0 +1,70 @@
+# tests/test_callback_router.py
+
+import asyncio
+
+import pytest
+
+from benchmarks.stubs import callback_update, make_context
+from callback_router import (ACTION_CODES, REQUEST_ID_ACTIONS, CallbackPayload, CallbackRouter, action_pattern,
+                             decode_callback_data, encode_callback_data)
+
+
+def test_encode_uses_the_compact_format():
+    assert encode_callback_data('confirm_payment', 123) == '1:cp:123'
+    assert encode_callback_data('view_req_details', 5, 2) == '1:vd:5:2'
+    assert encode_callback_data('back_to_menu') == 'back_to_menu'
+    with pytest.raises(ValueError):
+        encode_callback_data('back_to_menu', 1)
+
+
+@pytest.mark.parametrize('action', sorted(ACTION_CODES))
+def test_compact_data_round_trips(action):
+    data = encode_callback_data(action, 42, 7)
+    assert len(data.encode()) <= 64
+    assert decode_callback_data(data) == CallbackPayload(action, (42, 7), 1)
+
+
+@pytest.mark.parametrize('data, payload', [
+    ('confirm_payment_123', CallbackPayload('confirm_payment', (123,))),
+    ('view_req_details_5_2', CallbackPayload('view_req_details', (5, 2))),
+    ('req_page_3', CallbackPayload('req_page', (3,))),
+    ('back_to_menu', CallbackPayload('back_to_menu')),
+])
+def test_legacy_and_static_data(data, payload):
+    assert decode_callback_data(data) == payload
+
+
+@pytest.mark.parametrize('data', ['', '2:cp:1', '1:zz:1', '1:cp:abc', '1', 'unknown_action_5'])
+def test_invalid_data_decodes_to_none(data):
+    assert decode_callback_data(data) is None
+
+
+def test_request_id_actions():
+    assert 'confirm_payment' in REQUEST_ID_ACTIONS
+    assert not REQUEST_ID_ACTIONS & {'req_page', 'active_req_page', 'ref_page', 'admin_profile', 'admin_sla'}
+    assert decode_callback_data('1:cp:9').request_id == 9
+
+
+def test_action_pattern_accepts_both_formats():
+    matches = action_pattern('confirm_payment', 'back_to_menu')
+    assert matches('1:cp:1') and matches('confirm_payment_1') and matches('back_to_menu')
+    assert not matches('1:ct:1') and not matches('1:zz:1') and not matches(None)
+
+
+def test_router_dispatches_by_action(telegram_bot):
+    router = CallbackRouter()
+    calls = []
+
+    async def on_payment(update, context):
+        calls.append(update.callback_query.data)
+        return 'handled'
+
+    router.add_route('confirm_payment', on_payment)
+    with pytest.raises(ValueError):
+        router.add_route('confirm_payment', on_payment)
+    assert router._match('confirm_payment_3') and not router._match('1:ct:3')
+
+    router.wrap_routes(lambda action, callback: callback)
+    update = callback_update(telegram_bot, 1, encode_callback_data('confirm_payment', 3))
+    assert asyncio.run(router.dispatch(update, make_context(telegram_bot))) == 'handled'
+    assert calls == ['1:cp:3']
@@ -0,0 +1,195 @@
+# tests/test_config_manager.py
+
+import asyncio
+import configparser
+import dataclasses
+import os
+import stat
+
+import pytest
+
+from config_manager import ConfigManager
+
+
+def write_settings(path, **overrides):
+    """Writes a complete settings.ini; overrides are 'Section.OPTION' -> value."""
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config['User'] = {'TOKEN': '123456:TEST', 'ADMIN_CHAT_ID': '1,2'}
+    config['Settings'] = {
+        'EXCHANGE_RATE': '41.5', 'ADMIN_PASSWORD': 'secret', 'WALLET_ADDRESS': 'TWallet',
+        'SUPPORT_CONTACT': '@support', 'TRX_COST_USDT': '15.0', 'BOT_ENABLED': 'True',
+        'REVIEW_CHANNEL_ID': '-100123', 'REVIEW_CHANNEL_URL': 'https://t.me/reviews',
+        'MIN_REFERRAL_PAYOUT_USD': '20.0',
+    }
+    for key, value in overrides.items():
+        section, option = key.split('.')
+        config[section][option] = value
+    with open(path, 'w', encoding='utf-8') as settings_file:
+        config.write(settings_file)
+
+
+@pytest.fixture
+def settings_path(tmp_path):
+    path = str(tmp_path / 'settings.ini')
+    write_settings(path)
+    return path
+
+
+@pytest.fixture
+def config(settings_path):
+    manager = ConfigManager(settings_path)
+    manager.load()
+    return manager
+
+
+def test_load_builds_the_snapshot(config):
+    assert config.admin_ids == frozenset({1, 2})
+    assert config.exchange_rate == 41.5
+    assert config.review_channel_id == -100123
+
+
+@pytest.mark.parametrize('admin_ids, valid', [('1,2', True), (' 1 , -5 ', True), ('', True),
+                                              ('1,,2', False), ('your_admin_chat_id_here', False)])
+def test_admin_ids_follow_the_same_rule_at_startup_and_on_reload(tmp_path, admin_ids, valid):
+    path = str(tmp_path / 'settings.ini')
+    write_settings(path, **{'User.ADMIN_CHAT_ID': admin_ids})
+    manager = ConfigManager(path)
+    manager.load()
+
+    _, errors = manager._read_and_validate()
+    assert (not errors) == valid
+    if valid:
+        assert manager.admin_ids == frozenset(int(admin_id) for admin_id in admin_ids.split(',') if admin_id.strip())
+
+
+def test_validation_reports_missing_options_and_bad_numbers(settings_path, config):
+    write_settings(settings_path, **{'Settings.EXCHANGE_RATE': 'abc'})
+    parser = configparser.ConfigParser()
+    parser.read(settings_path, encoding='utf-8')
+    parser.remove_option('Settings', 'WALLET_ADDRESS')
+    with open(settings_path, 'w', encoding='utf-8') as settings_file:
+        parser.write(settings_file)
+
+    _, errors = config._read_and_validate()
+    assert "[Settings] WALLET_ADDRESS is missing" in errors
+    assert any('EXCHANGE_RATE' in error for error in errors)
+
+
+def test_apply_notifies_changed_options_and_keeps_unsaved_changes(settings_path, config):
+    changes = []
+    config.add_change_listener(lambda section, option: changes.append((section, option)))
+    config.set('Settings', 'WALLET_ADDRESS', 'TChangedInTheBot')
+    changes.clear()
+
+    write_settings(settings_path, **{'Settings.EXCHANGE_RATE': '42.0', 'Settings.WALLET_ADDRESS': 'TFromTheFile'})
+    parser, errors = config._read_and_validate()
+    assert not errors
+    assert config._apply(parser)
+
+    assert config.exchange_rate == 42.0
+    assert config.wallet_address == 'TChangedInTheBot'
+    assert changes == [('Settings', 'exchange_rate')]
+    assert not config._apply(parser)
+
+
+def test_reload_rejects_an_invalid_file(settings_path, config):
+    async def reload():
+        write_settings(settings_path, **{'Settings.TRX_COST_USDT': 'lots'})
+        os.utime(settings_path, ns=(0, 0))
+        return await config.reload_if_changed()
+
+    assert not asyncio.run(reload())
+    assert config.trx_cost_usdt == 15.0
+
+
+def test_write_file_replaces_atomically_and_keeps_permissions(settings_path, config):
+    os.chmod(settings_path, 0o600)
+    config._write_file("[User]\nTOKEN = 1\n")
+
+    assert stat.S_IMODE(os.stat(settings_path).st_mode) == 0o600
+    assert os.listdir(os.path.dirname(settings_path)) == ['settings.ini']
+    assert config._file_signature == config._stat_file()
+
+
+def test_failed_write_leaves_the_old_file(settings_path, config, monkeypatch):
+    with open(settings_path, encoding='utf-8') as settings_file:
+        original = settings_file.read()
+
+    def fail_replace(source, destination):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, 'replace', fail_replace)
+
+    with pytest.raises(OSError):
+        config._write_file("partial")
+    with open(settings_path, encoding='utf-8') as settings_file:
+        assert settings_file.read() == original
+    assert os.listdir(os.path.dirname(settings_path)) == ['settings.ini']
+
+
+def test_saves_are_debounced_and_flushed(settings_path, config):
+    writes = []
+    write_file = config._write_file
+
+    def record_write(text):
+        writes.append(text)
+        write_file(text)
+    config._write_file = record_write
+
+    async def scenario():
+        config.set('Config', 'SAVE_DEBOUNCE', '0.05')
+        config.set('Settings', 'WALLET_ADDRESS', 'TFirst')
+        await config.save()
+        config.set('Settings', 'WALLET_ADDRESS', 'TSecond')
+        await config.save()
+        await asyncio.sleep(0.2)
+        assert len(writes) == 1
+
+        config.set('Settings', 'EXCHANGE_RATE', '43.0')
+        await config.save()
+        await config.flush()
+        assert len(writes) == 2
+        await config.flush()
+
+    asyncio.run(scenario())
+    assert len(writes) == 2
+    reloaded = ConfigManager(settings_path)
+    reloaded.load()
+    assert (reloaded.wallet_address, reloaded.exchange_rate) == ('TSecond', 43.0)
+
+
+def test_failed_save_keeps_changes_pending(config):
+    attempts = []
+
+    def fail_once(text):
+        attempts.append(text)
+        if len(attempts) == 1:
+            raise OSError("read-only file system")
+
+    config._write_file = fail_once
+
+    async def scenario():
+        config.set('Settings', 'WALLET_ADDRESS', 'TPending')
+        await config.flush()
+        assert config._unsaved
+        await config.flush()
+
+    asyncio.run(scenario())
+    assert len(attempts) == 2
+    assert not config._unsaved
+
+
+def test_snapshot_is_replaced_on_change_and_keeps_valid_numbers(config):
+    snapshot = config.snapshot
+    assert config.snapshot is snapshot
+
+    config.exchange_rate = 42.0
+    assert config.snapshot is not snapshot
+    assert (snapshot.exchange_rate, config.exchange_rate) == (41.5, 42.0)
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        config.snapshot.exchange_rate = 1.0
+
+    config.set('Settings', 'EXCHANGE_RATE', 'abc')
+    config.set('User', 'ADMIN_CHAT_ID', '1,x')
+    assert config.exchange_rate == 42.0
+    assert config.admin_ids == frozenset({1, 2})
@@ -0,0 +1,44 @@
+# tests/test_http_transport.py
+
+import asyncio
+
+from http_transport import InstrumentedHTTPXRequest, TransportStats
+
+
+async def keep_alive_server(reader, writer):
+    try:
+        while True:
+            await reader.readuntil(b'\r\n\r\n')
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 11\r\n\r\n'
+                         b'{"ok":true}')
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        writer.close()
+
+
+def test_connection_setup_is_not_counted_as_pool_wait():
+    stats = TransportStats()
+
+    async def scenario():
+        server = await asyncio.start_server(keep_alive_server, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        request = InstrumentedHTTPXRequest(stats, 'requests')
+        await request.initialize()
+        try:
+            await request.do_request(f'http://127.0.0.1:{port}/bot123:TEST/getMe', 'POST')
+            snapshot = stats.snapshot()
+            assert 'requests' not in snapshot['pool_wait']
+            assert snapshot['connect']['requests']['samples'] == 1
+
+            await request.do_request(f'http://127.0.0.1:{port}/bot123:TEST/getMe', 'POST')
+        finally:
+            await request.shutdown()
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(scenario())
+    snapshot = stats.snapshot()
+    assert snapshot['pool_wait']['requests']['samples'] == 1
+    assert snapshot['connect']['requests']['samples'] == 1
+    assert snapshot['requests']['getMe']['total'] == 2
+    assert "🔌 Соединения <code>requests</code>: 1 шт." in stats.summary_text()
@@ -0,0 +1,145 @@
+# tests/test_request_expiry.py
+
+import asyncio
+
+from callback_router import encode_callback_data
+from benchmarks.stubs import callback_update, make_context, message_update
+from telegram.ext import ConversationHandler
+
+ADMIN_ID = 900000001
+
+
+def make_stale(db, request_id: int, updated_at: str = '2000-01-01 00:00:00'):
+    """Moves the last update of a request into the past, as if it had been idle since."""
+    db._conn.execute("UPDATE exchange_requests SET updated_at = ? WHERE id = ?", (updated_at, request_id))
+    db._conn.commit()
+
+
+def referral_balance(db, user_id: int) -> float:
+    return db._conn.execute("SELECT referral_balance FROM user_profiles WHERE user_id = ?",
+                            (user_id,)).fetchone()[0]
+
+
+def test_conditional_status_change_skips_other_statuses(db, create_request):
+    request_id = create_request()
+    changes = []
+    db.add_status_listener(lambda *change: changes.append(change))
+
+    assert not db.update_request_status(request_id, 'payment received', expected_statuses=('awaiting confirmation',))
+    assert db.get_request_by_id(request_id)['status'] == 'awaiting payment'
+    assert db.update_request_status(request_id, 'awaiting confirmation', expected_statuses=('awaiting payment',))
+    assert db.get_request_by_id(request_id)['status'] == 'awaiting confirmation'
+    assert changes == [(request_id, 'awaiting payment', 'awaiting confirmation')]
+
+
+def test_unconditional_status_change_of_missing_request(db):
+    assert not db.update_request_status(404, 'declined')
+
+
+def test_decline_refunds_referral_debit_once(db, user, create_request):
+    db.create_or_update_user_profile(user.id, {'username': user.username})
+    db.update_referral_balance(user.id, 10.0)
+    request_id = create_request(total_referral_debit=4.0)
+    assert referral_balance(db, user.id) == 6.0
+
+    declined = db.decline_request(request_id, changed_by=ADMIN_ID)
+    assert declined['status'] == 'awaiting payment'
+    assert declined['referral_payout_amount'] == 4.0
+    assert referral_balance(db, user.id) == 10.0
+    assert db.get_request_by_id(request_id)['status'] == 'declined'
+
+    assert db.decline_request(request_id) is None
+    assert referral_balance(db, user.id) == 10.0
+
+
+def test_decline_respects_expected_statuses(db, create_request):
+    request_id = create_request()
+    db.update_request_status(request_id, 'completed')
+    assert db.decline_request(request_id) is None
+    assert db.decline_request(request_id, expected_statuses=db.ACTIVE_STATUSES + ('completed',))['status'] == 'completed'
+
+
+def test_get_stale_requests_filters_by_status_and_age(db, create_request):
+    stale, fresh, trx = create_request(), create_request(), create_request(trx_address='TTrx')
+    make_stale(db, stale)
+    make_stale(db, trx)
+
+    found = db.get_stale_requests('awaiting payment', '2001-01-01 00:00:00', 10)
+    assert [request['id'] for request in found] == [stale]
+    assert fresh not in [request['id'] for request in db.get_stale_requests('awaiting payment', '2001-01-01 00:00:00', 10)]
+    assert [request['id'] for request in db.get_stale_requests('awaiting trx transfer', '2001-01-01 00:00:00', 10)] == [trx]
+
+
+def test_expire_requests_declines_and_refunds(db, user, create_request):
+    db.create_or_update_user_profile(user.id, {'username': user.username})
+    db.update_referral_balance(user.id, 5.0)
+    ids = [create_request(total_referral_debit=1.0) for _ in range(3)]
+    for request_id in ids[:2]:
+        make_stale(db, request_id)
+
+    expired = db.expire_requests(ids, 'awaiting payment', '2001-01-01 00:00:00')
+    assert sorted(request['id'] for request in expired) == ids[:2]
+    assert all(request['status'] == 'awaiting payment' for request in expired)
+    assert [db.get_request_by_id(request_id)['status'] for request_id in ids] == \
+        ['declined', 'declined', 'awaiting payment']
+    assert referral_balance(db, user.id) == 4.0
+
+    # A second run finds nothing to refund.
+    assert db.expire_requests(ids, 'awaiting payment', '2001-01-01 00:00:00') == []
+    assert referral_balance(db, user.id) == 4.0
+
+
+def test_touch_request_only_in_expected_status(db, create_request):
+    request_id = create_request()
+    make_stale(db, request_id)
+    assert db.touch_request(request_id, ('awaiting payment',))
+    assert db.expire_requests([request_id], 'awaiting payment', '2001-01-01 00:00:00') == []
+
+    db.decline_request(request_id)
+    assert not db.touch_request(request_id, ('awaiting payment',))
+
+
+def test_expired_request_cannot_be_revived_with_a_hash(bot, telegram_bot, user):
+    db, handler = bot.db, bot.exchange_handler
+    request_id = db.create_exchange_request(user, {'currency': 'USDT', 'amount': 10.0, 'sum_uah': 415.0})
+    make_stale(db, request_id)
+    db.expire_requests([request_id], 'awaiting payment', '2001-01-01 00:00:00')
+
+    context = make_context(telegram_bot)
+    update = callback_update(telegram_bot, user.id, encode_callback_data('user_confirms_sending', request_id))
+    assert asyncio.run(handler.ask_for_hash(update, context)) == ConversationHandler.END
+
+    context.user_data['request_id'] = request_id
+    update = message_update(telegram_bot, user.id, 'deadbeef')
+    assert asyncio.run(handler.process_hash(update, context)) == ConversationHandler.END
+    request = db.get_request_by_id(request_id)
+    assert request['status'] == 'declined'
+    assert request['transaction_hash'] is None
+
+
+def test_admin_confirmation_conflict_answers_query_once(bot, telegram_bot, api_calls, user):
+    db, handler = bot.db, bot.exchange_handler
+    request_id = db.create_exchange_request(user, {'currency': 'USDT', 'amount': 10.0, 'sum_uah': 415.0})
+    db.decline_request(request_id)
+
+    update = callback_update(telegram_bot, ADMIN_ID, encode_callback_data('confirm_payment', request_id))
+    asyncio.run(handler.handle_payment_confirmation(update, make_context(telegram_bot)))
+
+    answers = api_calls.methods('answerCallbackQuery')
+    assert len(answers) == 1
+    assert answers[0].get('show_alert') == 'true'
+    assert not api_calls.methods('sendMessage')
+    assert db.get_request_by_id(request_id)['status'] == 'declined'
+
+
+def test_admin_confirmation_moves_request_on(bot, telegram_bot, api_calls, user):
+    db, handler = bot.db, bot.exchange_handler
+    request_id = db.create_exchange_request(user, {'currency': 'USDT', 'amount': 10.0, 'sum_uah': 415.0})
+    db.update_request_status(request_id, 'awaiting confirmation')
+
+    update = callback_update(telegram_bot, ADMIN_ID, encode_callback_data('confirm_payment', request_id))
+    asyncio.run(handler.handle_payment_confirmation(update, make_context(telegram_bot)))
+
+    assert len(api_calls.methods('answerCallbackQuery')) == 1
+    assert db.get_request_by_id(request_id)['status'] == 'payment received'
+    assert db.get_request_status_history(request_id)[-1]['changed_by'] == ADMIN_ID
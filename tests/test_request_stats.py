@@ -0,0 +1,68 @@
+# tests/test_request_stats.py
+
+import pytest
+
+
+def stats_rows(db) -> set[tuple]:
+    """Non-empty rollup rows; a reopened request can leave a bucket at zero."""
+    rows = db._conn.execute(
+        "SELECT period, period_start, status, requests, volume_usdt, payout_uah, referral_payout_usd, trx_requests "
+        "FROM request_stats_rollups WHERE requests != 0").fetchall()
+    return {tuple(row) for row in rows}
+
+
+def bucket(db, status: str) -> dict | None:
+    rows = [row for row in db.get_request_stats('day', '2000-01-01 00:00:00') if row['status'] == status]
+    return rows[0] if rows else None
+
+
+def test_incremental_rollups_match_a_rebuild(db, create_request):
+    completed = create_request(total_referral_debit=2.5)
+    trx = create_request(trx_address='TTrx')
+    declined = create_request()
+    create_request()  # still active, not counted
+    db.update_request_status(completed, 'completed')
+    db.update_request_status(trx, 'completed')
+    db.decline_request(declined)
+
+    incremental = stats_rows(db)
+    db.rebuild_request_stats()
+    assert incremental == stats_rows(db)
+
+    totals = bucket(db, 'completed')
+    assert totals['requests'] == 2
+    assert totals['volume_usdt'] == 200.0
+    assert totals['referral_payout_usd'] == 2.5
+    assert totals['trx_requests'] == 1
+    assert bucket(db, 'declined')['requests'] == 1
+
+
+def test_reopened_request_leaves_its_bucket(db, create_request):
+    request_id = create_request()
+    db.update_request_status(request_id, 'declined')
+    db.update_request_status(request_id, 'declined')  # not a transition, counted once
+    assert bucket(db, 'declined')['requests'] == 1
+
+    db.update_request_status(request_id, 'awaiting payment')
+    assert bucket(db, 'declined')['requests'] == 0
+    assert db.get_request_by_id(request_id)['finished_at'] is None
+
+    db.update_request_status(request_id, 'completed')
+    assert bucket(db, 'completed')['requests'] == 1
+    incremental = stats_rows(db)
+    db.rebuild_request_stats()
+    assert incremental == stats_rows(db)
+
+
+def test_failed_conditional_change_adds_nothing(db, create_request):
+    request_id = create_request()
+    assert not db.update_request_status(request_id, 'completed', expected_statuses=('funds sent',))
+    assert bucket(db, 'completed') is None
+
+
+@pytest.mark.parametrize('period, start_suffix', [('hour', ':00:00'), ('day', ' 00:00:00')])
+def test_both_periods_are_rolled_up(db, create_request, period, start_suffix):
+    db.update_request_status(create_request(), 'completed')
+    rows = db.get_request_stats(period, '2000-01-01 00:00:00')
+    assert [(row['status'], row['requests']) for row in rows] == [('completed', 1)]
+    assert rows[0]['period_start'].endswith(start_suffix)
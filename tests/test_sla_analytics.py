@@ -0,0 +1,94 @@
+# tests/test_sla_analytics.py
+
+import asyncio
+from datetime import timedelta
+
+from benchmarks.stubs import ADMIN_IDS, callback_update, make_context
+from callback_router import action_pattern, encode_callback_data
+from sla_analytics import LatencySummary, SlaAnalytics, SlaReport, format_duration
+
+ADMIN_ID = ADMIN_IDS[0]
+
+
+def backdate_events(db, request_id: int, seconds_ago: float):
+    """Moves the events of a request into the past, so the next transition has a known duration."""
+    db._conn.execute(
+        "UPDATE request_status_events SET created_at = datetime('now', ?) WHERE request_id = ?",
+        (f'-{seconds_ago} seconds', request_id))
+    db._conn.commit()
+
+
+def test_transitions_are_recorded_with_durations(db, create_request):
+    request_id = create_request()
+    backdate_events(db, request_id, 600)
+    db.update_request_status(request_id, 'awaiting confirmation')
+    db.update_request_status(request_id, 'awaiting confirmation')  # not a transition
+    db.update_request_status(request_id, 'payment received', changed_by=ADMIN_ID)
+
+    history = db.get_request_status_history(request_id)
+    assert [(event['from_status'], event['to_status'], event['changed_by']) for event in history] == [
+        (None, 'awaiting payment', None),
+        ('awaiting payment', 'awaiting confirmation', None),
+        ('awaiting confirmation', 'payment received', ADMIN_ID),
+    ]
+    assert history[0]['duration_seconds'] is None
+    assert 590 <= history[1]['duration_seconds'] <= 610
+
+
+def test_trx_requests_start_in_their_real_status(db, create_request):
+    request_id = create_request(trx_address='TTrx')
+    assert db.get_request_status_history(request_id)[0]['to_status'] == 'awaiting trx transfer'
+
+
+def test_failed_conditional_change_records_no_event(db, create_request):
+    request_id = create_request()
+    db.update_request_status(request_id, 'completed', expected_statuses=('funds sent',))
+    assert len(db.get_request_status_history(request_id)) == 1
+
+
+def test_report_groups_by_stage_and_admin():
+    events = [
+        {'from_status': 'awaiting confirmation', 'changed_by': 1, 'duration_seconds': 60.0},
+        {'from_status': 'awaiting confirmation', 'changed_by': 2, 'duration_seconds': 120.0},
+        {'from_status': 'payment received', 'changed_by': 1, 'duration_seconds': 30.0},
+        {'from_status': 'awaiting payment', 'changed_by': None, 'duration_seconds': 300.0},
+    ]
+    report = SlaReport(None, events)
+    assert report.transitions == 4
+    assert report.stages['awaiting confirmation'].count == 2
+    assert set(report.admins) == {1, 2}
+    assert report.admins[1].count == 2
+    assert report.admin_stages[(1, 'payment received')] == LatencySummary(1, 30.0, 30.0, 30.0)
+
+
+def test_analytics_reads_the_window(db, create_request):
+    request_id = create_request()
+    backdate_events(db, request_id, 120)
+    db.update_request_status(request_id, 'awaiting confirmation')
+
+    report = SlaAnalytics(db).report(timedelta(days=1))
+    assert report.transitions == 1
+    assert 110 <= report.stages['awaiting payment'].p50 <= 130
+
+
+def test_format_duration():
+    assert format_duration(42) == "42 с"
+    assert format_duration(600) == "10 мин"
+    assert format_duration(5400) == "1.5 ч"
+    assert format_duration(172800) == "2.0 дн"
+
+
+def test_sla_buttons_use_the_callback_data_format(bot, telegram_bot, api_calls):
+    from handlers.admin_handler import AdminPanelHandler
+
+    handler = AdminPanelHandler(bot)
+    matches = action_pattern('admin_sla')
+    assert matches('admin_sla') and matches(encode_callback_data('admin_sla', 30))
+
+    update = callback_update(telegram_bot, ADMIN_ID, encode_callback_data('admin_sla', 30))
+    assert asyncio.run(handler._handle_sla(update, make_context(telegram_bot))) == handler.ADMIN_MENU
+
+    edit = api_calls.methods('editMessageText')[-1]
+    assert "за 30 дн." in edit['text']
+    assert encode_callback_data('admin_sla', 1) in edit['reply_markup']
+    assert len(api_calls.methods('answerCallbackQuery')) == 1
@@ -0,0 +1,89 @@
+# tests/test_sla_monitor.py
+
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.stubs import ADMIN_IDS
+from sla_monitor import DIGEST_MAX_ITEMS, SlaMonitor
+
+LIMITS = {'awaiting confirmation': 600.0, 'payment received': 300.0}
+
+
+class RecordingQueue:
+    """Stands in for the notification queue; keeps the submitted jobs."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, job):
+        self.jobs.append(job)
+
+
+@pytest.fixture
+def monitor(bot):
+    monitor = SlaMonitor(bot, RecordingQueue(), LIMITS)
+    bot.db.add_status_listener(monitor.on_status_changed)
+    return monitor
+
+
+def new_request(db, user) -> int:
+    return db.create_exchange_request(user, {'currency': 'USDT', 'amount': 10.0, 'sum_uah': 415.0})
+
+
+def test_status_changes_keep_the_heap_current(bot, monitor, user):
+    first, second = new_request(bot.db, user), new_request(bot.db, user)
+    bot.db.update_request_status(first, 'awaiting confirmation')
+    bot.db.update_request_status(second, 'awaiting confirmation')
+    bot.db.update_request_status(first, 'payment received')
+    bot.db.update_request_status(second, 'declined')
+    assert monitor.pending_count == 1
+
+    now = time.time()
+    assert monitor.pop_overdue(now) == []
+    overdue = monitor.pop_overdue(now + 1000)
+    # The superseded 'awaiting confirmation' entry of `first` and the declined `second` are skipped.
+    assert [(request_id, status) for request_id, status, _ in overdue] == [(first, 'payment received')]
+    assert monitor.pending_count == 0
+    assert monitor.pop_overdue(now + 2000) == []
+
+
+def test_load_uses_the_time_the_status_was_entered(bot, monitor, user):
+    request_id = new_request(bot.db, user)
+    bot.db.update_request_status(request_id, 'awaiting confirmation')
+    bot.db._conn.execute("UPDATE request_status_events SET created_at = datetime('now', '-700 seconds') "
+                         "WHERE request_id = ?", (request_id,))
+    bot.db._conn.commit()
+
+    monitor.load()
+    assert monitor.pending_count == 1
+    assert [request_id for request_id, _, _ in monitor.pop_overdue(time.time())] == [request_id]
+
+
+def test_check_sends_one_digest_and_escalates_once(bot, monitor, user, api_calls):
+    ids = [new_request(bot.db, user) for _ in range(3)]
+    for request_id in ids:
+        bot.db.update_request_status(request_id, 'awaiting confirmation')
+    for request_id in ids:
+        monitor._track(request_id, 'awaiting confirmation', time.time() - 700)
+    # Moved on by another instance: the database no longer has it in the tracked status.
+    bot.db._conn.execute("UPDATE exchange_requests SET status = 'completed' WHERE id = ?", (ids[2],))
+    bot.db._conn.commit()
+
+    assert monitor.check() == 2
+    assert monitor.check() == 0
+    assert monitor.escalated == 2
+    assert len(monitor.notifications.jobs) == 1
+
+    asyncio.run(monitor.notifications.jobs[0]())
+    messages = api_calls.methods('sendMessage')
+    assert sorted(int(message['chat_id']) for message in messages) == sorted(ADMIN_IDS)
+    assert f"#{ids[0]}" in messages[0]['text'] and f"#{ids[2]}" not in messages[0]['text']
+
+
+def test_digest_is_capped(bot, monitor):
+    overdue = [(request_id, 'awaiting confirmation', 900.0) for request_id in range(DIGEST_MAX_ITEMS + 5)]
+    text = monitor.render_digest(overdue)
+    assert text.count('\n#') == DIGEST_MAX_ITEMS
+    assert text.endswith("…и ещё 5")
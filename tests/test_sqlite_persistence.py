@@ -0,0 +1,139 @@
+# tests/test_sqlite_persistence.py
+
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from database_manager import DatabaseManager
+from sqlite_persistence import SQLitePersistence
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'bot.db')
+    db = DatabaseManager(path)
+    db.connect()
+    db.setup_database()
+    db.close()
+    return path
+
+
+def stored_user_data(db_path: str) -> dict:
+    with sqlite3.connect(db_path) as conn:
+        return dict(conn.execute("SELECT user_id, data FROM persistence_user_data").fetchall())
+
+
+def test_round_trip(db_path):
+    async def write():
+        persistence = SQLitePersistence(db_path)
+        await persistence.update_user_data(1, {'amount': 100})
+        await persistence.update_chat_data(1, {'request_id_for_cancellation': 5})
+        await persistence.update_conversation('exchange', (1, 1), 3)
+        await persistence.update_conversation('exchange', (2, 2), 4)
+        await persistence.update_conversation('exchange', (2, 2), None)
+        await persistence.flush()
+
+    async def read():
+        persistence = SQLitePersistence(db_path)
+        restored = (await persistence.get_user_data(), await persistence.get_chat_data(),
+                    await persistence.get_conversations('exchange'))
+        await persistence.flush()
+        return restored
+
+    asyncio.run(write())
+    assert asyncio.run(read()) == ({1: {'amount': 100}}, {1: {'request_id_for_cancellation': 5}}, {(1, 1): 3})
+
+
+def test_unchanged_entries_are_skipped(db_path):
+    async def scenario():
+        persistence = SQLitePersistence(db_path)
+        await persistence.update_user_data(1, {'amount': 100})
+        await persistence.flush()
+
+        persistence = SQLitePersistence(db_path)
+        await persistence.get_user_data()
+        await persistence.update_user_data(1, {'amount': 100})
+        await persistence.drop_user_data(2)
+        pending = persistence.pending_count
+        await persistence.flush()
+        return pending
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_revert_during_a_write_is_not_lost(db_path):
+    gate = threading.Event()
+
+    async def scenario():
+        persistence = SQLitePersistence(db_path)
+        await persistence.update_user_data(1, {'step': 'old'})
+        await persistence.flush()
+
+        persistence = SQLitePersistence(db_path)
+        await persistence.get_user_data()
+        write_batch = persistence._write_batch
+
+        def slow_write(*batch):
+            gate.wait(5)
+            return write_batch(*batch)
+        persistence._write_batch = slow_write
+
+        await persistence.update_user_data(1, {'step': 'new'})
+        await asyncio.sleep(0.05)  # the batch is now being written
+        await persistence.update_user_data(1, {'step': 'old'})
+        gate.set()
+        await persistence.flush()
+
+    asyncio.run(scenario())
+    assert stored_user_data(db_path) == {1: '{"step": "old"}'}
+
+
+def test_failed_write_backs_off_and_retries(db_path):
+    attempts = []
+
+    async def scenario():
+        persistence = SQLitePersistence(db_path)
+        write_batch = persistence._write_batch
+
+        def flaky_write(*batch):
+            attempts.append(batch)
+            return len(attempts) > 1 and write_batch(*batch)
+        persistence._write_batch = flaky_write
+
+        await persistence.update_user_data(1, {'step': 1})
+        await asyncio.sleep(0.1)
+        # Changes made during the back-off wait for the retry.
+        await persistence.update_user_data(2, {'step': 2})
+        await asyncio.sleep(0.1)
+        assert len(attempts) == 1
+        assert persistence.pending_count == 2
+
+        await asyncio.sleep(0.5)
+        assert len(attempts) == 2
+        assert persistence.pending_count == 0
+        await persistence.flush()
+
+    asyncio.run(scenario())
+    assert stored_user_data(db_path) == {1: '{"step": 1}', 2: '{"step": 2}'}
+
+
+def test_flush_writes_through_the_executor(db_path):
+    threads = []
+
+    async def scenario():
+        persistence = SQLitePersistence(db_path)
+        write_batch = persistence._write_batch
+
+        def record_thread(*batch):
+            threads.append(threading.current_thread())
+            return write_batch(*batch)
+        persistence._write_batch = record_thread
+
+        persistence._pending_user_data[1] = '{"step": 1}'
+        await persistence.flush()
+
+    asyncio.run(scenario())
+    assert threads and threading.main_thread() not in threads
+    assert stored_user_data(db_path) == {1: '{"step": 1}'}
@@ -0,0 +1,79 @@
+# tests/test_user_state_manager.py
+
+import pytest
+from telegram.ext import ApplicationBuilder, CommandHandler, ConversationHandler
+
+import user_state_manager
+from user_state_manager import UserStateManager, conversation_states, estimate_size, deep_getsizeof
+
+
+async def noop(update, context):
+    return ConversationHandler.END
+
+
+@pytest.fixture
+def application():
+    application = ApplicationBuilder().token('123456:TEST').build()
+    conversation = ConversationHandler(entry_points=[CommandHandler('start', noop)], states={}, fallbacks=[],
+                                       name='exchange')
+    application.add_handler(conversation)
+    return application
+
+
+@pytest.fixture
+def manager(application):
+    return UserStateManager(application, ttl_seconds=60, max_users=2, sweep_interval=60)
+
+
+def exchange_states(application) -> dict:
+    return conversation_states(application.handlers[0][0])
+
+
+def test_sweep_evicts_expired_and_excess_users(application, manager):
+    for user_id in (1, 2, 3):
+        application.user_data[user_id]['step'] = user_id
+        exchange_states(application)[(user_id, user_id)] = 1
+        manager.touch(user_id)
+    manager._last_seen[1] -= 120  # inactive for longer than the TTL
+
+    assert manager.sweep() == 1
+    assert 1 not in application.user_data
+    assert (1, 1) not in exchange_states(application)
+
+    manager.max_users = 1
+    assert manager.sweep() == 1
+    assert 2 not in application.user_data
+    assert set(exchange_states(application)) == {(3, 3)}
+    assert (manager.evicted_by_ttl, manager.evicted_by_lru) == (1, 1)
+
+
+def test_unsupported_ptb_version_leaves_conversations_alone(application, manager, monkeypatch):
+    exchange_states(application)[(1, 1)] = 1
+    application.user_data[1]['step'] = 1
+    manager.touch(1)
+    manager._last_seen[1] -= 120
+    monkeypatch.setattr(user_state_manager, 'CONVERSATION_STATES_PTB_VERSIONS', ((99, 0), (100, 0)))
+
+    assert conversation_states(application.handlers[0][0]) is None
+    manager.sweep()
+    assert 1 not in application.user_data
+    assert manager.stats()['conversations']['exchange'][0] == 0
+
+
+def test_sizes_are_cached_between_renders(application, manager, monkeypatch):
+    application.user_data[1]['step'] = 'amount'
+    first = manager.stats()
+    application.user_data[2]['card_number'] = 'x' * 10000
+    second = manager.stats()
+    assert second['user_data'][0] == 2
+    assert second['user_data'][1] == first['user_data'][1]
+
+    monkeypatch.setattr(user_state_manager, 'SIZE_CACHE_SECONDS', 0.0)
+    assert manager.stats()['user_data'][1] > first['user_data'][1] + 10000
+
+
+def test_estimate_size_samples_large_stores(monkeypatch):
+    store = {user_id: {'step': 'amount', 'amount': 100.0} for user_id in range(1000)}
+    monkeypatch.setattr(user_state_manager, 'SIZE_SAMPLE', 50)
+    exact = deep_getsizeof(store)
+    assert 0.8 * exact <= estimate_size(store) <= 1.2 * exact
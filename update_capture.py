@@ -0,0 +1,248 @@
+# update_capture.py
+
+import os
+import re
+import gzip
+import hmac
+import json
+import time
+import queue
+import hashlib
+import logging
+import secrets
+import threading
+from datetime import datetime
+
+from telegram import Update
+from telegram.ext import ConversationHandler, TypeHandler, ContextTypes
+
+from user_state_manager import conversation_states
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_FORMAT_VERSION = 1
+
+# Objects that describe a user or a chat; their ids and names are pseudonymized.
+_ENTITY_KEYS = {'from', 'chat', 'user', 'sender_chat', 'forward_from', 'forward_from_chat', 'via_bot'}
+_NAME_KEYS = {'username', 'first_name', 'last_name', 'title'}
+_TEXT_KEYS = {'text', 'caption'}
+_LETTER_RE = re.compile(r'[^\W\d_]')
+# Seven or more digits, also when typed in groups: '4111 1111 1111 1111', '4111-1111-...'.
+_LONG_NUMBER_RE = re.compile(r'\d(?:[ -]?\d){6,}')
+_DIGIT_RE = re.compile(r'\d')
+_REFERRAL_START_RE = re.compile(r'^(/start ref_)(\d+)$')
+
+
+class Anonymizer:
+    """
+    Pseudonymizes captured updates while keeping them replayable.
+
+    User and chat ids are replaced by a keyed hash, so all updates of one user still belong
+    to the same (fake) user and private chats keep matching their users; referral /start
+    commands get the same treatment. Names are derived from the pseudonymous id.
+    In texts every letter becomes 'x' and numbers longer than six digits, including ones
+    typed in groups separated by spaces or dashes, become zeros: the length, commands,
+    amounts and emoji are kept, so handlers take the same branches and message entities
+    stay valid, but names, IBANs, card numbers and tax ids are gone. Texts sent while the
+    user enters requisites have every digit masked (mask_digits).
+    Callback data is kept, it holds no personal data.
+    """
+
+    def __init__(self, salt: bytes | None = None):
+        self._salt = salt or secrets.token_bytes(16)
+
+    def pseudonymize_id(self, value: int) -> int:
+        digest = hmac.new(self._salt, str(abs(value)).encode(), hashlib.sha256).digest()
+        pseudonym = int.from_bytes(digest[:5], 'big') + 1
+        return -pseudonym if value < 0 else pseudonym
+
+    def scrub_text(self, text: str, mask_digits: bool = False) -> str:
+        if text.startswith('/'):
+            # Referral links carry the referrer's user id.
+            return _REFERRAL_START_RE.sub(
+                lambda match: f"{match.group(1)}{self.pseudonymize_id(int(match.group(2)))}", text)
+        text = _LETTER_RE.sub('x', text)
+        if mask_digits:
+            return _DIGIT_RE.sub('0', text)
+        return _LONG_NUMBER_RE.sub(lambda match: _DIGIT_RE.sub('0', match.group(0)), text)
+
+    def anonymize(self, data, mask_digits: bool = False):
+        if isinstance(data, list):
+            return [self.anonymize(item, mask_digits) for item in data]
+        if not isinstance(data, dict):
+            return data
+        result = {}
+        for key, value in data.items():
+            if key in _ENTITY_KEYS and isinstance(value, dict):
+                result[key] = self._anonymize_entity(value)
+            elif key in _TEXT_KEYS and isinstance(value, str):
+                result[key] = self.scrub_text(value, mask_digits)
+            else:
+                result[key] = self.anonymize(value, mask_digits)
+        return result
+
+    def _anonymize_entity(self, entity: dict) -> dict:
+        result = self.anonymize({key: value for key, value in entity.items()
+                                 if key not in _NAME_KEYS and key != 'id'})
+        if 'id' in entity:
+            pseudonym = self.pseudonymize_id(entity['id'])
+            result['id'] = pseudonym
+            for key in _NAME_KEYS & entity.keys():
+                result[key] = f"{key[0]}{abs(pseudonym)}"
+        return result
+
+
+class UpdateCapture:
+    """
+    Writes every incoming update, optionally anonymized, to an append-only log for replay.
+
+    Each line is a compact JSON object {"t": unix time, "u": update}; every file starts with
+    a header line describing the capture. Files are gzip-compressed when the path ends in
+    .gz, and the path may contain strftime() fields to start a new file e.g. every day.
+    Serialization happens on the event loop, compression and file I/O in a writer thread.
+    """
+
+    CAPTURE_HANDLER_GROUP = -102
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, path_pattern: str, anonymize: bool = True, admin_ids: list[int] = (),
+                 sensitive_states: dict[str, tuple] | None = None):
+        """
+        :param sensitive_states: Conversation name -> states in which the user types requisites;
+                                 the digits of texts sent in these states are all masked.
+        """
+        self.path_pattern = path_pattern
+        self.anonymizer = Anonymizer() if anonymize else None
+        self.admin_ids = sorted(admin_ids)
+        self.sensitive_states = sensitive_states or {}
+        self.captured_count = 0
+        self._conversations = []
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def setup_handlers(self, application):
+        """
+        Registers the capture handler ahead of all other handlers.
+        Must be called after the conversations listed in sensitive_states are set up.
+        """
+        self._conversations = [
+            handler for handlers in application.handlers.values() for handler in handlers
+            if isinstance(handler, ConversationHandler) and handler.name in self.sensitive_states]
+        application.add_handler(TypeHandler(Update, self._on_update), group=self.CAPTURE_HANDLER_GROUP)
+
+    def _in_sensitive_state(self, update: Update) -> bool:
+        """Returns True if the sender is in one of the sensitive_states of a conversation."""
+        user, chat = update.effective_user, update.effective_chat
+        if user is None or chat is None:
+            return False
+        for conversation in self._conversations:
+            key = []
+            if conversation.per_chat:
+                key.append(chat.id)
+            if conversation.per_user:
+                key.append(user.id)
+            states = conversation_states(conversation)
+            # Without access to the states every message is treated as sensitive.
+            if states is None or states.get(tuple(key)) in self.sensitive_states[conversation.name]:
+                return True
+        return False
+
+    async def _on_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        mask_digits = self.anonymizer is not None and update.message is not None and self._in_sensitive_state(update)
+        self.record(update.to_dict(), time.time(), mask_digits)
+
+    def record(self, update_data: dict, timestamp: float, mask_digits: bool = False):
+        if self.anonymizer is not None:
+            update_data = self.anonymizer.anonymize(update_data, mask_digits)
+        self._queue.put((timestamp, json.dumps({'t': round(timestamp, 3), 'u': update_data},
+                                               ensure_ascii=False, separators=(',', ':'))))
+        self.captured_count += 1
+
+    def _header(self) -> str:
+        admin_ids = self.admin_ids
+        if self.anonymizer is not None:
+            admin_ids = [self.anonymizer.pseudonymize_id(admin_id) for admin_id in admin_ids]
+        return json.dumps({
+            'capture': CAPTURE_FORMAT_VERSION,
+            'started': time.time(),
+            'anonymized': self.anonymizer is not None,
+            'admin_ids': admin_ids,
+        }, separators=(',', ':'))
+
+    @staticmethod
+    def _open(path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if path.endswith('.gz'):
+            return gzip.open(path, 'at', encoding='utf-8')
+        return open(path, 'a', encoding='utf-8')
+
+    def start(self):
+        self._thread = threading.Thread(target=self._write_loop, name='update-capture', daemon=True)
+        self._thread.start()
+        logger.info(f"[System] - Capturing incoming updates to '{self.path_pattern}' "
+                    f"({'anonymized' if self.anonymizer else 'not anonymized'}).")
+
+    def stop(self):
+        """Writes the remaining updates and closes the file."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        logger.info(f"[System] - Update capture stopped after {self.captured_count} updates.")
+
+    def _write_loop(self):
+        """Runs in the writer thread."""
+        current_path = None
+        file = None
+        last_flush = time.monotonic()
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.FLUSH_INTERVAL)
+                except queue.Empty:
+                    item = ()  # Nothing to write; only flush.
+                if item is None:
+                    break
+                if item:
+                    timestamp, line = item
+                    path = datetime.fromtimestamp(timestamp).strftime(self.path_pattern)
+                    if path != current_path:
+                        if file is not None:
+                            file.close()
+                        file = self._open(path)
+                        file.write(self._header() + '\n')
+                        current_path = path
+                    file.write(line + '\n')
+                if file is not None and time.monotonic() - last_flush >= self.FLUSH_INTERVAL:
+                    file.flush()
+                    last_flush = time.monotonic()
+        except OSError as e:
+            logger.error(f"[System] - Update capture failed: {e}")
+        finally:
+            if file is not None:
+                file.close()
+
+
+def read_capture(path: str):
+    """
+    Yields (header, timestamp, update dict) for every update in a capture file.
+    A file cut off by a crash is read up to its last complete line.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    header = {}
+    with opener(path, 'rt', encoding='utf-8') as file:
+        try:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if 'capture' in entry:
+                    header = entry
+                    continue
+                yield header, entry['t'], entry['u']
+        except EOFError:
+            logger.warning(f"[System] - Capture file '{path}' is truncated; replaying what was read.")
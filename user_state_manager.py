@@ -0,0 +1,237 @@
+# user_state_manager.py
+
+import sys
+import time
+import random
+import asyncio
+import logging
+from collections import OrderedDict
+
+import telegram
+from telegram import Update
+from telegram.ext import ConversationHandler, TypeHandler, ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# PTB versions [from, to) whose ConversationHandler keeps its states in `_conversations`.
+CONVERSATION_STATES_PTB_VERSIONS = ((22, 0), (23, 0))
+# Size estimates sample at most this many entries per store and are reused for this long.
+SIZE_SAMPLE = 200
+SIZE_CACHE_SECONDS = 60.0
+
+_warned_conversation_states = False
+
+
+def conversation_states(conversation: ConversationHandler):
+    """
+    Returns the live conversation key -> state mapping of a ConversationHandler, or None.
+
+    PTB has no public API to list or drop conversation states, so this reads the private
+    `_conversations` TrackingDict; popping a key from it also marks the key for deletion in
+    the persistence. It is the only place that touches the private attribute. On a PTB
+    version outside CONVERSATION_STATES_PTB_VERSIONS, or if the attribute has changed, it
+    returns None (and warns once), and the callers leave the conversation states alone.
+    """
+    global _warned_conversation_states
+    supported_from, supported_to = CONVERSATION_STATES_PTB_VERSIONS
+    states = getattr(conversation, '_conversations', None)
+    if supported_from <= telegram.__version_info__[:2] < supported_to and hasattr(states, 'pop'):
+        return states
+    if not _warned_conversation_states:
+        _warned_conversation_states = True
+        logger.warning(f"[System] - Conversation states are not accessible with python-telegram-bot "
+                       f"{telegram.__version__}; they are not evicted or inspected.")
+    return None
+
+
+def estimate_size(mapping) -> int:
+    """Approximates deep_getsizeof() of a mapping from a random sample of at most SIZE_SAMPLE entries."""
+    if len(mapping) <= SIZE_SAMPLE:
+        return deep_getsizeof(dict(mapping))
+    keys = random.sample(list(mapping), SIZE_SAMPLE)
+    sampled = deep_getsizeof({key: mapping[key] for key in keys})
+    return round(sampled * len(mapping) / SIZE_SAMPLE)
+
+
+def deep_getsizeof(obj, _seen=None) -> int:
+    """Approximates the memory footprint of an object including the containers it references."""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_getsizeof(k, _seen) + deep_getsizeof(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_getsizeof(item, _seen) for item in obj)
+    return size
+
+
+class UserStateManager:
+    """
+    Keeps per-user state (user_data, private chat_data and ConversationHandler states) bounded.
+
+    Every incoming update refreshes the user's position in an LRU list. A periodic sweep
+    drops the state of users who have been inactive for longer than the TTL and, if there
+    are still more users than allowed, of the least recently active ones.
+    Both sweeps walk the LRU list from its oldest end, so a sweep costs O(evicted users).
+    """
+
+    TOUCH_HANDLER_GROUP = -100
+
+    def __init__(self, application, ttl_seconds: float, max_users: int, sweep_interval: float):
+        self.application = application
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self.sweep_interval = sweep_interval
+
+        self._last_seen = OrderedDict()  # user_id -> monotonic timestamp, oldest first
+        self._sweep_task = None
+
+        self.evicted_by_ttl = 0
+        self.evicted_by_lru = 0
+        self.last_sweep_duration = 0.0
+        self._sizes = None
+        self._sizes_at = 0.0
+
+    def setup_handlers(self, application):
+        """Registers a handler that records user activity before any other handler runs."""
+        application.add_handler(TypeHandler(Update, self._on_update), group=self.TOUCH_HANDLER_GROUP)
+
+    async def _on_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if update.effective_user:
+            self.touch(update.effective_user.id)
+
+    def touch(self, user_id: int):
+        self._last_seen[user_id] = time.monotonic()
+        self._last_seen.move_to_end(user_id)
+
+    def _conversation_handlers(self) -> list[ConversationHandler]:
+        return [handler for handlers in self.application.handlers.values() for handler in handlers
+                if isinstance(handler, ConversationHandler)]
+
+    def start(self):
+        """Starts the periodic sweep. State restored from persistence gets a fresh TTL."""
+        now = time.monotonic()
+        known_users = set(self.application.user_data.keys())
+        for conversation in self._conversation_handlers():
+            user_index = 1 if conversation.per_chat else 0
+            states = conversation_states(conversation)
+            if conversation.per_user and states is not None:
+                known_users.update(key[user_index] for key in states)
+        for user_id in known_users:
+            self._last_seen.setdefault(user_id, now)
+
+        self._sweep_task = asyncio.create_task(self._sweep_loop())
+        logger.info(
+            f"[System] - User state manager started (TTL: {self.ttl_seconds}s, max users: {self.max_users}, "
+            f"tracked on startup: {len(self._last_seen)}).")
+
+    async def stop(self):
+        if self._sweep_task:
+            self._sweep_task.cancel()
+            try:
+                await self._sweep_task
+            except asyncio.CancelledError:
+                pass
+            self._sweep_task = None
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"[System] - User state sweep failed: {e}", exc_info=True)
+
+    def sweep(self) -> int:
+        """Evicts expired and excess users. Returns the number of evicted users."""
+        started = time.perf_counter()
+        deadline = time.monotonic() - self.ttl_seconds
+        expired, excess = [], []
+
+        while self._last_seen:
+            user_id, last_seen = next(iter(self._last_seen.items()))
+            if last_seen < deadline:
+                expired.append(user_id)
+            elif len(self._last_seen) > self.max_users:
+                excess.append(user_id)
+            else:
+                break
+            self._last_seen.popitem(last=False)
+
+        if expired or excess:
+            self._evict(set(expired) | set(excess))
+            self.evicted_by_ttl += len(expired)
+            self.evicted_by_lru += len(excess)
+            logger.info(
+                f"[System] - Evicted state of {len(expired)} inactive and {len(excess)} least recently active users. "
+                f"Tracked users: {len(self._last_seen)}.")
+
+        self.last_sweep_duration = time.perf_counter() - started
+        return len(expired) + len(excess)
+
+    def _evict(self, user_ids: set):
+        for user_id in user_ids:
+            if user_id in self.application.user_data:
+                self.application.drop_user_data(user_id)
+            # In private chats the chat id equals the user id.
+            if user_id in self.application.chat_data:
+                self.application.drop_chat_data(user_id)
+
+        for conversation in self._conversation_handlers():
+            states = conversation_states(conversation)
+            if not conversation.per_user or states is None:
+                continue
+            user_index = 1 if conversation.per_chat else 0
+            for key in [key for key in states if key[user_index] in user_ids]:
+                # Popping also marks the key for deletion in a persistent conversation.
+                states.pop(key, None)
+
+    def _estimate_sizes(self) -> dict:
+        """Sampled memory estimates per store, recomputed at most every SIZE_CACHE_SECONDS."""
+        now = time.monotonic()
+        if self._sizes is None or now - self._sizes_at >= SIZE_CACHE_SECONDS:
+            self._sizes = {
+                'user_data': estimate_size(self.application.user_data),
+                'chat_data': estimate_size(self.application.chat_data),
+            }
+            for conversation in self._conversation_handlers():
+                states = conversation_states(conversation)
+                self._sizes[conversation.name or repr(conversation)] = estimate_size(states or {})
+            self._sizes_at = now
+        return self._sizes
+
+    def stats(self) -> dict:
+        """
+        Returns tracked entry counts, approximate memory usage per store and eviction counters.
+        The counts are current; the sizes are estimates up to SIZE_CACHE_SECONDS old.
+        """
+        sizes = self._estimate_sizes()
+        conversations = {}
+        for conversation in self._conversation_handlers():
+            name = conversation.name or repr(conversation)
+            conversations[name] = (len(conversation_states(conversation) or {}), sizes.get(name, 0))
+        return {
+            'tracked_users': len(self._last_seen),
+            'user_data': (len(self.application.user_data), sizes['user_data']),
+            'chat_data': (len(self.application.chat_data), sizes['chat_data']),
+            'conversations': conversations,
+            'evicted_by_ttl': self.evicted_by_ttl,
+            'evicted_by_lru': self.evicted_by_lru,
+            'last_sweep_ms': self.last_sweep_duration * 1000,
+        }
+
+    def summary_text(self) -> str:
+        """Formats the statistics as a short HTML block for the admin panel."""
+        stats = self.stats()
+        lines = [
+            f"👥 Отслеживается пользователей: {stats['tracked_users']}",
+            f"🗂 user_data: {stats['user_data'][0]} шт., ~{stats['user_data'][1] / 1024:.1f} КБ",
+            f"🗂 chat_data: {stats['chat_data'][0]} шт., ~{stats['chat_data'][1] / 1024:.1f} КБ",
+        ]
+        for name, (count, size) in stats['conversations'].items():
+            lines.append(f"💬 <code>{name}</code>: {count} шт., ~{size / 1024:.1f} КБ")
+        lines.append(f"🧹 Вытеснено: по TTL {stats['evicted_by_ttl']}, по лимиту {stats['evicted_by_lru']}")
+        return "\n".join(lines)
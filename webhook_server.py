@@ -0,0 +1,115 @@
+# webhook_server.py
+
+import asyncio
+import hmac
+import json
+import logging
+
+from aiohttp import web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookServer:
+    """
+    An embedded aiohttp server that receives updates from Telegram via webhook.
+    Incoming updates are validated against the secret token and pushed into the
+    application's bounded update queue. When the queue is full the server answers
+    with 503, so Telegram (or the reverse proxy) retries later instead of the bot
+    buffering an unbounded backlog in memory.
+    """
+
+    SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+    def __init__(self, application, listen: str, port: int, path: str,
+                 secret_token: str | None = None, health_path: str = '/healthz'):
+        """
+        :param application: The running telegram.ext.Application instance.
+        :param listen: Interface to bind to, e.g. '127.0.0.1'.
+        :param port: Port to bind to.
+        :param path: URL path that receives the updates, e.g. '/telegram'.
+        :param secret_token: Expected value of the secret token header. Validation is skipped if empty,
+                             which is only meant for local testing; the bot refuses to run without one.
+        :param health_path: URL path of the health endpoint.
+        """
+        self.application = application
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.health_path = health_path
+        self._secret_token = secret_token or None
+        self._runner = None
+
+        self.accepted_count = 0
+        self.rejected_count = 0
+        self.invalid_count = 0
+
+        self.app = web.Application()
+        self.app.router.add_post(self.path, self._handle_update)
+        self.app.router.add_get(self.health_path, self._handle_health)
+
+    @property
+    def update_queue(self) -> asyncio.Queue:
+        return self.application.update_queue
+
+    async def start(self):
+        """Starts listening for incoming webhook requests."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        logger.info(
+            f"[System] - Webhook server is listening on http://{self.listen}:{self.port}{self.path} "
+            f"(queue size: {self.update_queue.maxsize or 'unbounded'}).")
+
+    async def stop(self):
+        """Stops the server and releases the listening socket."""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+            logger.info("[System] - Webhook server stopped.")
+
+    def _is_authorized(self, request: web.Request) -> bool:
+        if not self._secret_token:
+            return True
+        received_token = request.headers.get(self.SECRET_TOKEN_HEADER, '')
+        return hmac.compare_digest(received_token.encode(), self._secret_token.encode())
+
+    async def _handle_update(self, request: web.Request) -> web.Response:
+        if not self._is_authorized(request):
+            self.invalid_count += 1
+            logger.warning(
+                f"[System] - Rejected webhook request from {request.remote}: invalid secret token.")
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.application.bot)
+        except (json.JSONDecodeError, TypeError, KeyError, ValueError) as e:
+            self.invalid_count += 1
+            logger.warning(f"[System] - Rejected malformed webhook payload: {e}")
+            return web.Response(status=400)
+
+        try:
+            self.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected_count += 1
+            logger.warning(
+                f"[System] - Update queue is full ({self.update_queue.maxsize}). Rejecting update {update.update_id}.")
+            return web.Response(status=503, headers={'Retry-After': '1'})
+
+        self.accepted_count += 1
+        return web.Response(status=200)
+
+    async def _handle_health(self, request: web.Request) -> web.Response:
+        is_running = self.application.running
+        body = {
+            'status': 'ok' if is_running else 'starting',
+            'queue_size': self.update_queue.qsize(),
+            'queue_maxsize': self.update_queue.maxsize,
+            'accepted': self.accepted_count,
+            'rejected': self.rejected_count,
+            'invalid': self.invalid_count,
+        }
+        return web.json_response(body, status=200 if is_running else 503)